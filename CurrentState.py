@@ -1,28 +1,153 @@
-from collections import deque 
+from collections import deque, OrderedDict
+import time
+
+EMOTIONS = ["neutral", "sad", "happy", "angry", "disgust", "fear", "surprise"]
+EMOTION_ORDER = {emotion: i for i, emotion in enumerate(EMOTIONS)}
 
 class CurrentStateUpdate():
-  def __init__(self):
-    self.predictions = deque(["neutral" for i in range(180)])
-    self.counts = {"neutral": 180,
-                   "sad": 0,
-                   "happy": 0,
-                   "angry": 0,
-                   "disgust": 0,
-                   "fear": 0,
-                   "surprise": 0}
-    self.curr_max = 180
+  """
+  Most frequent emotion over the last `window` predictions. Counts are kept
+  in buckets by frequency (counts of counts), so the true argmax is known
+  in constant time after every update. Ties keep the current state; if the
+  current state is no longer a leader, the first leader in EMOTIONS order wins.
+  """
+  def __init__(self, window=180):
+    self.predictions = deque(["neutral" for i in range(window)])
+    self.counts = {emotion: 0 for emotion in EMOTIONS}
+    self.counts["neutral"] = window
+    # buckets[n] holds every emotion seen exactly n times in the window
+    self.buckets = [set() for i in range(window + 1)]
+    for emotion, count in self.counts.items():
+      self.buckets[count].add(emotion)
+    self.curr_max = window
     self.state = "neutral"
 
+  def _move(self, emotion, delta):
+    count = self.counts[emotion]
+    self.buckets[count].discard(emotion)
+    self.counts[emotion] = count + delta
+    self.buckets[count + delta].add(emotion)
+
   def update_state(self, emotion):
     removed = self.predictions.popleft()
-    self.counts[removed] -= 1
-    if removed == self.state:
+    self._move(removed, -1)
+    # Removing one sample lowers the max by at most one
+    if not self.buckets[self.curr_max]:
       self.curr_max -= 1
     self.predictions.append(emotion)
-    self.counts[emotion] += 1
+    self._move(emotion, 1)
     if self.counts[emotion] > self.curr_max:
       self.curr_max = self.counts[emotion]
-      self.state = emotion
+    leaders = self.buckets[self.curr_max]
+    if self.state not in leaders:
+      self.state = min(leaders, key=EMOTION_ORDER.get)
+    return self.state
+
+def _argmax(values, current):
+  """Label with the highest value; the current label wins ties"""
+  best = current
+  for emotion in EMOTIONS:
+    if values[emotion] > values[best]:
+      best = emotion
+  return best
+
+class WindowCounter():
+  """Sliding window of (emotion, score) samples with running counts and score sums"""
+  def __init__(self, size=30):
+    self.size = size
+    self.samples = deque()
+    self.counts = {emotion: 0 for emotion in EMOTIONS}
+    self.scores = {emotion: 0.0 for emotion in EMOTIONS}
+    self.state = "neutral"
+
+  def add(self, emotion, score=1.0):
+    self.samples.append((emotion, score))
+    self.counts[emotion] += 1
+    self.scores[emotion] += score
+    if len(self.samples) > self.size:
+      removed, removed_score = self.samples.popleft()
+      self.counts[removed] -= 1
+      self.scores[removed] -= removed_score
+    self.state = _argmax(self.counts, self.state)
+    return self.state
+
+class PersonState():
+  """Emotion history of one tracked face"""
+  def __init__(self, window, now):
+    self.window = WindowCounter(window)
+    self.area = 0
+    self.last_seen = now
+
+class TrackStateManager():
+  """
+  Keeps a separate emotion window per face/track ID and combines them into
+  one room mood. People expire after they have not been seen for a while,
+  and the number of tracked people is capped so memory stays bounded.
+
+  Policies:
+    majority  - each person votes with their own smoothed emotion
+    confidence - classifier scores summed over everyone's window
+    primary   - the smoothed emotion of the largest face
+  """
+  POLICIES = ("majority", "confidence", "primary")
+
+  def __init__(self, window=30, expire_after=3.0, policy="majority", max_tracks=32):
+    if policy not in self.POLICIES:
+      raise ValueError(f"Unknown aggregation policy '{policy}'. Valid policies are: {', '.join(self.POLICIES)}")
+    self.window = window
+    self.expire_after = expire_after
+    self.policy = policy
+    self.max_tracks = max_tracks
+    self.people = OrderedDict()  # track_id -> PersonState, least recently seen first
+    self.state = "neutral"
+
+  def update(self, track_id, emotion, score=1.0, area=0, now=None):
+    """Add a prediction for one person and return that person's smoothed emotion"""
+    now = time.monotonic() if now is None else now
+    person = self.people.get(track_id)
+    if person is None:
+      person = self.people[track_id] = PersonState(self.window, now)
+      if len(self.people) > self.max_tracks:
+        self.people.popitem(last=False)
+    else:
+      self.people.move_to_end(track_id)
+    person.area = area
+    person.last_seen = now
+    return person.window.add(emotion, score)
+
+  def expire(self, now=None):
+    """Forget everyone not seen within expire_after seconds"""
+    now = time.monotonic() if now is None else now
+    while self.people:
+      track_id, person = next(iter(self.people.items()))
+      if now - person.last_seen <= self.expire_after:
+        break
+      del self.people[track_id]
+
+  def room_state(self, now=None):
+    """
+    Combine everyone's emotion into one room mood using the configured policy
+
+    Returns:
+      str: The room emotion; unchanged if nobody is present
+    """
+    self.expire(now)
+    if not self.people:
+      return self.state
+    if self.policy == "primary":
+      primary = max(self.people.values(), key=lambda person: person.area)
+      self.state = primary.window.state
+      return self.state
+
+    totals = {emotion: 0.0 for emotion in EMOTIONS}
+    for person in self.people.values():
+      if self.policy == "majority":
+        totals[person.window.state] += 1
+      else:
+        samples = len(person.window.samples)
+        for emotion in EMOTIONS:
+          totals[emotion] += person.window.scores[emotion] / samples
+    self.state = _argmax(totals, self.state)
     return self.state
 
 state_list = CurrentStateUpdate()
\ No newline at end of file
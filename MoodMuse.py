@@ -1,50 +1,144 @@
+import logging
 import pygame
-import random
+import threading
 import time
 import os
 from pathlib import Path
 
+from audio_cache import SoundCache
+from audio_stream import StreamingSound, ffmpeg_available
+from crossfade import CrossfadeEngine, CURVES
+from music_library import MusicLibrary
+from audio_analysis import FeatureIndex
+from metrics import metrics
+from song_selection import POLICIES, SongSelector
+
+logger = logging.getLogger(__name__)
+
 class MoodMuse:
     """
     MoodMuse: A system that plays music based on detected emotions
     with smooth crossfading between different emotional states.
     """
     
-    def __init__(self, debug=False):
+    PLAYBACK_MODES = ("memory", "stream")
+    CROSSFADE_CURVES = tuple(CURVES)
+    SELECTION_POLICIES = tuple(POLICIES)
+    MUSIC_CHANNELS = (0, 1)  # Channels songs are crossfaded between
+    LOUDNESS_TARGET = -16.0  # LUFS that level-matched songs are played at
+    MIN_SONG_VOLUME = 0.2  # Level matching never turns a song down further than this
+    
+    def __init__(self, debug=False, cache_bytes=256 * 1024 * 1024, preload=True, playback="memory",
+                 crossfade_curve="equal_power", library_poll_interval=None, music_channels=None,
+                 shared_mixer=False, selection="match", history_size=5, audio_analysis=False,
+                 loudness_target=LOUDNESS_TARGET, features=None, music_dir="music_files", mixer=None,
+                 clock=None, rng=None):
         """
         Initialize the MoodMuse system
         
         Args:
             debug (bool): Enable debug output if True
+            cache_bytes (int): Memory budget for decoded songs in bytes
+            preload (bool): Decode one candidate song per emotion in the background
+            playback (str): "memory" decodes whole songs into RAM, "stream"
+                decodes them in small chunks while playing (needs ffmpeg)
+            crossfade_curve (str): "equal_power" or "linear" volume curve
+            library_poll_interval (float): If set, re-check the music folders
+                for added, removed or changed songs every this many seconds
+            music_channels (tuple): Pair of mixer channels to crossfade between,
+                defaults to MUSIC_CHANNELS
+            shared_mixer (bool): Other MoodMuse instances use the same mixer on
+                other channels; shutdown then leaves their channels and the mixer alone
+            selection (str): Song selection policy: "match" plays the detected mood,
+                "counteract" soothes poor moods, "ramp" moves there gradually
+            history_size (int): Recently played songs to avoid repeating
+            audio_analysis (bool): Analyze new songs in a background process so crossfades
+                start at each song's entry point, on its beat grid, level-matched. An index
+                written earlier by audio_analysis.py is used either way; selection policies
+                other than "match" always analyze, since they rank songs by their features
+            loudness_target (float): Loudness in LUFS songs are matched to; the
+                mixer cannot amplify, so only louder songs are turned down
+            features (FeatureIndex): Analysis index shared with another player of
+                the same library, instead of analyzing it again
+            music_dir (str): Music directory with one folder per emotion
+            mixer: Module or object with the pygame.mixer API, defaults to pygame.mixer
+                (simulation.py passes a silent stand-in)
+            clock (callable): If given, fades run on this time source and only
+                advance when the owner calls crossfader.tick(), instead of on a timer thread,
+                and preloads wait for sound_cache.run_preloads()
+            rng (random.Random): Random source for song picks, for reproducible runs
         """
+        if playback not in self.PLAYBACK_MODES:
+            raise ValueError(f"Unknown playback mode '{playback}'. Valid modes are: {', '.join(self.PLAYBACK_MODES)}")
+        if playback == "stream" and not ffmpeg_available():
+            raise RuntimeError("Streaming playback needs ffmpeg on the PATH")
         self.debug = debug
+        self.music_channels = tuple(music_channels or self.MUSIC_CHANNELS)
+        self.shared_mixer = shared_mixer
+        if debug and not logging.getLogger().handlers:
+            # Standalone use: show set_emotion's debug log unless the caller configured logging
+            logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+        self.playback = playback
+        self.streams = {}  # channel number -> StreamingSound, in streaming mode
+        self.channel_lock = threading.RLock()
+        self.mixer = mixer or pygame.mixer
         
         # Initialize pygame mixer with specific settings
-        pygame.mixer.pre_init(44100, -16, 2, 2048)
-        pygame.mixer.init()
+        self.mixer.pre_init(44100, -16, 2, 2048)
+        self.mixer.init()
         
         # Set up mixer channels - we need at least 2 for crossfading
-        pygame.mixer.set_num_channels(8)  # Reserve more channels than needed
+        # Reserve more channels than needed, and keep those of other instances
+        self.mixer.set_num_channels(max(8, self.mixer.get_num_channels(), max(self.music_channels) + 1))
+        
+        # Fades run on their own timer thread, independent of the video loop
+        if clock is None:
+            self.crossfader = CrossfadeEngine(self._set_channel_volume, self._stop_channel, curve=crossfade_curve)
+        else:
+            self.crossfader = CrossfadeEngine(self._set_channel_volume, self._stop_channel, curve=crossfade_curve,
+                                              clock=clock, threaded=False)
         
         # Create directories for music files
-        self._create_directories()
+        self._create_directories(music_dir)
         
         # Setup emotion songs dictionary
         self._setup_song_dictionary()
+        if library_poll_interval:
+            self.library.start_polling(library_poll_interval)
+        
+        # Songs are analyzed once per file, in a separate process, and kept in an
+        # index: crossfades use loudness, entry point and beats, and policies other
+        # than "match" rank songs by tempo, energy and loudness
+        self.features = features
+        self.loudness_target = loudness_target
+        if features is None:
+            self.features = FeatureIndex(self.library, debug=debug)
+            if audio_analysis or selection != "match":
+                self.features.start_background_update()
+        self.selector = SongSelector(self.emotion_songs, self.features, policy=selection,
+                                     history_size=history_size, rng=rng)
         
         # Initialize state
         self.current_state = {
             "emotion": None,
             "song_path": None,
-            "current_channel": 0  # Track which channel is currently playing
+            "current_channel": self.music_channels[0]  # Track which channel is currently playing
         }
         
+        # Decoded songs, so a transition only has to look up a cached buffer
+        self.sound_cache = SoundCache(max_bytes=cache_bytes, debug=debug, cue=self._entry_offset, mixer=self.mixer,
+                                      threaded=clock is None)
+        self.next_songs = {}  # emotion -> song picked (and preloaded) for the next transition
+        self.features_seen = self.features.version  # Analysis the preloaded songs were trimmed with
+        if preload and playback == "memory":
+            self.preload_candidates()
+        
         if self.debug:
             print("MoodMuse initialized")
     
-    def _create_directories(self):
+    def _create_directories(self, music_dir="music_files"):
         """Create the directory structure for music files"""
-        self.music_dir = Path("music_files")
+        self.music_dir = Path(music_dir)
         self.music_dir.mkdir(exist_ok=True)
         
         # Create subdirectories for each emotion
@@ -54,43 +148,106 @@ class MoodMuse:
             emotion_dir.mkdir(exist_ok=True)
     
     def _setup_song_dictionary(self):
-        """Set up the dictionary of emotion songs with file paths"""
-        self.emotion_songs = {
-            "angry": [
-                "music_files/angry/Given Up.mp3",
-                "music_files/angry/Killing in the Name.mp3",
-                "music_files/angry/Limp Bizkit - Break Stuff (Official Music Video).mp3"
-            ],
-            "fear": [
-                "music_files/fear/Hans Zimmer - Time (Official Audio).mp3",
-                "music_files/fear/John Carpenter - HALLOWEEN Theme.mp3",
-                "music_files/fear/Psycho  Main Theme  Bernard Herrmann.mp3"
-            ],
-            "neutral": [
-                "music_files/neutral/Simon & Garfunkel - The Sounds of Silence (Audio).mp3",
-                "music_files/neutral/Green Day - Boulevard of Broken Dreams (Official Audio).mp3",
-                "music_files/neutral/@coldplay - Fix You (Lyrics).mp3"
-            ],
-            "sad": [
-                "music_files/sad/Joji - Glimpse Of Us.mp3",
-                "music_files/sad/John Legend - All of Me (Lyrics).mp3",
-                "music_files/sad/Adele - Hello (Lyrics).mp3"
-            ],
-            "disgust": [
-                "music_files/disgust/Marilyn Manson - The Beautiful People.mp3",
-                "music_files/disgust/Drowning Pool - Bodies (Official Lyric Video).mp3",
-                "music_files/disgust/Down with the Sickness.mp3"
-            ],
-            "happy": [
-                "music_files/happy/The Beach Boys - Good Vibrations.mp3",
-                "music_files/happy/Pharrell Williams - Happy (Lyrics).mp3",
-                "music_files/happy/Katrina & The Waves - Walking On Sunshine (Official Music Video).mp3"
-            ],
-            "surprise": [
-                "music_files/surprise/John Williams - Anakin's Betrayal.mp3",
-                "music_files/surprise/Franz Joseph Haydn - Surprise (Symphony no. 94).mp3"
-            ]
-        }
+        """
+        Set up the dictionary of emotion songs from the indexed music library.
+        emotion_songs maps each emotion to the songs found in music_files/<emotion>/
+        and is kept up to date by the library, so lookups never touch the disk.
+        """
+        self.library = MusicLibrary(self.music_dir, self.emotions, debug=self.debug)
+        self.emotion_songs = self.library.songs
+    
+    def _pick_next_song(self, emotion):
+        """Choose the song to play next time this emotion is set"""
+        # Prefer a different song than the one about to be used
+        self.next_songs[emotion] = self.selector.pick(emotion, self.current_state["song_path"],
+                                                      exclude=self.next_songs.get(emotion))
+        return self.next_songs[emotion]
+    
+    def preload_candidates(self):
+        """Pick and decode one candidate song per emotion in the background"""
+        if not self.selector.stateless:
+            # Planned picks depend on the song playing at the time
+            return
+        paths = [self._pick_next_song(emotion) for emotion in self.emotion_songs]
+        self.sound_cache.preload([path for path in paths if path])
+    
+    def _refresh_preloads(self):
+        """
+        Once new analysis arrives, queue the preloaded candidates again so the
+        cache trims them to their entry points in the background, not at transition time
+        """
+        version = self.features.version
+        if version != self.features_seen:
+            self.features_seen = version
+            self.sound_cache.preload([path for path in self.next_songs.values()
+                                      if path and self.sound_cache.contains(path)])
+    
+    def get_cache_stats(self):
+        """
+        Get decoded-song cache counters
+        
+        Returns:
+            dict: Cache hits, misses, evictions, decode count/time and memory use
+        """
+        return self.sound_cache.get_stats()
+    
+    def _analysis(self, song_path):
+        return self.features.get(song_path)
+    
+    def _entry_offset(self, song_path):
+        """Seconds into a song where playback starts, past any quiet intro"""
+        analysis = self._analysis(song_path)
+        if not analysis:
+            return 0.0
+        return analysis.get("entry") or 0.0
+    
+    def _song_volume(self, song_path):
+        """Channel volume that plays a song at the loudness target"""
+        analysis = self._analysis(song_path)
+        if not analysis or analysis.get("lufs") is None:
+            return 1.0
+        volume = 10 ** ((self.loudness_target - analysis["lufs"]) / 20)
+        return min(1.0, max(self.MIN_SONG_VOLUME, volume))
+    
+    def _crossfade_duration(self, song_path, duration):
+        """Round a fade to a whole number of the new song's beats"""
+        analysis = self._analysis(song_path)
+        beats = analysis.get("beats") if analysis else None
+        if not beats or len(beats) < 2:
+            return duration
+        beat = (beats[-1] - beats[0]) / (len(beats) - 1)
+        return max(1, round(duration / beat)) * beat
+    
+    def _play_on_channel(self, channel_num, song_path, volume):
+        """Start a song looping on a mixer channel using the configured playback mode"""
+        # Decode (or hit the cache) before taking the lock so fades keep running
+        sound = self.sound_cache.get(song_path) if self.playback == "memory" else None
+        with self.channel_lock:
+            self._stop_channel(channel_num)
+            channel = self.mixer.Channel(channel_num)
+            if sound is None:
+                stream = StreamingSound(song_path, channel, start=self._entry_offset(song_path), debug=self.debug)
+                stream.play(volume)
+                self.streams[channel_num] = stream
+            else:
+                channel.play(sound, loops=-1)
+                channel.set_volume(volume)
+    
+    def _set_channel_volume(self, channel_num, volume):
+        with self.channel_lock:
+            stream = self.streams.get(channel_num)
+            if stream is not None:
+                stream.set_volume(volume)
+            else:
+                self.mixer.Channel(channel_num).set_volume(volume)
+    
+    def _stop_channel(self, channel_num):
+        with self.channel_lock:
+            stream = self.streams.pop(channel_num, None)
+            if stream is not None:
+                stream.stop()
+            else:
+                self.mixer.Channel(channel_num).stop()
     
     def check_music_files(self):
         """
@@ -99,94 +256,72 @@ class MoodMuse:
         Returns:
             bool: True if at least one file was found, False otherwise
         """
-        missing_files = False
         available_files = False
         
         if self.debug:
             print("\nChecking music files...")
         
         for emotion, song_list in self.emotion_songs.items():
-            emotion_files_exist = False
-            for song_path in song_list:
-                if os.path.exists(song_path):
-                    emotion_files_exist = True
-                    available_files = True
-                    if self.debug:
+            if song_list:
+                available_files = True
+                if self.debug:
+                    for song_path in song_list:
                         print(f"Found: {song_path}")
-                else:
-                    missing_files = True
-                    if self.debug:
-                        print(f"Missing: {song_path}")
-            
-            if not emotion_files_exist and self.debug:
+            elif self.debug:
                 print(f"Warning: No songs available for '{emotion}' emotion.")
         
-        if missing_files and self.debug:
-            print("\nSome music files are missing. Add MP3 files to the appropriate directories or update paths.")
-        
         if not available_files and self.debug:
             print("\nWARNING: No music files were found! The program may not work correctly.")
-            print("Please add MP3 files to the music_files directory or update the paths in the code.")
+            print("Please add MP3 files to the music_files/<emotion> directories.")
         
         return available_files
     
     def true_crossfade(self, old_song_path, new_song_path, duration=3.0):
         """
         Perform a true crossfade between two songs by playing both simultaneously
-        and adjusting their volumes
+        and adjusting their volumes. With audio analysis the new song starts at
+        its entry point, fades in over whole beats and is level-matched.
         
         Args:
             old_song_path (str): Path to the current song
             new_song_path (str): Path to the new song
             duration (float): Duration of the crossfade in seconds
         """
+        volume = self._song_volume(new_song_path)
         try:
             # If there's no old song, just play the new one
-            if not old_song_path or not os.path.exists(old_song_path):
+            if not old_song_path:
                 if self.debug:
                     print(f"No previous song, playing: {os.path.basename(new_song_path)}")
                 
-                # Load and play on channel 0
-                new_sound = pygame.mixer.Sound(new_song_path)
-                channel0 = pygame.mixer.Channel(0)
-                channel0.play(new_sound, loops=-1)
-                channel0.set_volume(1.0)
+                # Load and play on the first music channel
+                first_channel = self.music_channels[0]
+                self.crossfader.cancel(first_channel)
+                self._play_on_channel(first_channel, new_song_path, volume)
+                self.crossfader.set_level(first_channel, volume)
                 
-                self.current_state["current_channel"] = 0
+                self.current_state["current_channel"] = first_channel
                 return
 
-            # Get next channel (alternating between 0 and 1)
-            new_channel_num = 1 if self.current_state["current_channel"] == 0 else 0
+            # Use the quietest music channel for the new song. Normally that is the
+            # idle one; in the middle of a fade it is whichever song is least audible,
+            # and the fade is retargeted from the current volumes.
             old_channel_num = self.current_state["current_channel"]
-            
-            # Get channel objects
-            new_channel = pygame.mixer.Channel(new_channel_num)
-            old_channel = pygame.mixer.Channel(old_channel_num)
+            new_channel_num = self.crossfader.quietest(self.music_channels)
             
             if self.debug:
                 print(f"Crossfading to: {os.path.basename(new_song_path)}")
                 print(f"Channels: {old_channel_num} → {new_channel_num}")
             
             try:
-                # Load the new song
-                new_sound = pygame.mixer.Sound(new_song_path)
-                
-                # Start playing new song at volume 0
-                new_channel.play(new_sound, loops=-1)
-                new_channel.set_volume(0.0)
-                
-                # Perform the crossfade using pygame's timing
-                steps = 30
-                step_time = int(duration * 1000 / steps)  # Convert to milliseconds
+                # Load the new song and start playing it at volume 0
+                self.crossfader.cancel(new_channel_num)
+                self._play_on_channel(new_channel_num, new_song_path, 0.0)
                 
-                # Set up the crossfade
-                pygame.time.set_timer(pygame.USEREVENT, step_time)
-                self.crossfade_step = 0
-                self.crossfade_channels = (old_channel, new_channel)
-                self.crossfade_steps = steps
-                
-                # Start the crossfade
-                self._crossfade_step()
+                # Fade the new song in and everything else out
+                self.crossfader.crossfade(new_channel_num, self.music_channels,
+                                          self._crossfade_duration(new_song_path, duration), target_volume=volume)
+                self.current_state["current_channel"] = new_channel_num
                 
             except Exception as e:
                 if self.debug:
@@ -199,16 +334,15 @@ class MoodMuse:
             
             # Recovery attempt - play new song directly
             try:
-                for channel_num in range(2):
-                    channel = pygame.mixer.Channel(channel_num)
-                    channel.stop()
+                for channel_num in self.music_channels:
+                    self.crossfader.cancel(channel_num)
+                    self._stop_channel(channel_num)
                 
-                new_sound = pygame.mixer.Sound(new_song_path)
-                channel0 = pygame.mixer.Channel(0)
-                channel0.play(new_sound, loops=-1)
-                channel0.set_volume(1.0)
+                first_channel = self.music_channels[0]
+                self._play_on_channel(first_channel, new_song_path, volume)
+                self.crossfader.set_level(first_channel, volume)
                 
-                self.current_state["current_channel"] = 0
+                self.current_state["current_channel"] = first_channel
                 if self.debug:
                     print(f"Recovery successful - playing: {os.path.basename(new_song_path)}")
                 
@@ -218,33 +352,6 @@ class MoodMuse:
                     print(f"Song path that failed: {new_song_path}")
                     print(f"Does file exist? {os.path.exists(new_song_path)}")
     
-    def _crossfade_step(self):
-        """Handle a single step of the crossfade"""
-        if not hasattr(self, 'crossfade_step'):
-            return
-            
-        old_channel, new_channel = self.crossfade_channels
-        
-        # Calculate volumes
-        old_volume = 1.0 - (self.crossfade_step / self.crossfade_steps)
-        new_volume = self.crossfade_step / self.crossfade_steps
-        
-        # Set the volumes
-        old_channel.set_volume(old_volume)
-        new_channel.set_volume(new_volume)
-        
-        # Move to next step
-        self.crossfade_step += 1
-        
-        if self.crossfade_step <= self.crossfade_steps:
-            # Schedule next step
-            pygame.time.set_timer(pygame.USEREVENT, int(1000 / 30))  # 30fps
-        else:
-            # Crossfade complete
-            old_channel.stop()
-            self.current_state["current_channel"] = 1 if self.current_state["current_channel"] == 0 else 0
-            pygame.time.set_timer(pygame.USEREVENT, 0)  # Stop the timer
-    
     def set_emotion(self, new_emotion):
         """
         Set the music based on detected emotion - main method to be called programmatically
@@ -258,68 +365,95 @@ class MoodMuse:
         # Convert input to lowercase for consistency
         new_emotion = new_emotion.lower()
         
-        if self.debug:
-            print(f"\nAttempting to set emotion: {new_emotion}")
-            print(f"Available emotions: {list(self.emotion_songs.keys())}")
-            print(f"Current state: {self.current_state}")
+        logger.debug("Attempting to set emotion: %s (current state: %s)", new_emotion, self.current_state)
         
         # Validate the emotion input
         if new_emotion not in self.emotion_songs:
-            if self.debug:
-                print(f"Error: '{new_emotion}' is not a valid emotion. Valid emotions are: {', '.join(self.emotion_songs.keys())}")
+            logger.warning("'%s' is not a valid emotion. Valid emotions are: %s",
+                           new_emotion, ", ".join(self.emotion_songs.keys()))
             return False
+        self._refresh_preloads()
         
         # If this is the same emotion as current, do nothing
         if new_emotion == self.current_state["emotion"]:
-            if self.debug:
-                print(f"Emotion '{new_emotion}' is already playing. Continuing current song.")
+            logger.debug("Emotion '%s' is already playing. Continuing current song.", new_emotion)
             return False
+
+        # Moods the policy answers with the same music keep the current song
+        if (self.current_state["emotion"] is not None and self.selector.target_emotion(new_emotion)
+                == self.selector.target_emotion(self.current_state["emotion"])):
+            logger.debug("'%s' calls for the same music as '%s'. Continuing current song.",
+                         new_emotion, self.current_state["emotion"])
+            self.current_state["emotion"] = new_emotion
+            return False
+
+        # Use the preloaded candidate if it is still in the library, otherwise ask the policy
+        new_song_path = self.next_songs.get(new_emotion) if self.selector.stateless else None
+        if new_song_path is None or self.library.get_track(new_song_path) is None:
+            new_song_path = self.selector.pick(new_emotion, self.current_state["song_path"])
         
-        # Select a random song from the new emotion's list
-        available_songs = [song for song in self.emotion_songs[new_emotion] if os.path.exists(song)]
-        
-        if self.debug:
-            print(f"Available songs for {new_emotion}: {available_songs}")
-            print(f"All songs for {new_emotion}: {self.emotion_songs[new_emotion]}")
+        logger.debug("Selected song for %s (%s policy): %s", new_emotion, self.selector.policy.name, new_song_path)
         
-        if not available_songs:
-            if self.debug:
-                print(f"Error: No available songs found for '{new_emotion}' emotion.")
-                print(f"Current directory: {os.getcwd()}")
-                print(f"Music directory: {self.music_dir}")
-                print(f"Does music directory exist? {os.path.exists(self.music_dir)}")
+        if new_song_path is None:
+            logger.warning("No available songs found for '%s' emotion in %s", new_emotion, self.music_dir)
             return False
         
-        new_song_path = random.choice(available_songs)
-        
-        if self.debug:
-            print(f"Selected song: {new_song_path}")
-            print(f"Does song file exist? {os.path.exists(new_song_path)}")
+        # Warm the next candidate
+        if self.selector.stateless:
+            next_song = self._pick_next_song(new_emotion)
+            if next_song and next_song != new_song_path:
+                self.sound_cache.preload([next_song])
         
-        # Print information about the transition
+        # Log information about the transition
         previous_emotion = "none" if self.current_state["emotion"] is None else self.current_state["emotion"]
-        if self.debug:
-            print(f"\nEmotion change detected: {previous_emotion} -> {new_emotion}")
-            print(f"Selecting a new song for '{new_emotion}' emotion...")
+        logger.debug("Emotion change detected: %s -> %s, selected song: %s", previous_emotion, new_emotion, new_song_path)
         
         # Perform true crossfade between songs
-        self.true_crossfade(self.current_state["song_path"], new_song_path)
+        with metrics.time("crossfade_seconds"):
+            self.true_crossfade(self.current_state["song_path"], new_song_path)
+        metrics.inc("emotion_switches_total")
+        self.selector.played(new_song_path)
         
         # Update the current state
         self.current_state["emotion"] = new_emotion
         self.current_state["song_path"] = new_song_path
         
-        if self.debug:
-            print(f"Now playing: A {new_emotion} song\n")
+        logger.debug("Now playing: A %s song", self.selector.target_emotion(new_emotion))
+        return True
+    
+    def advance_playlist(self):
+        """
+        Move a "ramp" selection on to the next song of its plan
+        
+        Returns:
+            bool: True if the music changed, False if there is no plan step left
+        """
+        emotion = self.current_state["emotion"]
+        if emotion is None:
+            return False
+        new_song_path = self.selector.next_step(emotion, self.current_state["song_path"])
+        if new_song_path is None or new_song_path == self.current_state["song_path"]:
+            return False
+        logger.debug("Advancing %s plan to: %s", self.selector.policy.name, new_song_path)
+        with metrics.time("crossfade_seconds"):
+            self.true_crossfade(self.current_state["song_path"], new_song_path)
+        self.selector.played(new_song_path)
+        self.current_state["song_path"] = new_song_path
         return True
     
     def shutdown(self):
         """Stop all playback and clean up resources"""
-        # Stop all channels
-        for i in range(8):
-            channel = pygame.mixer.Channel(i)
-            channel.stop()
-        pygame.mixer.quit()
+        # Stop fades and all channels
+        self.crossfader.stop()
+        self.library.stop_polling()
+        self.features.stop()
+        for i in (self.music_channels if self.shared_mixer else range(self.mixer.get_num_channels())):
+            self._stop_channel(i)
+        if self.debug:
+            print(f"Song cache stats: {self.get_cache_stats()}")
+        self.sound_cache.close()
+        if not self.shared_mixer:
+            self.mixer.quit()
         if self.debug:
             print("MoodMuse system shut down.")
     
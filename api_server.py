@@ -0,0 +1,385 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import struct
+import threading
+import time
+
+import cv2
+
+"""
+Local HTTP/WebSocket API for the frontend, running on its own asyncio event
+loop thread so clients never slow the detection loop.
+
+    GET  /state        current emotion and now-playing song (JSON)
+    GET  /stats        session mood statistics (JSON)
+    POST /override     {"emotion": "happy", "hold": 30} - play an emotion manually
+    GET  /ws           WebSocket: state pushed on every change; accepts
+                       {"override": "happy", "hold": 30} messages
+    GET  /preview.mjpg MJPEG preview of the annotated camera frames
+
+The detection loop only calls publish_state() and offer_frame(). Both are
+cheap and never block on clients. State is pushed only when it changes.
+Each client keeps only the newest unsent message, so a slow client skips
+intermediate states instead of queueing them. Preview frames are
+rate-limited, copied only while someone is watching, and JPEG-encoded on a
+separate thread.
+"""
+
+logger = logging.getLogger(__name__)
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_REQUEST_BYTES = 64 * 1024
+MJPEG_BOUNDARY = "frame"
+
+
+def websocket_accept(key):
+    """Sec-WebSocket-Accept value for a handshake key (RFC 6455, section 4.2.2)"""
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def encode_frame(payload, opcode=0x1):
+    """Encode one unmasked, final WebSocket frame, as servers send them"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_frame(reader):
+    """
+    Read one WebSocket frame
+
+    Returns:
+        tuple: (fin, opcode, payload)
+    """
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_REQUEST_BYTES:
+        raise ValueError("WebSocket frame too large")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class PreviewEncoder(threading.Thread):
+    """Downscales and JPEG-encodes the newest offered frame, off the capture thread"""
+
+    def __init__(self, on_frame, fps=5.0, width=320, quality=70):
+        super().__init__(name="preview-encoder")
+        self.on_frame = on_frame
+        self.interval = 1.0 / fps
+        self.width = width
+        self.quality = quality
+        self.frame = None
+        self.last_offer = 0.0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.encoded = 0
+
+    def offer(self, frame):
+        """Hand over a frame; ignored if one was taken less than 1/fps ago"""
+        now = time.monotonic()
+        if now - self.last_offer < self.interval:
+            return
+        self.last_offer = now
+        with self.cond:
+            self.frame = frame.copy()
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.frame is not None or self.closed)
+                if self.closed:
+                    return
+                frame, self.frame = self.frame, None
+            height = int(frame.shape[0] * self.width / frame.shape[1])
+            small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ok:
+                self.encoded += 1
+                self.on_frame(jpeg.tobytes())
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+
+class ApiServer:
+    """Asyncio HTTP/WebSocket server running on a background thread"""
+
+    def __init__(self, host="127.0.0.1", port=8765, get_stats=None, on_override=None, valid_emotions=(),
+                 preview_fps=5.0, preview_width=320):
+        """
+        Args:
+            host (str): Interface to listen on
+            port (int): TCP port
+            get_stats (callable): Returns the session statistics dict, or None
+            on_override (callable): on_override(emotion, hold) applies a manual
+                override; it runs on a worker thread and may block
+            valid_emotions (iterable): Emotions accepted as overrides
+            preview_fps (float): Rate of the MJPEG preview, 0 disables it
+            preview_width (int): Width of the preview frames
+        """
+        self.host = host
+        self.port = port
+        self.get_stats = get_stats
+        self.on_override = on_override
+        self.valid_emotions = set(valid_emotions)
+        self.state = {"emotion": None, "music_emotion": None, "now_playing": None, "override": None}
+        self.state_lock = threading.Lock()
+        self.version = 0
+        self.clients = set()  # per-WebSocket-client queues of size 1
+        self.preview_clients = 0
+        self.jpeg = None
+        self.jpeg_event = None
+        self.loop = None
+        self.server = None
+        self.writers = set()
+        self.handlers = set()
+        self.ready = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="api-server")
+        self.encoder = PreviewEncoder(self._on_jpeg, preview_fps, preview_width) if preview_fps > 0 else None
+        self.stats = {"pushes": 0, "skipped_pushes": 0, "requests": 0}
+
+    # Thread-safe entry points for the detection loop
+
+    def publish_state(self, **changes):
+        """Update state fields; connected clients are notified only if something changed"""
+        with self.state_lock:
+            if all(self.state.get(key) == value for key, value in changes.items()):
+                return
+            self.state.update(changes)
+            self.version += 1
+            message = json.dumps({"type": "state", "version": self.version, **self.state})
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._broadcast, message)
+
+    def offer_frame(self, frame):
+        """Offer an annotated frame for the preview; cheap when nobody is watching"""
+        if self.encoder is not None and self.preview_clients > 0:
+            self.encoder.offer(frame)
+
+    # Event loop side
+
+    def _broadcast(self, message):
+        for queue in self.clients:
+            if queue.full():
+                queue.get_nowait()  # Slow client: drop the state it has not sent yet
+                self.stats["skipped_pushes"] += 1
+            queue.put_nowait(message)
+            self.stats["pushes"] += 1
+
+    def _on_jpeg(self, jpeg):
+        # Called on the encoder thread
+        self.loop.call_soon_threadsafe(self._new_jpeg, jpeg)
+
+    def _new_jpeg(self, jpeg):
+        self.jpeg = jpeg
+        event, self.jpeg_event = self.jpeg_event, asyncio.Event()
+        event.set()
+
+    def start(self):
+        self.thread.start()
+        if self.encoder is not None:
+            self.encoder.start()
+        self.ready.wait()
+        if self.error is not None:
+            self.stop()
+            raise self.error
+        return self
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.jpeg_event = asyncio.Event()
+        self.stop_event = asyncio.Event()
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info("API server listening on http://%s:%s", self.host, self.port)
+        self.ready.set()
+        async with self.server:
+            await self.stop_event.wait()
+            # Long-lived WebSocket and preview connections would keep the server open
+            self._new_jpeg(None)
+            for writer in list(self.writers):
+                writer.close()
+            if self.handlers:
+                await asyncio.wait(self.handlers, timeout=1.0)
+
+    def stop(self):
+        if self.encoder is not None and self.encoder.is_alive():
+            self.encoder.close()
+            self.encoder.join()
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+        self.thread.join()
+
+    async def _handle(self, reader, writer):
+        self.handlers.add(asyncio.current_task())
+        self.writers.add(writer)
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            if len(head) > MAX_REQUEST_BYTES:
+                return
+            lines = head.decode("latin-1").split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            self.stats["requests"] += 1
+            path = path.split("?", 1)[0]
+
+            if path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(reader, writer, headers)
+            elif path == "/preview.mjpg" and method == "GET":
+                await self._preview(writer)
+            else:
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if 0 < length <= MAX_REQUEST_BYTES else b""
+                status, payload = await self._route(method, path, body)
+                self._respond(writer, status, payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def _respond(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        reason = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found"}.get(status, "Error")
+        writer.write((f"HTTP/1.1 {status} {reason}\r\n"
+                      "Content-Type: application/json\r\n"
+                      "Access-Control-Allow-Origin: *\r\n"
+                      "Access-Control-Allow-Headers: Content-Type\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      "Connection: close\r\n\r\n").encode() + body)
+
+    async def _route(self, method, path, body):
+        if method == "OPTIONS":
+            return 204, None
+        if method == "GET" and path == "/state":
+            with self.state_lock:
+                return 200, dict(self.state, version=self.version)
+        if method == "GET" and path == "/stats":
+            return 200, self.get_stats() if self.get_stats else None
+        if method == "POST" and path == "/override":
+            try:
+                command = json.loads(body or b"{}")
+            except ValueError:
+                return 400, {"error": "invalid JSON"}
+            if not isinstance(command, dict):
+                return 400, {"error": "expected a JSON object"}
+            return await self._override(command.get("emotion"), command.get("hold"))
+        return 404, {"error": "not found"}
+
+    async def _override(self, emotion, hold):
+        if self.on_override is None:
+            return 404, {"error": "overrides are disabled"}
+        emotion = str(emotion).lower()
+        if emotion not in self.valid_emotions:
+            return 400, {"error": f"unknown emotion '{emotion}'"}
+        if hold is not None:
+            if isinstance(hold, bool) or not isinstance(hold, (int, float)) or not 0 <= hold < math.inf:
+                return 400, {"error": "hold must be a non-negative number of seconds"}
+            hold = float(hold)
+        # set_emotion may decode a song, so keep it off the event loop
+        changed = await self.loop.run_in_executor(None, self.on_override, emotion, hold)
+        return 200, {"emotion": emotion, "changed": bool(changed)}
+
+    async def _websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            self._respond(writer, 400, {"error": "missing Sec-WebSocket-Key"})
+            return
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\n"
+                      "Upgrade: websocket\r\n"
+                      "Connection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n").encode())
+        queue = asyncio.Queue(maxsize=1)
+        with self.state_lock:
+            queue.put_nowait(json.dumps({"type": "state", "version": self.version, **self.state}))
+        self.clients.add(queue)
+        sender = asyncio.ensure_future(self._ws_sender(writer, queue))
+        try:
+            message = b""
+            while True:
+                fin, opcode, payload = await read_frame(reader)
+                if opcode == 0x8:  # Close
+                    writer.write(encode_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9:  # Ping
+                    writer.write(encode_frame(payload, 0xA))
+                    continue
+                if opcode in (0x0, 0x1):
+                    message += payload
+                    if fin:
+                        await self._ws_command(writer, message)
+                        message = b""
+        finally:
+            self.clients.discard(queue)
+            sender.cancel()
+
+    async def _ws_sender(self, writer, queue):
+        try:
+            while True:
+                message = await queue.get()
+                writer.write(encode_frame(message.encode()))
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _ws_command(self, writer, message):
+        try:
+            command = json.loads(message)
+        except ValueError:
+            return
+        if isinstance(command, dict) and "override" in command:
+            status, reply = await self._override(command["override"], command.get("hold"))
+            writer.write(encode_frame(json.dumps({"type": "override", "status": status, **reply}).encode()))
+
+    async def _preview(self, writer):
+        if self.encoder is None:
+            self._respond(writer, 404, {"error": "preview disabled"})
+            return
+        writer.write(("HTTP/1.1 200 OK\r\n"
+                      f"Content-Type: multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}\r\n"
+                      "Cache-Control: no-cache\r\n"
+                      "Access-Control-Allow-Origin: *\r\n\r\n").encode())
+        self.preview_clients += 1
+        try:
+            while True:
+                await self.jpeg_event.wait()
+                jpeg = self.jpeg
+                if jpeg is None:
+                    break  # Server stopping
+                writer.write((f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                              f"Content-Length: {len(jpeg)}\r\n\r\n").encode() + jpeg + b"\r\n")
+                await writer.drain()
+        finally:
+            self.preview_clients -= 1
@@ -0,0 +1,486 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from audio_stream import ffmpeg_available
+
+"""
+Per-track audio analysis, computed once per file and kept in an on-disk
+index next to the music library index. Song selection (see
+song_selection.py) uses:
+
+    tempo    - beats per minute, from the autocorrelation of the onset envelope
+    energy   - mean onset strength (spectral flux), high for busy, percussive music
+    loudness - RMS level in dBFS
+
+and crossfades use:
+
+    lufs     - integrated loudness, BS.1770-style (K-weighted, gated), to level-match tracks
+    entry    - seconds into the track where the music is under way, on a beat
+    beats    - beat times in seconds
+
+Tracks are decoded to mono at a low sample rate and every step is whole-array
+NumPy work. Run this module to analyze a whole library across all cores:
+
+    python audio_analysis.py music_files --workers 8
+"""
+
+ANALYSIS_RATE = 11025
+EXCERPT_OFFSET = 30.0  # Skip intros
+EXCERPT_SECONDS = 60.0
+FRAME = 1024
+HOP = 256
+MIN_BPM, MAX_BPM = 60, 180
+FEATURES = ("tempo", "energy", "loudness")
+INDEX_VERSION = 2
+ENVELOPE_CHUNK = 2048  # STFT frames transformed at once, bounds memory on long tracks
+
+# BS.1770 K-weighting: high shelf and high pass biquads, defined at 48 kHz
+K_WEIGHTING = (
+    ((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585)),
+    ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621)),
+)
+K_WEIGHTING_RATE = 48000
+LOUDNESS_STEP = 0.1  # Seconds between momentary loudness blocks
+MOMENTARY_BLOCK = 0.4
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+ENTRY_DROP = 10.0  # The music is under way once it is within this many LU of the track loudness
+MAX_ENTRY = 30.0
+
+
+def _decode_with_pygame(path, rate):
+    import pygame
+
+    if not pygame.mixer.get_init():
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        pygame.mixer.init()
+    mixer_rate = pygame.mixer.get_init()[0]
+    samples = pygame.sndarray.array(pygame.mixer.Sound(path)).astype(np.float32) / 32768.0
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1)
+    if mixer_rate % rate == 0:
+        # Integer ratio: average each group of samples, which also filters out aliasing highs
+        factor = mixer_rate // rate
+        samples = samples[:len(samples) // factor * factor].reshape(-1, factor).mean(axis=1)
+    elif mixer_rate != rate:
+        positions = np.arange(0, len(samples), mixer_rate / rate)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    return samples
+
+
+def decode_mono(path, rate=ANALYSIS_RATE, offset=0.0, duration=None):
+    """
+    Decode (part of) a track to mono float32 samples in [-1, 1]
+
+    Uses ffmpeg when it is available, otherwise pygame's decoder.
+    """
+    if ffmpeg_available():
+        command = ["ffmpeg", "-v", "quiet"]
+        if offset:
+            command += ["-ss", str(offset)]
+        command += ["-i", path]
+        if duration:
+            command += ["-t", str(duration)]
+        command += ["-f", "s16le", "-ac", "1", "-ar", str(rate), "-"]
+        raw = subprocess.run(command, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL).stdout
+        return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+
+    samples = _decode_with_pygame(path, rate)
+    start = int(offset * rate)
+    stop = start + int(duration * rate) if duration else None
+    return samples[start:stop]
+
+
+def onset_envelope(samples):
+    """Positive spectral flux of the log-magnitude spectrum, one value per hop"""
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME)[::HOP]
+    window = np.hanning(FRAME)
+    envelope = []
+    # Chunks overlap by one frame so the differences line up across chunk borders
+    for start in range(0, len(frames) - 1, ENVELOPE_CHUNK):
+        spectrum = np.log1p(np.abs(np.fft.rfft(frames[start:start + ENVELOPE_CHUNK + 1] * window, axis=1)))
+        envelope.append(np.maximum(np.diff(spectrum, axis=0), 0.0).mean(axis=1))
+    return np.concatenate(envelope) if envelope else np.zeros(0)
+
+
+def envelope_time(index, rate=ANALYSIS_RATE):
+    """Time in seconds of the onset at an envelope index (the centre of the later frame)"""
+    return ((np.asarray(index) + 1) * HOP + FRAME / 2) / rate
+
+
+def estimate_tempo(envelope, rate=ANALYSIS_RATE):
+    """Tempo in BPM from the strongest autocorrelation lag in the 60-180 BPM range"""
+    envelope = envelope - envelope.mean()
+    frame_rate = rate / HOP
+    min_lag = int(frame_rate * 60 / MAX_BPM)
+    max_lag = int(frame_rate * 60 / MIN_BPM) + 1
+    if len(envelope) <= max_lag + 1:
+        return None
+    correlation = np.correlate(envelope, envelope, mode="full")[len(envelope) - 1:]
+    lag = min_lag + int(np.argmax(correlation[min_lag:max_lag]))
+    # Parabolic interpolation around the peak for sub-frame resolution
+    if 0 < lag < len(correlation) - 1:
+        left, centre, right = correlation[lag - 1:lag + 2]
+        denominator = left - 2 * centre + right
+        if denominator:
+            lag = lag + 0.5 * (left - right) / denominator
+    return 60.0 * frame_rate / lag
+
+
+def k_weighting_gain(frequencies):
+    """Power gain of the K-weighting filter at the given frequencies (Hz)"""
+    z = np.exp(-2j * np.pi * np.asarray(frequencies) / K_WEIGHTING_RATE)
+    gain = np.ones(len(z))
+    for b, a in K_WEIGHTING:
+        response = (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+        gain *= np.abs(response) ** 2
+    return gain
+
+
+def loudness_profile(samples, rate=ANALYSIS_RATE):
+    """
+    BS.1770-style loudness of a mono signal. K-weighting is applied once in
+    the frequency domain; block powers come from 100 ms mean squares.
+
+    Returns:
+        tuple: (integrated loudness in LUFS or None if silent,
+                momentary loudness per LOUDNESS_STEP as an array)
+    """
+    # Zero-pad to a power of two, FFTs of arbitrary lengths can be many times slower
+    size = 1 << (len(samples) - 1).bit_length()
+    spectrum = np.fft.rfft(samples, size)
+    # The response is smooth, so evaluate it on a coarse grid and interpolate
+    coarse = np.linspace(0, rate / 2, 4097)
+    spectrum *= np.sqrt(np.interp(np.fft.rfftfreq(size, 1.0 / rate), coarse, k_weighting_gain(coarse)))
+    weighted = np.fft.irfft(spectrum, size)[:len(samples)]
+
+    step = int(rate * LOUDNESS_STEP)
+    steps = len(weighted) // step
+    per_step = np.square(weighted[:steps * step], dtype=np.float64).reshape(steps, step).mean(axis=1)
+    width = int(round(MOMENTARY_BLOCK / LOUDNESS_STEP))
+    if steps < width:
+        return None, np.zeros(0)
+    # Overlapping 400 ms blocks, one every 100 ms
+    power = np.convolve(per_step, np.ones(width) / width, mode="valid")
+    momentary = -0.691 + 10 * np.log10(power + 1e-12)
+
+    gated = power[momentary > ABSOLUTE_GATE]
+    if not len(gated):
+        return None, momentary
+    relative = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+    gated = gated[-0.691 + 10 * np.log10(gated) > relative]
+    return float(-0.691 + 10 * np.log10(gated.mean())), momentary
+
+
+def track_beats(envelope, rate=ANALYSIS_RATE):
+    """
+    Beat times on a fixed grid at the estimated tempo, phase chosen to hit
+    the most onset strength, each beat moved to the strongest onset nearby.
+
+    Returns:
+        ndarray: Beat times in seconds
+    """
+    tempo = estimate_tempo(envelope, rate)
+    if tempo is None:
+        return np.zeros(0)
+    period = 60.0 * rate / HOP / tempo
+    grid = np.arange(0, len(envelope) - period, period)
+    phases = np.arange(int(period))
+    indices = np.round(grid[None, :] + phases[:, None]).astype(int)
+    grid = indices[np.argmax(envelope[indices].sum(axis=1))]
+
+    radius = max(1, int(period / 8))
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(envelope, radius), 2 * radius + 1)
+    beats = grid + np.argmax(windows[grid], axis=1) - radius
+    return envelope_time(beats, rate)
+
+
+def entry_offset(momentary, lufs, beats):
+    """
+    Where to start playing: the first beat at or before the point where the
+    momentary loudness first comes within ENTRY_DROP LU of the track's
+    loudness, so quiet intros are skipped.
+
+    Returns:
+        float: Offset in seconds
+    """
+    if lufs is None or not len(momentary):
+        return 0.0
+    under_way = np.flatnonzero(momentary >= lufs - ENTRY_DROP)
+    if not len(under_way):
+        return 0.0
+    limit = min(MAX_ENTRY, len(momentary) * LOUDNESS_STEP / 4)
+    entry = min(under_way[0] * LOUDNESS_STEP, limit)
+    earlier = beats[beats <= entry]
+    if len(earlier):
+        entry = earlier[-1]
+    return float(entry) if entry >= 0.5 else 0.0
+
+
+def analyze_dynamics(samples, rate=ANALYSIS_RATE):
+    """
+    Returns:
+        dict: "lufs", "entry" and "beats" of a whole track
+    """
+    lufs, momentary = loudness_profile(samples, rate)
+    beats = track_beats(onset_envelope(samples), rate) if len(samples) > FRAME + 8 * HOP else np.zeros(0)
+    return {
+        "lufs": round(lufs, 2) if lufs is not None else None,
+        "entry": round(entry_offset(momentary, lufs, beats), 3),
+        "beats": np.round(beats, 3).tolist(),
+    }
+
+
+def analyze_samples(samples, rate=ANALYSIS_RATE):
+    """
+    Returns:
+        dict: "tempo", "energy" and "loudness"; None values if the audio is too short
+    """
+    if len(samples) < FRAME + 8 * HOP:
+        return {feature: None for feature in FEATURES}
+    envelope = onset_envelope(samples)
+    tempo = estimate_tempo(envelope, rate)
+    rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+    return {
+        "tempo": round(float(tempo), 1) if tempo else None,
+        "energy": round(float(envelope.mean()), 5),
+        "loudness": round(float(20 * np.log10(rms + 1e-9)), 2),
+    }
+
+
+def analyze_file(path):
+    """
+    Analyze a whole track. Tempo and energy describe an excerpt after the
+    intro; short tracks use their start.
+    """
+    samples = decode_mono(path)
+    excerpt = samples[int(EXCERPT_OFFSET * ANALYSIS_RATE):int((EXCERPT_OFFSET + EXCERPT_SECONDS) * ANALYSIS_RATE)]
+    if len(excerpt) < ANALYSIS_RATE * 10:
+        excerpt = samples[:int(EXCERPT_SECONDS * ANALYSIS_RATE)]
+    features = analyze_samples(excerpt)
+    features.update(analyze_dynamics(samples))
+    return features
+
+
+def _failed_analysis():
+    return dict({feature: None for feature in FEATURES}, lufs=None, entry=0.0, beats=[])
+
+
+class FeatureIndex:
+    """
+    Audio features of every library track, persisted to a JSON index and
+    recomputed only for files whose size or mtime changed.
+    """
+
+    def __init__(self, library, index_path=None, debug=False):
+        """
+        Args:
+            library (MusicLibrary): Library whose tracks are analyzed
+            index_path (str): Index file, defaults to <root>/.features_index.json
+            debug (bool): Enable debug output if True
+        """
+        self.library = library
+        self.index_path = index_path or os.path.join(library.root, ".features_index.json")
+        self.debug = debug
+        self.version = 0  # Bumped whenever features change, so consumers can refresh derived data
+        self.lock = threading.Lock()
+        self.thread = None
+        self.process = None  # Background analyzer process
+        self.features = self._read_index()  # path -> {"size", "mtime", "tempo", "energy", "loudness", ...}
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION:
+                return index["tracks"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return {}
+
+    def _index_mtime(self):
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"version": INDEX_VERSION, "tracks": self.features}, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            if self.debug:
+                print(f"Could not write features index: {e}")
+
+    def _is_fresh(self, path, track):
+        entry = self.features.get(path)
+        return entry is not None and entry["size"] == track["size"] and entry["mtime"] == track["mtime"]
+
+    def stale(self):
+        """
+        Returns:
+            list: Library tracks without up-to-date features
+        """
+        return [path for path, track in list(self.library.tracks.items()) if not self._is_fresh(path, track)]
+
+    def _store(self, path, track, features):
+        with self.lock:
+            self.features[path] = dict(features, size=track["size"], mtime=track["mtime"])
+            self.version += 1
+
+    def update(self, workers=1, save_every=25):
+        """
+        Analyze every track that is new or changed
+
+        Args:
+            workers (int): Processes analyzing tracks in parallel; 1 analyzes
+                on the calling thread, None uses every core
+            save_every (int): Write the index after this many tracks, so an
+                interrupted pass keeps its progress
+
+        Returns:
+            int: Number of tracks analyzed
+        """
+        paths = [(path, self.library.get_track(path)) for path in self.stale()]
+        paths = [(path, track) for path, track in paths if track is not None]
+        done = 0
+
+        def finished(path, track, features):
+            nonlocal done
+            self._store(path, track, features)
+            done += 1
+            if done % save_every == 0:
+                with self.lock:
+                    self._save_index()
+
+        if workers == 1 or len(paths) <= 1:
+            for path, track in paths:
+                try:
+                    features = analyze_file(path)
+                except Exception as e:
+                    if self.debug:
+                        print(f"Could not analyze {path}: {e}")
+                    features = _failed_analysis()
+                finished(path, track, features)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(analyze_file, path): (path, track) for path, track in paths}
+                for future in as_completed(futures):
+                    path, track = futures[future]
+                    try:
+                        features = future.result()
+                    except Exception as e:
+                        if self.debug:
+                            print(f"Could not analyze {path}: {e}")
+                        features = _failed_analysis()
+                    finished(path, track, features)
+
+        if paths:
+            with self.lock:
+                # Forget tracks that left the library
+                for path in [path for path in self.features if path not in self.library.tracks]:
+                    del self.features[path]
+                self._save_index()
+            if self.debug:
+                print(f"Analyzed {len(paths)} tracks")
+        return len(paths)
+
+    def start_background_update(self, poll_interval=5.0):
+        """
+        Analyze new tracks in a separate, low-priority run of this module's command
+        line tool, so decoding never competes with capture and inference in this
+        process. The index is reloaded whenever the tool saves progress; selection
+        works meanwhile with what is known.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        if not self.stale():
+            return
+        self.thread = threading.Thread(target=self._run_analyzer, args=(poll_interval,),
+                                       name="audio-analysis", daemon=True)
+        self.thread.start()
+
+    def _run_analyzer(self, poll_interval):
+        command = [sys.executable, os.path.abspath(__file__), self.library.root,
+                   "--workers", "1", "--index", self.index_path, "--nice", "10"]
+        output = None if self.debug else subprocess.DEVNULL
+        try:
+            self.process = subprocess.Popen(command, stdout=output, stderr=output)
+        except OSError as e:
+            if self.debug:
+                print(f"Could not start audio analysis: {e}")
+            return
+        last_mtime = self._index_mtime()
+        finished = False
+        while not finished:
+            try:
+                self.process.wait(timeout=poll_interval)
+                finished = True
+            except subprocess.TimeoutExpired:
+                pass
+            mtime = self._index_mtime()
+            if mtime != last_mtime:
+                last_mtime = mtime
+                features = self._read_index()
+                with self.lock:
+                    self.features = features
+                    self.version += 1
+
+    def stop(self):
+        """Stop a background analysis; the tracks it finished stay in the index"""
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5.0)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def get(self, path):
+        """
+        Returns:
+            dict or None: Features of a track
+        """
+        return self.features.get(path)
+
+
+def main():
+    from music_library import MusicLibrary
+
+    parser = argparse.ArgumentParser(description="Analyze a music library for song selection and crossfades")
+    parser.add_argument("root", nargs="?", default="music_files", help="music directory with one folder per emotion")
+    parser.add_argument("--workers", type=int, default=None, help="analysis processes (default: one per core)")
+    parser.add_argument("--force", action="store_true", help="re-analyze every track")
+    parser.add_argument("--index", help="index file, defaults to <root>/.features_index.json")
+    parser.add_argument("--nice", type=int, default=0, help="lower this process's scheduling priority")
+    args = parser.parse_args()
+
+    if args.nice and hasattr(os, "nice"):
+        os.nice(args.nice)
+    emotions = sorted(entry.name for entry in os.scandir(args.root) if entry.is_dir())
+    library = MusicLibrary(args.root, emotions)
+    index = FeatureIndex(library, index_path=args.index, debug=True)
+    if args.force:
+        index.features = {}
+    start = time.perf_counter()
+    count = index.update(workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"{count} of {len(library.tracks)} tracks analyzed in {elapsed:.1f}s")
+    for path in sorted(index.features):
+        entry = index.features[path]
+        print(f"{os.path.basename(path)}: {entry['lufs']} LUFS, entry {entry['entry']}s, "
+              f"{entry['tempo']} BPM, {len(entry['beats'])} beats")
+
+
+if __name__ == "__main__":
+    main()
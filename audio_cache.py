@@ -0,0 +1,255 @@
+import threading
+import time
+from collections import OrderedDict
+from queue import Empty, Queue
+
+import pygame
+
+"""
+Cache of decoded pygame Sounds. Decoding an MP3 with pygame.mixer.Sound
+takes seconds, so MoodMuse keeps decoded tracks in memory (up to a byte
+budget, least recently used first out) and warms likely next tracks on a
+background thread before they are needed.
+"""
+
+
+def sound_size(sound, mixer=pygame.mixer):
+    """
+    Estimate the size of a decoded sound in bytes from its length and the mixer format
+
+    Args:
+        sound (pygame.mixer.Sound): A decoded sound
+        mixer: The mixer the sound was decoded for
+
+    Returns:
+        int: Size of the PCM buffer in bytes
+    """
+    frequency, sample_format, channels = mixer.get_init()
+    return int(sound.get_length() * frequency) * channels * (abs(sample_format) // 8)
+
+
+def trim_sound(sound, offset, mixer=pygame.mixer):
+    """
+    Copy of a sound starting `offset` seconds in, made from a view of its
+    PCM buffer so only the kept part is copied
+
+    Args:
+        sound (pygame.mixer.Sound): A decoded sound
+        offset (float): Seconds to cut from the start
+        mixer: The mixer the sound was decoded for
+
+    Returns:
+        pygame.mixer.Sound: The trimmed sound, or the original if the offset is past its end
+    """
+    frequency, sample_format, channels = mixer.get_init()
+    frame_bytes = channels * (abs(sample_format) // 8)
+    pcm = memoryview(sound).cast("B")
+    start = int(offset * frequency) * frame_bytes
+    if start >= len(pcm):
+        return sound
+    return mixer.Sound(buffer=pcm[start:])
+
+
+class SoundCache:
+    """
+    LRU cache of decoded sounds keyed by file path, bounded by a memory budget
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, debug=False, cue=None, mixer=None, threaded=True):
+        """
+        Args:
+            max_bytes (int): Memory budget for decoded audio in bytes
+            debug (bool): Enable debug output if True
+            cue (callable): Returns the offset in seconds a file should start
+                at; sounds are cached trimmed to it, so playback (and looping)
+                starts there with no work at transition time. A sound cached
+                before its offset was known is trimmed again when next used
+            mixer: Module or object with the pygame.mixer API, defaults to pygame.mixer
+            threaded (bool): Preload on a background thread; if False, requested
+                preloads wait until the owner calls run_preloads()
+        """
+        self.max_bytes = max_bytes
+        self.cue = cue
+        self.mixer = mixer or pygame.mixer
+        self.debug = debug
+        self.sounds = OrderedDict()  # path -> (sound, size, cue offset), least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.decoding = {}  # path -> Event, set when a decode in progress finishes
+
+        # A get() served by waiting on a preload in flight counts as a preload wait, not a miss
+        self.stats = {"hits": 0, "misses": 0, "preload_waits": 0, "preload_wait_time": 0.0,
+                      "evictions": 0, "decodes": 0, "decode_time": 0.0, "retrims": 0}
+
+        self.threaded = threaded
+        self.preload_queue = Queue()
+        self.preload_thread = None
+
+    def get(self, path):
+        """
+        Return the decoded sound for a file, decoding it on a miss
+
+        Args:
+            path (str): Path to the audio file
+
+        Returns:
+            pygame.mixer.Sound: The decoded sound
+        """
+        with self.lock:
+            entry = self.sounds.get(path)
+            if entry is not None:
+                self.sounds.move_to_end(path)
+            pending = self.decoding.get(path)
+        if entry is not None:
+            sound = self._refresh(path, entry)
+            if sound is not None:
+                with self.lock:
+                    self.stats["hits"] += 1
+                return sound
+
+        elif pending is not None:
+            # The preloader is already decoding this file, wait for it
+            start = time.perf_counter()
+            pending.wait()
+            with self.lock:
+                self.stats["preload_waits"] += 1
+                self.stats["preload_wait_time"] += time.perf_counter() - start
+                entry = self.sounds.get(path)
+                if entry is not None:
+                    self.sounds.move_to_end(path)
+            if entry is not None:
+                sound = self._refresh(path, entry)
+                if sound is not None:
+                    return sound
+        with self.lock:
+            self.stats["misses"] += 1
+        return self._decode(path)
+
+    def contains(self, path):
+        with self.lock:
+            return path in self.sounds
+
+    def _cue(self, path):
+        return self.cue(path) if self.cue else 0.0
+
+    def _refresh(self, path, entry):
+        """
+        Bring a cached sound up to date with its cue offset, which may have been
+        analyzed after the sound was decoded
+
+        Returns:
+            pygame.mixer.Sound or None: The sound to play, None if it must be decoded again
+        """
+        sound, _, offset = entry
+        wanted = self._cue(path)
+        if wanted == offset:
+            return sound
+        if wanted < offset:
+            return None  # The cut-off start is gone
+        trimmed = trim_sound(sound, wanted - offset, self.mixer)
+        size = sound_size(trimmed, self.mixer)
+        with self.lock:
+            if self.sounds.get(path) is entry:
+                self._insert(path, trimmed, size, wanted)
+                self.stats["retrims"] += 1
+        return trimmed
+
+    def _decode(self, path):
+        with self.lock:
+            done = self.decoding.setdefault(path, threading.Event())
+        try:
+            start = time.perf_counter()
+            sound = self.mixer.Sound(path)
+            offset = self._cue(path)
+            if offset:
+                sound = trim_sound(sound, offset, self.mixer)
+            elapsed = time.perf_counter() - start
+            size = sound_size(sound, self.mixer)
+            with self.lock:
+                self.stats["decodes"] += 1
+                self.stats["decode_time"] += elapsed
+                self._insert(path, sound, size, offset)
+            if self.debug:
+                print(f"Decoded {path} in {elapsed:.2f}s ({size / 1e6:.1f} MB)")
+            return sound
+        finally:
+            with self.lock:
+                self.decoding.pop(path, None)
+            done.set()
+
+    def _insert(self, path, sound, size, offset):
+        """Add a sound and evict least recently used ones until within budget (lock held)"""
+        if path in self.sounds:
+            self.total_bytes -= self.sounds.pop(path)[1]
+        self.sounds[path] = (sound, size, offset)
+        self.total_bytes += size
+        # Always keep the newest sound, even if it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self.sounds) > 1:
+            _, (_, evicted_size, _) = self.sounds.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.stats["evictions"] += 1
+
+    def preload(self, paths):
+        """
+        Decode files on a background thread so later get() calls are hits
+
+        Args:
+            paths (list): File paths to warm, in priority order
+        """
+        for path in paths:
+            self.preload_queue.put(path)
+        if self.threaded and self.preload_thread is None:
+            self.preload_thread = threading.Thread(target=self._preload_worker, daemon=True)
+            self.preload_thread.start()
+
+    def _preload_worker(self):
+        while True:
+            path = self.preload_queue.get()
+            if path is None:
+                self.preload_queue.task_done()
+                break
+            self._preload(path)
+
+    def _preload(self, path):
+        with self.lock:
+            entry = self.sounds.get(path)
+            skip = path in self.decoding
+        try:
+            # A sound cached before its analysis arrived is trimmed to its entry point now
+            if not skip and (entry is None or self._refresh(path, entry) is None):
+                self._decode(path)
+        except Exception as e:
+            if self.debug:
+                print(f"Error preloading {path}: {e}")
+        finally:
+            self.preload_queue.task_done()
+
+    def run_preloads(self):
+        """Decode the requested preloads on the calling thread (threaded=False)"""
+        while True:
+            try:
+                path = self.preload_queue.get_nowait()
+            except Empty:
+                return
+            self._preload(path)
+
+    def close(self):
+        """Stop the preloader and drop all cached sounds"""
+        if self.preload_thread is not None:
+            self.preload_queue.put(None)
+            self.preload_thread.join(timeout=1.0)
+            self.preload_thread = None
+        with self.lock:
+            self.sounds.clear()
+            self.total_bytes = 0
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Hit/miss/eviction counters, decode time and current memory use
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["cached_sounds"] = len(self.sounds)
+            stats["cached_bytes"] = self.total_bytes
+        return stats
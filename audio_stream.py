@@ -0,0 +1,139 @@
+import shutil
+import subprocess
+import threading
+from collections import deque
+
+import pygame
+
+"""
+Streaming playback for long tracks. Instead of decoding a whole song into
+memory with pygame.mixer.Sound, an ffmpeg process decodes it to raw PCM and
+short chunks are fed to a mixer channel through a small ring buffer. Each
+stream owns one channel, so two streams can play at once for a crossfade.
+"""
+
+
+def ffmpeg_available():
+    """
+    Returns:
+        bool: True if the ffmpeg binary needed for streaming is on the PATH
+    """
+    return shutil.which("ffmpeg") is not None
+
+
+class StreamingSound:
+    """
+    Plays one file on one mixer channel by decoding it in chunks.
+    Only buffer_chunks chunks of chunk_seconds each are held in memory.
+    """
+
+    def __init__(self, path, channel, chunk_seconds=0.5, buffer_chunks=4, loops=-1, start=0.0, debug=False):
+        """
+        Args:
+            path (str): Path to the audio file
+            channel (pygame.mixer.Channel): Channel to play on
+            chunk_seconds (float): Length of each decoded chunk
+            buffer_chunks (int): Number of decoded chunks kept ready
+            loops (int): Extra times to play the file, -1 to loop forever
+            start (float): Seconds into the file where playback (and every loop) starts
+            debug (bool): Enable debug output if True
+        """
+        if not ffmpeg_available():
+            raise RuntimeError("Streaming playback needs ffmpeg on the PATH")
+
+        self.path = path
+        self.channel = channel
+        self.loops = loops
+        self.start = start
+        self.debug = debug
+        self.volume = 1.0
+
+        self.frequency, sample_format, self.channels = pygame.mixer.get_init()
+        frame_bytes = self.channels * (abs(sample_format) // 8)
+        self.chunk_bytes = int(self.frequency * chunk_seconds) * frame_bytes
+        self.chunk_seconds = chunk_seconds
+        self.buffer = deque()
+        self.buffer_chunks = buffer_chunks
+
+        self.process = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _open_decoder(self):
+        # -ss before -i seeks in the input instead of decoding up to the offset
+        seek = ["-ss", str(self.start)] if self.start else []
+        self.process = subprocess.Popen(
+            ["ffmpeg", "-v", "quiet"] + seek + ["-i", self.path,
+             "-f", "s16le", "-ac", str(self.channels), "-ar", str(self.frequency), "-"],
+            stdout=subprocess.PIPE, stdin=subprocess.DEVNULL
+        )
+
+    def _close_decoder(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def _read_chunk(self):
+        """Decode the next chunk, restarting the file at the end when looping"""
+        data = self.process.stdout.read(self.chunk_bytes)
+        if not data:
+            self._close_decoder()
+            if self.loops == 0:
+                return None
+            if self.loops > 0:
+                self.loops -= 1
+            self._open_decoder()
+            data = self.process.stdout.read(self.chunk_bytes)
+            if not data:
+                return None
+        return pygame.mixer.Sound(buffer=data)
+
+    def _fill_buffer(self):
+        """Top up the ring buffer; returns False once the file is exhausted"""
+        while len(self.buffer) < self.buffer_chunks:
+            chunk = self._read_chunk()
+            if chunk is None:
+                return False
+            self.buffer.append(chunk)
+        return True
+
+    def play(self, volume=1.0):
+        """Start decoding and playing on the channel"""
+        self._open_decoder()
+        self._fill_buffer()
+        if not self.buffer:
+            raise RuntimeError(f"Could not decode {self.path}")
+        self.channel.play(self.buffer.popleft())
+        self.set_volume(volume)
+        self.thread = threading.Thread(target=self._feed, daemon=True)
+        self.thread.start()
+
+    def _feed(self):
+        """Hand the next chunk to the channel whenever its queue slot is free"""
+        more = True
+        while not self.stop_event.is_set():
+            if more:
+                more = self._fill_buffer()
+            if self.channel.get_queue() is None:
+                if not self.buffer:
+                    if not more:
+                        break
+                    continue
+                self.channel.queue(self.buffer.popleft())
+                # Keep the volume when a queued chunk starts
+                self.channel.set_volume(self.volume)
+            self.stop_event.wait(self.chunk_seconds / 4)
+
+    def set_volume(self, volume):
+        self.volume = volume
+        self.channel.set_volume(volume)
+
+    def stop(self):
+        """Stop playback and the decoder"""
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.channel.stop()
+        self._close_decoder()
+        self.buffer.clear()
@@ -0,0 +1,575 @@
+import argparse
+import glob
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+
+"""
+Benchmarks for MoodMuse. Each subcommand measures one part of the system
+on recorded frames (a video file or a directory of images) or synthetic
+input, so results are reproducible without a webcam. Heavy dependencies are
+imported by the subcommands that need them.
+
+    python benchmark.py batching recorded_session.mp4 --batch-size 8
+    python benchmark.py state
+    python benchmark.py playback music_files/*/*.mp3
+    python benchmark.py library --tracks 20000
+    python benchmark.py backends recorded_session.mp4
+    python benchmark.py detectors recorded_session.mp4
+    python benchmark.py analysis recorded_session.mp4 --batch-size 32
+    python benchmark.py streams recorded_session.mp4 --streams 4 --workers 1 2 4
+    python benchmark.py cache recorded_session.mp4
+    python benchmark.py simulate --hours 100 --baseline baseline.json
+    python benchmark.py motion recorded_session.mp4
+"""
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_frames(source, limit=None, size=(640, 480)):
+    """
+    Load recorded frames from a video file or a directory of images
+
+    Args:
+        source (str): Path to a video file or an image directory
+        limit (int): Maximum number of frames to load
+        size (tuple): Frames are resized to this (width, height)
+
+    Returns:
+        list: BGR frames
+    """
+    import cv2
+
+    frames = []
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source)
+                       if name.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[:limit]:
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                frames.append(cv2.resize(frame, size))
+    else:
+        cap = cv2.VideoCapture(source)
+        while limit is None or len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, size))
+        cap.release()
+    return frames
+
+
+def detect_faces(frames, detector=None):
+    """Run a face detector (the Haar cascade by default) over every frame, as the live loop does"""
+    import cv2
+    from face_detectors import HaarFaceDetector
+
+    detector = detector or HaarFaceDetector()
+    detections = []
+    for frame in frames:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        detections.append(detector.detect(frame, gray))
+    return detections
+
+
+def bench_batching(args):
+    """Compare faces/sec of the per-face path against batched inference"""
+    from face_emotion import process_face, FaceBatcher
+
+    frames = load_frames(args.source, args.limit)
+    detections = detect_faces(frames)
+    total_faces = sum(len(faces) for faces in detections)
+    print(f"{len(frames)} frames, {total_faces} faces")
+    if total_faces == 0:
+        print("No faces found in the recording, nothing to benchmark.")
+        return
+
+    start = time.perf_counter()
+    per_face = []
+    for frame, faces in zip(frames, detections):
+        for (x, y, w, h) in faces:
+            per_face.append(process_face(frame[y:y+h, x:x+w]))
+    per_face_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = []
+    batcher = FaceBatcher(max_batch_size=args.batch_size, window_frames=args.window)
+    for frame_id, (frame, faces) in enumerate(zip(frames, detections)):
+        batcher.add_frame(frame_id, frame, faces)
+        if batcher.ready():
+            batched.extend(result for _, _, result in batcher.flush())
+    batched.extend(result for _, _, result in batcher.flush())
+    batched_time = time.perf_counter() - start
+
+    agree = sum(1 for a, b in zip(per_face, batched)
+                if a and b and a['label'] == b['label'])
+    print(f"per-face: {total_faces / per_face_time:.1f} faces/sec ({per_face_time:.2f}s)")
+    print(f"batched (batch={args.batch_size}, window={args.window}): "
+          f"{total_faces / batched_time:.1f} faces/sec ({batched_time:.2f}s)")
+    print(f"speedup: {per_face_time / batched_time:.2f}x, label agreement: {agree}/{total_faces}")
+
+
+def reference_state(window, previous):
+    """Brute-force mode of the window with the same tie-breaking as CurrentStateUpdate"""
+    from CurrentState import EMOTIONS
+
+    counts = Counter(window)
+    best = max(counts.values())
+    if counts[previous] == best:
+        return previous
+    return next(emotion for emotion in EMOTIONS if counts[emotion] == best)
+
+
+def bench_state(args):
+    """Check CurrentStateUpdate against a Counter over random streams, then time it"""
+    from CurrentState import CurrentStateUpdate, EMOTIONS
+
+    rng = random.Random(args.seed)
+    for stream in range(args.streams):
+        window_size = rng.randint(1, 200)
+        # Skewed label distributions produce long runs and frequent ties
+        weights = [rng.random() ** 3 for _ in EMOTIONS]
+        state = CurrentStateUpdate(window_size)
+        window = deque(["neutral"] * window_size)
+        expected = "neutral"
+        for step in range(rng.randint(1, 2000)):
+            emotion = rng.choices(EMOTIONS, weights)[0]
+            window.popleft()
+            window.append(emotion)
+            expected = reference_state(window, expected)
+            actual = state.update_state(emotion)
+            if actual != expected:
+                raise AssertionError(f"stream {stream}, step {step}: got {actual}, expected {expected} "
+                                     f"(window={window_size}, counts={dict(Counter(window))})")
+    print(f"{args.streams} random streams agree with the brute-force Counter mode")
+
+    stream = [rng.choice(EMOTIONS) for _ in range(100000)]
+    state = CurrentStateUpdate()
+    start = time.perf_counter()
+    for i in range(args.updates):
+        state.update_state(stream[i % len(stream)])
+    elapsed = time.perf_counter() - start
+    print(f"{args.updates} updates in {elapsed:.2f}s: {1e9 * elapsed / args.updates:.0f} ns/update")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_playback(args):
+    """
+    Play through a playlist with a crossfade into every track and report peak RSS.
+    Without --mode, each playback mode runs in its own process so the
+    high-water marks don't mix.
+    """
+    if args.mode is None:
+        for mode in ("memory", "stream"):
+            command = [sys.executable, __file__, "playback", "--mode", mode,
+                       "--seconds", str(args.seconds), "--cache-mb", str(args.cache_mb)] + args.files
+            subprocess.run(command, check=False)
+        return
+
+    # Play through the dummy audio driver so no sound device is needed
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    from MoodMuse import MoodMuse
+
+    files = args.files or sorted(glob.glob("music_files/*/*.mp3"))
+    pygame.init()
+    mood_muse = MoodMuse(cache_bytes=args.cache_mb * 1024 * 1024, preload=False, playback=args.mode)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    previous = None
+    for path in files:
+        mood_muse.true_crossfade(previous, path)
+        time.sleep(args.seconds)
+        previous = path
+    elapsed = time.perf_counter() - start
+    mood_muse.shutdown()
+    print(f"{args.mode}: {len(files)} tracks in {elapsed:.1f}s, "
+          f"peak RSS {peak_rss_mb():.0f} MB (start {baseline:.0f} MB)")
+
+
+def bench_library(args):
+    """Cold scan, warm start and lookup cost of the music library index on a synthetic library"""
+    from music_library import MusicLibrary
+
+    emotions = ["angry", "fear", "neutral", "sad", "disgust", "happy", "surprise"]
+    # One MPEG-1 Layer III, 128 kbps, 44.1 kHz stereo frame header followed by silence
+    frame = bytes([0xFF, 0xFB, 0x90, 0x00]) + bytes(413)
+    with tempfile.TemporaryDirectory() as root:
+        for emotion in emotions:
+            os.mkdir(os.path.join(root, emotion))
+        for i in range(args.tracks):
+            with open(os.path.join(root, emotions[i % len(emotions)], f"track{i:06d}.mp3"), "wb") as f:
+                f.write(frame * 4)
+
+        start = time.perf_counter()
+        MusicLibrary(root, emotions)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        library = MusicLibrary(root, emotions)
+        warm = time.perf_counter() - start
+
+        start = time.perf_counter()
+        library.refresh(full=True)
+        full = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(100000):
+            random.choice(library.songs[emotions[i % len(emotions)]])
+        lookup = time.perf_counter() - start
+
+    print(f"{args.tracks} tracks: cold scan {cold:.2f}s, warm start {warm:.3f}s, "
+          f"full re-stat {full:.2f}s, song pick {1e9 * lookup / 100000:.0f} ns")
+
+
+def bench_backends(args):
+    """Compare latency, throughput and label agreement of the inference backends"""
+    from inference_backends import load_backend
+
+    frames = load_frames(args.source, args.limit)
+    detections = detect_faces(frames)
+    crops = [frame[y:y+h, x:x+w] for frame, faces in zip(frames, detections) for (x, y, w, h) in faces]
+    print(f"{len(frames)} frames, {len(crops)} faces")
+    if not crops:
+        print("No faces found in the recording, nothing to benchmark.")
+        return
+
+    reference = None
+    for name in args.backends:
+        variants = [(name, True)] if name == "pipeline" else [(name, False), (name + "-int8", True)]
+        for label, quantized in variants:
+            try:
+                backend = load_backend(name, args.model_dir, args.export_dir, quantized)
+            except Exception as e:
+                print(f"{label}: unavailable ({e})")
+                continue
+            backend.classify(crops[:1])  # Warm-up
+
+            start = time.perf_counter()
+            for crop in crops:
+                backend.classify([crop])
+            latency = (time.perf_counter() - start) / len(crops)
+
+            start = time.perf_counter()
+            outputs = backend.classify(crops, batch_size=args.batch_size)
+            throughput = len(crops) / (time.perf_counter() - start)
+
+            labels = [output[0]["label"] for output in outputs]
+            if reference is None:
+                reference = labels
+            agree = sum(a == b for a, b in zip(labels, reference))
+            print(f"{label}: {1000 * latency:.1f} ms/face, {throughput:.1f} faces/sec (batch {args.batch_size}), "
+                  f"agreement with {args.backends[0]}: {agree}/{len(crops)}")
+
+
+def bench_detectors(args):
+    """Compare face detectors: detection time and the classifier calls they cause downstream"""
+    import cv2
+    from face_detectors import make_detector
+    from face_tracker import FaceTracker
+
+    frames = load_frames(args.source, args.limit)
+    grays = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
+    print(f"{len(frames)} frames")
+    for name in args.detectors:
+        for scale in args.scales:
+            label = f"{name}@{scale:g}"
+            options = {"model_path": args.yunet_model} if name == "yunet" else {}
+            try:
+                detector = make_detector(name, **options)
+            except Exception as e:
+                print(f"{label}: unavailable ({e})")
+                continue
+
+            # Untracked: every detected face is classified
+            start = time.perf_counter()
+            faces = [detector.detect(frame, gray, scale) for frame, gray in zip(frames, grays)]
+            elapsed = time.perf_counter() - start
+            calls = sum(len(boxes) for boxes in faces)
+
+            # Tracked: the tracker decides when the detector and classifier run
+            detector = make_detector(name, **options)
+            tracker = FaceTracker(detect_every=args.detect_every, classify_every=args.classify_every)
+            for frame, gray in zip(frames, grays):
+                for track in tracker.update(gray, lambda gray: detector.detect(frame, gray, scale)):
+                    if tracker.needs_classification(track):
+                        tracker.set_result(track, {"label": "neutral", "score": 1.0})
+
+            with_faces = sum(1 for boxes in faces if len(boxes) > 0)
+            print(f"{label}: {1000 * elapsed / len(frames):.2f} ms/frame, "
+                  f"faces in {with_faces}/{len(frames)} frames, classifier calls {calls} "
+                  f"(tracked: {tracker.stats['classifications']})")
+
+
+def bench_analysis(args):
+    """End-to-end headless throughput: frames/sec and per-stage timings"""
+    from offline_analysis import add_arguments, analyze
+
+    parser = argparse.ArgumentParser(prog="benchmark.py analysis")
+    add_arguments(parser)
+    analyze(parser.parse_args(args.options))
+
+
+def bench_simulation(args):
+    """Emotion -> music path in virtual time: switch latency and rate, crossfade overlap, decode stalls"""
+    from simulation import add_arguments, simulate
+
+    parser = argparse.ArgumentParser(prog="benchmark.py simulate")
+    add_arguments(parser)
+    simulate(parser.parse_args(args.options))
+
+
+def synthetic_scene(frames, size=(640, 480), seed=0):
+    """
+    A static room with sensor noise, then a moving blob, then static again, for
+    the motion gate benchmark when no recording is given
+
+    Returns:
+        list: BGR frames
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (15, 15), 0)
+    scene = []
+    for i in range(frames):
+        frame = background.copy()
+        if frames // 3 <= i < 2 * frames // 3:
+            x = int(width * 0.2 + width * 0.6 * (i - frames // 3) / max(1, frames // 3))
+            cv2.ellipse(frame, (x, height // 2), (50, 70), 0, 0, 360, (160, 170, 200), -1)
+        noise = rng.normal(0, 2, frame.shape)
+        scene.append(np.clip(frame + noise, 0, 255).astype(np.uint8))
+    return scene
+
+
+def bench_motion(args):
+    """CPU use and wakeups per minute with and without the motion gate, in idle and active scenes"""
+    import cv2
+    from face_detectors import HaarFaceDetector
+    from motion_gate import MotionGate, IDLE
+
+    if args.source:
+        frames = load_frames(args.source, args.limit)
+    else:
+        frames = synthetic_scene(args.limit)
+    seconds = len(frames) / args.fps
+    print(f"{len(frames)} frames replayed at {args.fps:g} fps ({seconds:.0f}s), {os.cpu_count()} cores")
+
+    # Ungated: grayscale conversion and full-frame detection on every frame, as before
+    detector = HaarFaceDetector()
+    start = time.process_time()
+    reference = []
+    for frame in frames:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        reference.append(detector.detect(frame, gray))
+    cpu = time.process_time() - start
+    print(f"ungated: {60 * args.fps:.0f} wakeups/min cpu={100 * cpu / (seconds * (os.cpu_count() or 1)):.1f}% "
+          f"({1000 * cpu / len(frames):.2f} ms/frame)")
+
+    # Gated, on a virtual clock: idle frames between polls are never read
+    now = 0.0
+    gate = MotionGate(idle_after=args.idle_after, poll_interval=args.idle_poll, clock=lambda: now)
+    detector = HaarFaceDetector()
+    next_poll = 0.0
+    missed = 0
+    for i, frame in enumerate(frames):
+        now = i / args.fps
+        if gate.idle and now < next_poll:
+            missed += len(reference[i]) > 0
+            continue
+        mode, regions = gate.check(frame)
+        if mode == IDLE:
+            next_poll = now + gate.poll_interval
+            missed += len(reference[i]) > 0
+            continue
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if regions:
+            faces = detector.detect_regions(frame, gray, regions)
+        else:
+            faces = detector.detect(frame, gray)
+        missed += len(faces) == 0 and len(reference[i]) > 0
+        gate.faces_seen(faces)
+    now = len(frames) / args.fps
+    print(f"gated: {gate.format_stats(now)}")
+    print(f"frames with faces the gate missed: {missed}/{sum(1 for faces in reference if faces)}")
+
+
+def bench_streams(args):
+    """Aggregate throughput of the multi-stream service as inference workers are added"""
+    from multi_stream import InferencePool, VideoStream
+
+    print(f"{args.streams} looping copies of {args.source}, {os.cpu_count()} cores")
+    for workers in args.workers:
+        pool = InferencePool(workers=workers, batch_size=args.batch_size, model_dir=args.model_dir,
+                             backend=args.backend, export_dir=args.export_dir)
+        try:
+            pool.warm_up()
+            streams = [VideoStream(i, args.source, pool) for i in range(args.streams)]
+            for stream in streams:
+                stream.start()
+            time.sleep(args.warmup)
+            frames, faces = sum(s.frames for s in streams), sum(s.faces for s in streams)
+            start = time.perf_counter()
+            time.sleep(args.seconds)
+            elapsed = time.perf_counter() - start
+            frames = sum(s.frames for s in streams) - frames
+            faces = sum(s.faces for s in streams) - faces
+            for stream in streams:
+                stream.stop()
+            for stream in streams:
+                stream.join()
+            stats = pool.stats
+        finally:
+            pool.close()
+        print(f"workers={workers}: {frames / elapsed:.1f} frames/sec, {faces / elapsed:.1f} faces/sec, "
+              f"{stats['faces'] / max(stats['batches'], 1):.1f} faces/batch, "
+              f"{stats['cross_stream_batches']}/{stats['batches']} cross-stream batches")
+
+
+def bench_prediction_cache(args):
+    """Hit rate and label disagreement of the perceptual-hash prediction cache against uncached inference"""
+    from face_emotion import process_faces
+    from prediction_cache import PredictionCache
+
+    frames = load_frames(args.source, args.limit)
+    detections = detect_faces(frames)
+    crops = [[frame[y:y+h, x:x+w] for (x, y, w, h) in faces] for frame, faces in zip(frames, detections)]
+    total_faces = sum(len(frame_crops) for frame_crops in crops)
+    print(f"{len(frames)} frames, {total_faces} faces")
+    if total_faces == 0:
+        print("No faces found in the recording, nothing to benchmark.")
+        return
+
+    # Uncached reference: every crop through the model
+    start = time.perf_counter()
+    reference = [process_faces(frame_crops, batch_size=args.batch_size) for frame_crops in crops]
+    per_face = (time.perf_counter() - start) / total_faces
+    print(f"uncached: {1000 * per_face:.1f} ms/face")
+
+    for distance in args.distances:
+        for ttl in args.ttls:
+            # Replay the session on a virtual clock; misses store the model's prediction
+            now = 0.0
+            cache = PredictionCache(max_distance=distance, ttl=ttl, clock=lambda: now)
+            disagree = 0
+            for i, (frame_crops, predictions) in enumerate(zip(crops, reference)):
+                now = i / args.fps
+                for crop, prediction in zip(frame_crops, predictions):
+                    key = cache.key(crop)
+                    cached = cache.lookup(key)
+                    if cached is None:
+                        cache.store(key, prediction)
+                    elif prediction is None or cached["label"] != prediction["label"]:
+                        disagree += 1
+            hits = cache.stats["hits"]
+            print(f"distance={distance} ttl={ttl:g}s: hit rate {100 * hits / total_faces:.1f}%, "
+                  f"label disagreement {disagree}/{hits} hits, "
+                  f"~{hits * per_face:.2f}s of {total_faces * per_face:.2f}s inference saved")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MoodMuse benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batching = subparsers.add_parser("batching", help="per-face vs batched face classification")
+    batching.add_argument("source", help="video file or directory of frames")
+    batching.add_argument("--limit", type=int, default=300, help="maximum frames to load")
+    batching.add_argument("--batch-size", type=int, default=8)
+    batching.add_argument("--window", type=int, default=1, help="frames collected per batch")
+    batching.set_defaults(func=bench_batching)
+
+    state = subparsers.add_parser("state", help="CurrentStateUpdate correctness check and per-update cost")
+    state.add_argument("--streams", type=int, default=500, help="random streams to cross-check")
+    state.add_argument("--updates", type=int, default=2000000, help="updates to time")
+    state.add_argument("--seed", type=int, default=0)
+    state.set_defaults(func=bench_state)
+
+    playback = subparsers.add_parser("playback", help="peak memory of in-memory vs streaming playback")
+    playback.add_argument("files", nargs="*", help="playlist, defaults to everything in music_files/")
+    playback.add_argument("--mode", choices=["memory", "stream"], help="run a single mode in this process")
+    playback.add_argument("--seconds", type=float, default=5.0, help="time spent on each track")
+    playback.add_argument("--cache-mb", type=int, default=0, help="decoded-song cache budget")
+    playback.set_defaults(func=bench_playback)
+
+    library = subparsers.add_parser("library", help="music library index scan and lookup cost")
+    library.add_argument("--tracks", type=int, default=20000, help="synthetic tracks to generate")
+    library.set_defaults(func=bench_library)
+
+    backends = subparsers.add_parser("backends", help="latency, throughput and agreement of inference backends")
+    backends.add_argument("source", help="video file or directory of frames")
+    backends.add_argument("--limit", type=int, default=300, help="maximum frames to load")
+    backends.add_argument("--backends", nargs="+", default=["pipeline", "onnx", "torchscript"])
+    backends.add_argument("--batch-size", type=int, default=8)
+    backends.add_argument("--model-dir", default="model_cache")
+    backends.add_argument("--export-dir", default="model_export")
+    backends.set_defaults(func=bench_backends)
+
+    detectors = subparsers.add_parser("detectors", help="face detector speed and downstream classifier calls")
+    detectors.add_argument("source", help="video file or directory of frames")
+    detectors.add_argument("--limit", type=int, default=300, help="maximum frames to load")
+    detectors.add_argument("--detectors", nargs="+", default=["haar", "yunet"])
+    detectors.add_argument("--scales", nargs="+", type=float, default=[1.0, 0.5], help="detection downscale factors")
+    detectors.add_argument("--yunet-model", default="models/face_detection_yunet_2023mar.onnx")
+    detectors.add_argument("--detect-every", type=int, default=5)
+    detectors.add_argument("--classify-every", type=int, default=10)
+    detectors.set_defaults(func=bench_detectors)
+
+    analysis = subparsers.add_parser("analysis", help="end-to-end offline analysis throughput")
+    analysis.add_argument("options", nargs=argparse.REMAINDER, help="offline_analysis.py arguments")
+    analysis.set_defaults(func=bench_analysis)
+
+    streams = subparsers.add_parser("streams", help="multi-stream throughput scaling with inference workers")
+    streams.add_argument("source", help="video file, looped as a stand-in camera by every stream")
+    streams.add_argument("--streams", type=int, default=4)
+    streams.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    streams.add_argument("--seconds", type=float, default=20.0, help="measurement time per worker count")
+    streams.add_argument("--warmup", type=float, default=3.0)
+    streams.add_argument("--batch-size", type=int, default=16)
+    streams.add_argument("--backend", default="pipeline")
+    streams.add_argument("--model-dir", default="model_cache")
+    streams.add_argument("--export-dir", default="model_export")
+    streams.set_defaults(func=bench_streams)
+
+    cache = subparsers.add_parser("cache", help="prediction cache hit rate and label disagreement")
+    cache.add_argument("source", help="video file or directory of frames")
+    cache.add_argument("--limit", type=int, default=300, help="maximum frames to load")
+    cache.add_argument("--fps", type=float, default=10.0, help="rate at which the frames were processed")
+    cache.add_argument("--distances", nargs="+", type=int, default=[0, 2, 4, 6, 8])
+    cache.add_argument("--ttls", nargs="+", type=float, default=[1.0, 2.0, 5.0])
+    cache.add_argument("--batch-size", type=int, default=8)
+    cache.set_defaults(func=bench_prediction_cache)
+
+    simulate = subparsers.add_parser("simulate", help="simulated emotion -> music behaviour over many hours")
+    simulate.add_argument("options", nargs=argparse.REMAINDER, help="simulation.py arguments")
+    simulate.set_defaults(func=bench_simulation)
+
+    motion = subparsers.add_parser("motion", help="CPU use and wakeups of the motion gate in idle and active scenes")
+    motion.add_argument("source", nargs="?", help="video file or directory of frames, synthetic scene if omitted")
+    motion.add_argument("--limit", type=int, default=900, help="maximum frames to load")
+    motion.add_argument("--fps", type=float, default=15.0, help="camera frame rate the frames are replayed at")
+    motion.add_argument("--idle-after", type=float, default=3.0)
+    motion.add_argument("--idle-poll", type=float, default=0.5)
+    motion.set_defaults(func=bench_motion)
+
+    args, unknown = parser.parse_known_args()
+    if unknown:
+        # Subcommands that forward their options take ones argparse cannot place in REMAINDER
+        if not hasattr(args, "options"):
+            parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+        args.options = unknown + args.options
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import math
+import threading
+import time
+
+"""
+Crossfade engine that runs on its own timer thread, so fades no longer
+depend on how often the video loop drains pygame events. Every channel has
+its own volume ramp computed from elapsed clock time, which guarantees the
+fade duration and lets a new song take over in the middle of a fade.
+"""
+
+
+def linear_curve(t, rising):
+    return t
+
+def equal_power_curve(t, rising):
+    # sin/cos keep the combined power of both songs constant through the fade
+    return math.sin(t * math.pi / 2) if rising else 1.0 - math.cos(t * math.pi / 2)
+
+CURVES = {
+    "linear": linear_curve,
+    "equal_power": equal_power_curve,
+}
+
+
+class Ramp:
+    """Volume ramp of one channel from start to target over duration seconds"""
+
+    def __init__(self, start, target, began, duration):
+        self.start = start
+        self.target = target
+        self.began = began
+        self.duration = duration
+
+    def level(self, now, curve):
+        t = 1.0 if self.duration <= 0 else min(1.0, (now - self.began) / self.duration)
+        return self.start + (self.target - self.start) * curve(t, self.target > self.start)
+
+    def done(self, now):
+        return now - self.began >= self.duration
+
+
+class CrossfadeEngine:
+    """
+    Drives channel volumes over time. Channels that fade out to silence are
+    stopped when their ramp finishes.
+    """
+
+    def __init__(self, set_volume, stop_channel, curve="equal_power", step_interval=0.01,
+                 clock=time.monotonic, threaded=True):
+        """
+        Args:
+            set_volume (callable): Called as set_volume(channel, volume)
+            stop_channel (callable): Called as stop_channel(channel) after a fade-out
+            curve (str): "linear" or "equal_power"
+            step_interval (float): Seconds between volume updates
+            clock (callable): Time source in seconds
+            threaded (bool): Run the timer thread; if False, the owner calls tick()
+        """
+        if curve not in CURVES:
+            raise ValueError(f"Unknown crossfade curve '{curve}'. Valid curves are: {', '.join(CURVES)}")
+        self.set_volume = set_volume
+        self.stop_channel = stop_channel
+        self.curve = CURVES[curve]
+        self.step_interval = step_interval
+        self.clock = clock
+
+        self.volumes = {}  # channel -> last volume applied
+        self.ramps = {}    # channel -> Ramp
+        self.cond = threading.Condition()
+        self.running = True
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def set_level(self, channel, volume):
+        """Set a channel's volume immediately, cancelling any ramp on it"""
+        with self.cond:
+            self.ramps.pop(channel, None)
+            self.volumes[channel] = volume
+            self.set_volume(channel, volume)
+
+    def cancel(self, channel):
+        """Forget a channel, e.g. before a new song is started on it"""
+        with self.cond:
+            self.ramps.pop(channel, None)
+            self.volumes[channel] = 0.0
+
+    def quietest(self, channels):
+        """Channel among `channels` with the lowest current volume"""
+        with self.cond:
+            return min(channels, key=lambda channel: self.volumes.get(channel, 0.0))
+
+    def crossfade(self, new_channel, channels, duration=3.0, target_volume=1.0):
+        """
+        Fade new_channel up to target_volume and every other audible channel
+        down to silence. Calling this again mid-fade retargets from the
+        current volumes, so the fade never jumps.
+
+        Args:
+            new_channel (int): Channel that should end up playing
+            channels (iterable): All channels taking part in fades
+            duration (float): Fade length in seconds
+            target_volume (float): Final volume of the new channel
+        """
+        with self.cond:
+            now = self.clock()
+            self.ramps[new_channel] = Ramp(self.volumes.get(new_channel, 0.0), target_volume, now, duration)
+            for channel in channels:
+                if channel != new_channel and self.volumes.get(channel, 0.0) > 0.0:
+                    self.ramps[channel] = Ramp(self.volumes[channel], 0.0, now, duration)
+            self.cond.notify()
+
+    def is_fading(self):
+        with self.cond:
+            return bool(self.ramps)
+
+    def tick(self, now=None):
+        """Apply the current ramp volumes and finish completed ramps"""
+        with self.cond:
+            now = self.clock() if now is None else now
+            for channel, ramp in list(self.ramps.items()):
+                volume = ramp.target if ramp.done(now) else ramp.level(now, self.curve)
+                self.volumes[channel] = volume
+                self.set_volume(channel, volume)
+                if ramp.done(now):
+                    del self.ramps[channel]
+                    if ramp.target == 0.0:
+                        self.stop_channel(channel)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.ramps:
+                    self.cond.wait()
+                if not self.running:
+                    return
+            self.tick()
+            time.sleep(self.step_interval)
+
+    def stop(self):
+        """Stop the timer thread"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
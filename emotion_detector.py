@@ -1,54 +1,230 @@
+import time
+startup_begin = time.perf_counter()
+
+import argparse
+import logging
+import os
 import cv2
-from transformers import pipeline
-import torch
-from PIL import Image
 import numpy as np
-from CurrentState import CurrentStateUpdate
+from CurrentState import CurrentStateUpdate, TrackStateManager
 from MoodMuse import MoodMuse
+import face_emotion
+from face_emotion import process_faces, emotion_labels, DEFAULT_BATCH_SIZE
+from inference_backends import BACKENDS, DEFAULT_EXPORT_DIR
+from pipeline import PipelineEngine, LatestValue
+from face_tracker import FaceTracker
+from face_detectors import DETECTORS, DEFAULT_YUNET_MODEL, make_detector
+from smoothing import SMOOTHERS, make_smoother
+from scheduler import AdaptiveScheduler
+from motion_gate import MotionGate, IDLE
+from metrics import metrics, COUNT_BUCKETS
+from session_stats import SessionStats
+from api_server import ApiServer
 import threading
-from queue import Queue, Empty
-import time
+from queue import Empty
 import pygame
 
 """
 This is the main file. Starts the camera to detect emotion. 
 """
 
+parser = argparse.ArgumentParser(description="MoodMuse live emotion detector")
+parser.add_argument("--pipelined", action="store_true",
+                    help="run capture, detection and inference on separate worker threads")
+parser.add_argument("--queue-size", type=int, default=2,
+                    help="capacity of each inter-stage queue in pipelined mode")
+parser.add_argument("--stats-interval", type=float, default=5.0,
+                    help="seconds between pipeline statistics reports")
+parser.add_argument("--track", action="store_true",
+                    help="track faces between frames and only re-run detection/classification when needed")
+parser.add_argument("--detect-every", type=int, default=5,
+                    help="frames between full-frame detections when tracking")
+parser.add_argument("--classify-every", type=int, default=10,
+                    help="frames between re-classifications of a tracked face")
+parser.add_argument("--room-policy", default="majority", choices=TrackStateManager.POLICIES,
+                    help="how per-person emotions are combined into the room mood when tracking")
+parser.add_argument("--smoothing", default="count", choices=["count"] + list(SMOOTHERS),
+                    help="emotion smoothing: 180-sample count window, or time-based confidence-weighted smoothers")
+parser.add_argument("--playback", default="memory", choices=MoodMuse.PLAYBACK_MODES,
+                    help="decode whole songs into memory, or stream them in chunks (needs ffmpeg)")
+parser.add_argument("--crossfade-curve", default="equal_power", choices=MoodMuse.CROSSFADE_CURVES,
+                    help="volume curve used when crossfading between songs")
+parser.add_argument("--selection", default="match", choices=MoodMuse.SELECTION_POLICIES,
+                    help="song selection: match the mood, counteract poor moods, or ramp towards a better mood")
+parser.add_argument("--ramp-interval", type=float, default=90.0,
+                    help="seconds each song of a ramp plan plays before moving to the next (--selection ramp)")
+parser.add_argument("--audio-analysis", action="store_true",
+                    help="analyze new songs in a background process for cued, beat-aligned, level-matched crossfades")
+parser.add_argument("--fast-start", action="store_true",
+                    help="load the model in the background and start music right away")
+parser.add_argument("--model-cache", default=face_emotion.DEFAULT_MODEL_CACHE,
+                    help="local copy of the model loaded instead of the Hugging Face cache ('' to disable)")
+parser.add_argument("--backend", default="pipeline", choices=BACKENDS,
+                    help="inference backend; onnx/torchscript need a one-time export with inference_backends.py")
+parser.add_argument("--export-dir", default=DEFAULT_EXPORT_DIR,
+                    help="exported model directory for the onnx/torchscript backends")
+parser.add_argument("--adaptive", action="store_true",
+                    help="adapt frame skipping, detection resolution and classification cadence to a CPU budget")
+parser.add_argument("--target-fps", type=float, default=10.0,
+                    help="processed frames per second the adaptive scheduler aims for")
+parser.add_argument("--cpu-budget", type=float, default=0.5,
+                    help="fraction of total CPU the adaptive scheduler may use (0-1)")
+parser.add_argument("--motion-gate", action="store_true",
+                    help="skip detection in static scenes and detect only where there is motion")
+parser.add_argument("--idle-after", type=float, default=3.0,
+                    help="seconds without motion or faces before the motion gate idles")
+parser.add_argument("--idle-poll", type=float, default=0.5,
+                    help="seconds between camera polls while the motion gate is idle")
+parser.add_argument("--detector", default="haar", choices=list(DETECTORS),
+                    help="face detector; yunet is faster and needs the YuNet ONNX model")
+parser.add_argument("--yunet-model", default=DEFAULT_YUNET_MODEL,
+                    help="path to the YuNet face detection model")
+parser.add_argument("--prediction-cache", action="store_true",
+                    help="reuse predictions for near-identical face crops (perceptual hash)")
+parser.add_argument("--cache-distance", type=int, default=4,
+                    help="largest dHash Hamming distance treated as the same crop")
+parser.add_argument("--cache-ttl", type=float, default=2.0,
+                    help="seconds a cached prediction may be reused")
+parser.add_argument("--session-stats", action="store_true",
+                    help="keep a mood timeline and per-minute statistics for the session")
+parser.add_argument("--session-dir",
+                    help="persist the session statistics to this directory (memory-mapped, implies --session-stats)")
+parser.add_argument("--api-port", type=int,
+                    help="serve the HTTP/WebSocket API for the frontend on this port")
+parser.add_argument("--api-host", default="127.0.0.1", help="interface the API listens on")
+parser.add_argument("--preview-fps", type=float, default=5.0,
+                    help="rate of the API's MJPEG preview stream (0 disables it)")
+parser.add_argument("--preview-width", type=int, default=320, help="width of the preview frames")
+parser.add_argument("--override-hold", type=float, default=30.0,
+                    help="seconds a manual override from the API suspends automatic music changes")
+parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                    help="DEBUG shows the per-face and per-song-change details")
+parser.add_argument("--metrics-file",
+                    help="write latency histograms and counters here (.json, otherwise Prometheus text)")
+parser.add_argument("--metrics-port", type=int,
+                    help="serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+args = parser.parse_args()
+
+logging.basicConfig(level=getattr(logging, args.log_level), format="%(message)s")
+logger = logging.getLogger("emotion_detector")
+if args.metrics_file or args.metrics_port:
+    metrics.enable()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+
+# Per-phase startup timing
+startup_phases = []
+phase_start = startup_begin
+
+def mark_phase(name):
+    global phase_start
+    now = time.perf_counter()
+    startup_phases.append((name, now - phase_start))
+    phase_start = now
+
+def report_startup():
+    phases = ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in startup_phases)
+    print(f"Startup: {phases} (total {time.perf_counter() - startup_begin:.2f}s)")
+
+mark_phase("imports")
+
+# Load the emotion model, or start loading it while the camera and audio come up
+model_dir = args.model_cache or None
+if args.fast_start:
+    face_emotion.start_loading(model_dir, args.backend, args.export_dir)
+else:
+    face_emotion.load_classifier(model_dir, args.backend, args.export_dir)
+    mark_phase("model")
+if args.prediction_cache:
+    face_emotion.enable_prediction_cache(max_distance=args.cache_distance, ttl=args.cache_ttl)
+
 # Initialize pygame
 pygame.init()
 
-# Initialize the emotion recognition pipeline using the specified model.
-print("Loading model...")
-emotion_classifier = pipeline(
-    "image-classification",
-    model="dima806/facial_emotions_image_detection",
-    device=0 if torch.cuda.is_available() else -1
-)
-print("Model loaded successfully!")
+current_state = CurrentStateUpdate() if args.smoothing == "count" else make_smoother(args.smoothing)
+# Per-person emotion state, only available when faces are tracked
+track_states = TrackStateManager(policy=args.room_policy) if args.track else None
+# Mood timeline and statistics over the whole session
+session_stats = SessionStats(path=args.session_dir) if args.session_stats or args.session_dir else None
+mood_muse = MoodMuse(debug=True, playback=args.playback, crossfade_curve=args.crossfade_curve,
+                     selection=args.selection, audio_analysis=args.audio_analysis)  # Enable debug mode
 
-current_state = CurrentStateUpdate()
-mood_muse = MoodMuse(debug=True)  # Enable debug mode
+# Latest target emotion; the music handler only wakes up when it changes
+emotion_channel = LatestValue()
+# Serializes song changes from the music handler and API overrides
+music_lock = threading.Lock()
+override_until = 0.0
 
-# Create a queue for emotion updates
-emotion_queue = Queue()
-is_running = True
+def publish_now_playing(override=None):
+    if api is not None:
+        song_path = mood_muse.current_state["song_path"]
+        api.publish_state(now_playing=os.path.basename(song_path) if song_path else None,
+                          music_emotion=mood_muse.current_state["emotion"], override=override)
 
 def music_handler():
     """Background thread to handle music updates"""
-    while is_running:
+    # A ramp plan moves on by itself when the mood stays put
+    ramp_interval = args.ramp_interval if args.selection == "ramp" else None
+    restore = False  # A manual override is playing; detection takes over when its hold ends
+    while True:
+        timeout = ramp_interval
+        hold_left = override_until - time.monotonic()
+        if hold_left > 0:
+            restore = True
+            timeout = hold_left if timeout is None else min(timeout, hold_left)
         try:
-            # Get emotion from queue with timeout
-            emotion = emotion_queue.get(timeout=0.1)
-            if emotion and mood_muse.is_valid_emotion(emotion):
-                mood_muse.set_emotion(emotion)
+            emotion = emotion_channel.get(timeout)
         except Empty:
-            continue
+            if emotion_channel.closed:
+                break  # Channel closed on shutdown
+            if not restore:
+                with music_lock:
+                    if time.monotonic() >= override_until and mood_muse.advance_playlist():
+                        publish_now_playing()
+                continue
+            # Changes during the hold were dropped, so go back to the latest detected emotion
+            emotion = emotion_channel.value
+        try:
+            with music_lock:
+                if time.monotonic() < override_until:
+                    continue  # A manual override is holding the music
+                restore = False
+                if emotion and mood_muse.is_valid_emotion(emotion):
+                    mood_muse.set_emotion(emotion)
+            publish_now_playing()
         except Exception as e:
             print(f"Error in music handler: {str(e)}")
 
+def apply_override(emotion, hold=None):
+    """Manual override from the API: play an emotion and hold it for a while"""
+    global override_until
+    hold = args.override_hold if hold is None else float(hold)
+    with music_lock:
+        override_until = time.monotonic() + hold
+        changed = mood_muse.set_emotion(emotion)
+    emotion_channel.wake()  # Let the music handler wait for the end of the hold
+    publish_now_playing(override=emotion if hold > 0 else None)
+    return changed
+
+def api_stats():
+    stats = {"music_channel": emotion_channel.stats()}
+    if session_stats is not None:
+        stats["session"] = {
+            "time_in_mood": session_stats.time_in_mood(),
+            "switches": session_stats.switch_count(),
+            "dwell": session_stats.dwell_distribution(),
+        }
+    return stats
+
+# Optional local API for the frontend
+api = None
+if args.api_port:
+    api = ApiServer(args.api_host, args.api_port, get_stats=api_stats, on_override=apply_override,
+                    valid_emotions=mood_muse.emotion_songs.keys(), preview_fps=args.preview_fps,
+                    preview_width=args.preview_width).start()
+
 # Start the music handler thread
-music_thread = threading.Thread(target=music_handler)
-music_thread.daemon = True  # Thread will exit when main program exits
+music_thread = threading.Thread(target=music_handler, name="music")
 music_thread.start()
 
 # Check if music files exist
@@ -56,8 +232,34 @@ if not mood_muse.check_music_files():
     print("WARNING: No music files found. Please add music files to the music_files directory.")
     print("The program will continue but no music will play.")
 
-# Load OpenCV's Haar Cascade for face detection.
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+# Start on the default state so music plays before the model is ready
+if args.fast_start:
+    emotion_channel.publish("neutral")
+mark_phase("audio")
+
+# Load the face detector (OpenCV's Haar Cascade by default).
+detector_options = {"model_path": args.yunet_model} if args.detector == "yunet" else {}
+face_detector = make_detector(args.detector, **detector_options)
+
+# Optional tracker that skips redundant detection and classification work
+face_tracker = FaceTracker(detect_every=args.detect_every, classify_every=args.classify_every) if args.track else None
+
+# Optional scheduler that trades frame rate and resolution for CPU
+scheduler = AdaptiveScheduler(target_fps=args.target_fps, cpu_budget=args.cpu_budget, tracking=args.track,
+                              classify_every=args.classify_every) if args.adaptive else None
+
+# Optional gate that idles in static scenes and restricts detection to moving regions
+motion_gate = MotionGate(idle_after=args.idle_after, poll_interval=args.idle_poll) if args.motion_gate else None
+
+def run_face_detector(frame, gray, regions=None):
+    """
+    Detect faces, on a downscaled frame if the scheduler asks for it and only in the
+    motion gate's regions if given; boxes are in full-frame coordinates
+    """
+    scale = scheduler.detect_scale if scheduler is not None else 1.0
+    if regions:
+        return face_detector.detect_regions(frame, gray, regions, scale)
+    return face_detector.detect(frame, gray, scale)
 
 # Open a connection to the primary webcam.
 cap = cv2.VideoCapture(0)
@@ -65,46 +267,7 @@ cap = cv2.VideoCapture(0)
 # Set a lower resolution for the webcam
 cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)  # Reduced from default (usually 1280)
 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)  # Reduced from default (usually 720)
-
-# Define emotion labels mapping
-emotion_labels = {
-    "angry": "Angry",
-    "disgust": "Disgust",
-    "fear": "Fear",
-    "happy": "Happy",
-    "sad": "Sad",
-    "surprise": "Surprise",
-    "neutral": "Neutral"
-}
-
-def process_face(face_img):
-    """Process a single face image and return emotion prediction"""
-    try:
-        # Convert BGR to RGB
-        face_rgb = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
-        # Convert to PIL Image
-        pil_image = Image.fromarray(face_rgb)
-        # Get prediction
-        results = emotion_classifier(pil_image)
-        print(f"Raw model output: {results}")  # Debug print
-        
-        if results and len(results) > 0:
-            # Use a lower threshold for all emotions
-            if results[0]['score'] > 0.2:  # 20% threshold for all emotions
-                # Map angry to sad
-                if results[0]['label'].lower() == 'angry':
-                    results[0]['label'] = 'sad'
-                    print(f"Mapped angry to sad: {results[0]}")  # Debug print
-                print(f"Detected emotion: {results[0]}")  # Debug print
-                return results[0]
-            
-            # If no emotion meets the threshold, return neutral with low confidence
-            return {'label': 'neutral', 'score': 0.2}
-            
-        return None
-    except Exception as e:
-        print(f"Error in process_face: {str(e)}")  # Debug print
-        return None
+mark_phase("camera")
 
 def display_emotion(frame, x, y, w, h, emotion, confidence):
     """Display emotion and confidence on the frame"""
@@ -114,7 +277,7 @@ def display_emotion(frame, x, y, w, h, emotion, confidence):
         
         # Prepare text
         text = f"{emotion}: {confidence:.2f}"
-        print(f"Displaying text: {text}")  # Debug print
+        logger.debug("Displaying text: %s", text)
         
         # Get text size to position it properly
         (text_width, text_height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)
@@ -125,76 +288,288 @@ def display_emotion(frame, x, y, w, h, emotion, confidence):
         # Draw text
         cv2.putText(frame, text, (x, y-5), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
     except Exception as e:
-        print(f"Error displaying emotion: {str(e)}")
+        logger.error("Error displaying emotion: %s", e)
 
-try:
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+def detect_faces(item):
+    """Resize the captured frame and run face detection on it"""
+    start = time.perf_counter()
+    metrics.inc("frames_total")
+    # Resize frame to a smaller size for faster processing
+    frame = cv2.resize(item["frame"], (640, 480))
+    item["frame"] = frame
 
-        # Process pygame events for music crossfading
-        for event in pygame.event.get():
-            if event.type == pygame.USEREVENT:
-                mood_muse._crossfade_step()
+    regions = None
+    if motion_gate is not None:
+        mode, regions = motion_gate.check(frame)
+        if mode == IDLE:
+            # Static, empty scene: no detection, and no new emotion for the music
+            metrics.inc("idle_frames_total")
+            item["idle"] = True
+            item["faces"] = []
+            return item
 
-        # Resize frame to a smaller size for faster processing
-        frame = cv2.resize(frame, (640, 480))
+    # Convert frame to grayscale for face detection.
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if face_tracker is not None:
+        item["tracks"] = face_tracker.update(gray, lambda gray: run_face_detector(frame, gray, regions))
+        item["faces"] = [track.box for track in item["tracks"]]
+    else:
+        item["faces"] = run_face_detector(frame, gray, regions)
+    if motion_gate is not None:
+        motion_gate.faces_seen(item["faces"])
+    elapsed = time.perf_counter() - start
+    metrics.observe("detect_seconds", elapsed)
+    metrics.observe("faces_per_frame", len(item["faces"]), COUNT_BUCKETS)
+    if scheduler is not None:
+        scheduler.record("detect", elapsed)
+    return item
 
-        # Convert frame to grayscale for face detection.
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+def classify_tracks(frame, tracks):
+    """Classify only the tracks that are due, reusing the last prediction for the rest"""
+    due = [track for track in tracks if face_tracker.needs_classification(track)]
+    face_imgs = [frame[y:y+h, x:x+w] for (x, y, w, h) in (track.box for track in due)]
+    for track, result in zip(due, process_faces(face_imgs, batch_size=DEFAULT_BATCH_SIZE)):
+        face_tracker.set_result(track, result)
+    due_ids = {track.track_id for track in due}
+    return [track.result if track.track_id in due_ids else face_tracker.reuse_result(track)
+            for track in tracks]
 
-        for (x, y, w, h) in faces:
-            try:
-                # Crop the detected face from the frame.
-                face_img = frame[y:y+h, x:x+w]
-                
-                # Get emotion prediction from the model.
-                result = process_face(face_img)
-                
-                if result:
-                    # Extract emotion and confidence
-                    emotion = result['label'].lower()
-                    confidence = result['score']
-                    
-                    print(f"Processing emotion: {emotion} with confidence: {confidence}")  # Debug print
-                    
-                    # Map the emotion label for display
-                    display_emotion_text = emotion_labels.get(emotion, emotion)
-                    print(f"Mapped emotion: {display_emotion_text}")  # Debug print
+def classify_faces(item):
+    """Classify every detected face, update the emotion state and queue music changes"""
+    frame = item["frame"]
+    faces = item["faces"]
+    annotations = []
+    samples = []  # (emotion, confidence) per classified face
+    true_emotion = None
+    start = time.perf_counter()
 
-                    # Measure emotion freq (use lowercase emotion)
-                    true_emotion = current_state.update_state(emotion)
-                    print(f"True emotion: {true_emotion}")  # Debug print
-
-                    # Queue the emotion update for the music handler
-                    emotion_queue.put(true_emotion)
-                    
-                    # Display emotion and confidence (use mapped emotion for display)
-                    display_emotion(frame, x, y, w, h, display_emotion_text, confidence)
+    if item.get("idle"):
+        item["annotations"] = []
+        return item
+
+    if not face_emotion.classifier_ready():
+        # Fast start: show faces but keep the default state until the model is loaded
+        item["annotations"] = [(x, y, w, h, "Loading", 0.0) for (x, y, w, h) in faces]
+        return item
+
+    if face_tracker is not None:
+        results = classify_tracks(frame, item["tracks"])
+        track_ids = [track.track_id for track in item["tracks"]]
+    else:
+        # Classify every face in the frame with batched forward passes
+        face_imgs = [frame[y:y+h, x:x+w] for (x, y, w, h) in faces]
+        results = process_faces(face_imgs, batch_size=DEFAULT_BATCH_SIZE)
+        track_ids = [None] * len(faces)
+
+    for (x, y, w, h), result, track_id in zip(faces, results, track_ids):
+        try:
+            if result:
+                # Extract emotion and confidence
+                emotion = result['label'].lower()
+                confidence = result['score']
+
+                logger.debug("Processing emotion: %s with confidence: %s", emotion, confidence)
+
+                # Map the emotion label for display
+                display_emotion_text = emotion_labels.get(emotion, emotion)
+                samples.append((emotion, confidence))
+
+                if track_states is not None:
+                    # Keep each person's emotion separate, combined once per frame below
+                    track_states.update(track_id, emotion, confidence, w * h)
                 else:
-                    print("No emotion detected, showing neutral")  # Debug print
-                    display_emotion(frame, x, y, w, h, "Neutral", 0.0)
-                    
-            except Exception as e:
-                print(f"Error in main loop: {str(e)}")  # Debug print
-                display_emotion(frame, x, y, w, h, "Neutral", 0.0)
-
-        # Display the annotated frame.
-        cv2.imshow("Live Face Emotion Recognition", frame)
-
-        # Press 'q' to quit the video loop.
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+                    # Measure emotion freq (use lowercase emotion)
+                    with metrics.time("smoothing_seconds"):
+                        if args.smoothing == "count":
+                            true_emotion = current_state.update_state(emotion)
+                        else:
+                            true_emotion = current_state.update(emotion, confidence)
+                    logger.debug("True emotion: %s", true_emotion)
+
+                # Display emotion and confidence (use mapped emotion for display)
+                annotations.append((x, y, w, h, display_emotion_text, confidence))
+            else:
+                logger.debug("No emotion detected, showing neutral")
+                annotations.append((x, y, w, h, "Neutral", 0.0))
+
+        except Exception as e:
+            logger.error("Error in main loop: %s", e)
+            annotations.append((x, y, w, h, "Neutral", 0.0))
+
+    if track_states is not None and len(faces) > 0:
+        with metrics.time("smoothing_seconds"):
+            true_emotion = track_states.room_state()
+        logger.debug("Room emotion: %s", true_emotion)
+    # Hand the music handler the latest state once per frame
+    if true_emotion is not None:
+        emotion_channel.publish(true_emotion)
+        if api is not None:
+            api.publish_state(emotion=true_emotion)
+        if session_stats is not None:
+            now = time.time()
+            for emotion, confidence in samples:
+                session_stats.add(emotion, confidence, true_emotion, now)
+
+    item["annotations"] = annotations
+    if scheduler is not None:
+        scheduler.record("classify", time.perf_counter() - start)
+        scheduler.frame_done()
+        if face_tracker is not None:
+            face_tracker.classify_every = scheduler.classify_every
+    return item
+
+def render(item):
+    """Draw the annotations and show the frame. Returns False when the user quits."""
+    frame = item["frame"]
+    for (x, y, w, h, emotion, confidence) in item["annotations"]:
+        display_emotion(frame, x, y, w, h, emotion, confidence)
+    if api is not None:
+        api.offer_frame(frame)
+
+    # Display the annotated frame.
+    cv2.imshow("Live Face Emotion Recognition", frame)
+
+    # Press 'q' to quit the video loop.
+    return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+def read_frame():
+    with metrics.time("capture_seconds"):
+        ret, frame = cap.read()
+    return frame if ret else None
+
+def wait_while_idle():
+    """Poll the camera slowly while the motion gate is idle"""
+    if motion_gate is not None and motion_gate.idle:
+        time.sleep(motion_gate.poll_interval)
+
+def read_scheduled_frame():
+    """Read frames, dropping the ones the scheduler skips"""
+    while True:
+        wait_while_idle()
+        frame = read_frame()
+        if frame is None or scheduler is None or scheduler.should_process():
+            return frame
+
+def report_scheduler():
+    if scheduler is not None:
+        print(f"Scheduler: {scheduler.format_metrics()}")
+
+def report_motion_gate():
+    if motion_gate is not None:
+        print(f"Motion gate: {motion_gate.format_stats()}")
+
+def report_music_channel():
+    print(f"Music channel: {emotion_channel.format_stats()}")
+
+def report_prediction_cache():
+    cache = face_emotion.prediction_cache
+    if cache is not None:
+        print(f"Prediction cache: hit rate {100 * cache.hit_rate():.1f}% {cache.stats}")
+
+def write_metrics():
+    if args.metrics_file:
+        metrics.write(args.metrics_file)
+    if session_stats is not None:
+        session_stats.flush()
+
+def report_model_ready():
+    """In fast-start mode, report the background model load once it finishes"""
+    global model_reported
+    if not model_reported and face_emotion.classifier_ready():
+        model_reported = True
+        print(f"Model ready {time.perf_counter() - startup_begin:.2f}s after launch "
+              f"(load took {face_emotion.model_load_time:.2f}s)")
+
+model_reported = not args.fast_start
+
+def run_sequential():
+    """Capture, detect, classify and render one frame at a time"""
+    first_frame = True
+    annotations = []
+    last_report = time.time()
+    while True:
+        wait_while_idle()
+        frame = read_frame()
+        if frame is None:
+            break
+        if first_frame:
+            mark_phase("first frame")
+            report_startup()
+            first_frame = False
+        report_model_ready()
+
+        if scheduler is not None and not scheduler.should_process():
+            # Skipped frame: show it with the last known annotations
+            item = {"frame": cv2.resize(frame, (640, 480)), "annotations": annotations}
+        else:
+            item = classify_faces(detect_faces({"frame": frame}))
+            annotations = item["annotations"]
+        if not render(item):
             break
+        if time.time() - last_report >= args.stats_interval:
+            report_scheduler()
+            report_motion_gate()
+            report_music_channel()
+            report_prediction_cache()
+            write_metrics()
+            last_report = time.time()
+
+def run_pipelined():
+    """Run capture, detection and inference as pipelined worker threads"""
+    engine = PipelineEngine(read_scheduled_frame, detect_faces, classify_faces, queue_size=args.queue_size)
+    engine.start()
+    last_report = time.time()
+    first_frame = True
+    try:
+        while True:
+            try:
+                item = engine.get_output(timeout=0.05)
+            except Empty:
+                break  # Capture source ended
+            if item is not None and first_frame:
+                mark_phase("first frame")
+                report_startup()
+                first_frame = False
+            report_model_ready()
+            if item is None:
+                # Nothing ready yet: keep the window responsive so it can still be quit
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            elif not render(item):
+                break
+            if time.time() - last_report >= args.stats_interval:
+                print(f"Pipeline: {engine.format_stats()}")
+                report_scheduler()
+                report_motion_gate()
+                report_music_channel()
+                report_prediction_cache()
+                write_metrics()
+                last_report = time.time()
+    finally:
+        engine.stop()
+
+try:
+    if args.pipelined:
+        run_pipelined()
+    else:
+        run_sequential()
 
 finally:
     # Clean up
-    is_running = False  # Signal the music handler to stop
-    music_thread.join(timeout=1.0)  # Wait for music handler to finish
+    emotion_channel.close()  # Wake the music handler so it exits
+    music_thread.join()  # Wait for any song change in progress to finish
+    if api is not None:
+        api.stop()
+    report_motion_gate()
+    report_music_channel()
+    report_prediction_cache()
+    write_metrics()
+    metrics.close()
+    if session_stats is not None:
+        print(f"Session: {session_stats.format_summary()}")
+        session_stats.close()
     cap.release()
     cv2.destroyAllWindows()
     mood_muse.shutdown()  # Properly shut down MoodMuse
-
-
-
+    if face_tracker is not None:
+        print(f"Tracker stats: {face_tracker.stats}")
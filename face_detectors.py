@@ -0,0 +1,192 @@
+import os
+
+import cv2
+
+"""
+Pluggable face detectors. Each detector takes the BGR frame (and its
+grayscale version) and returns (x, y, w, h) boxes in frame coordinates.
+
+    haar  - OpenCV's Haar cascade, the original detector
+    yunet - OpenCV's DNN YuNet detector, run on a downscaled frame and, between
+            periodic full-frame passes, only in windows around previous faces
+
+YuNet needs the ONNX model from the OpenCV model zoo
+(face_detection_yunet_2023mar.onnx), see DEFAULT_YUNET_MODEL.
+"""
+
+DEFAULT_YUNET_MODEL = "models/face_detection_yunet_2023mar.onnx"
+
+
+class FaceDetector:
+    """Common interface of the face detectors"""
+
+    name = None
+
+    def detect(self, frame, gray, scale=1.0):
+        """
+        Find faces in a frame
+
+        Args:
+            frame (ndarray): BGR frame
+            gray (ndarray): Grayscale version of the frame
+            scale (float): Extra downscale factor requested by the scheduler
+
+        Returns:
+            list: (x, y, w, h) boxes in frame coordinates
+        """
+        raise NotImplementedError
+
+    def detect_regions(self, frame, gray, regions, scale=1.0):
+        """
+        Find faces only inside some regions of a frame, e.g. where there was motion
+
+        Args:
+            frame (ndarray): BGR frame
+            gray (ndarray): Grayscale version of the frame
+            regions (list): (x0, y0, x1, y1) regions in frame coordinates
+            scale (float): Extra downscale factor requested by the scheduler
+
+        Returns:
+            list: (x, y, w, h) boxes in frame coordinates
+        """
+        faces = []
+        for (x0, y0, x1, y1) in regions:
+            faces.extend((x0 + x, y0 + y, w, h)
+                         for (x, y, w, h) in self.detect(frame[y0:y1, x0:x1], gray[y0:y1, x0:x1], scale))
+        return _dedupe(faces)
+
+
+class HaarFaceDetector(FaceDetector):
+    name = "haar"
+
+    def __init__(self, scale_factor=1.1, min_neighbors=5, min_size=30):
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, frame, gray, scale=1.0):
+        if scale >= 1.0:
+            return [tuple(int(v) for v in face) for face in self.cascade.detectMultiScale(
+                gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                minSize=(self.min_size, self.min_size))]
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        min_size = max(12, int(self.min_size * scale))
+        faces = self.cascade.detectMultiScale(small, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=(min_size, min_size))
+        return [tuple(int(v / scale) for v in face) for face in faces]
+
+
+class YuNetFaceDetector(FaceDetector):
+    name = "yunet"
+
+    def __init__(self, model_path=DEFAULT_YUNET_MODEL, input_scale=0.5, score_threshold=0.8,
+                 roi_margin=0.6, full_every=10):
+        """
+        Args:
+            model_path (str): Path to the YuNet ONNX model
+            input_scale (float): Downscale factor applied before detection
+            score_threshold (float): Minimum face confidence
+            roi_margin (float): Padding of the search windows around previous faces,
+                relative to the face size
+            full_every (int): Run a full-frame pass at least every N calls
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"YuNet model not found at {model_path}. Download "
+                                    "face_detection_yunet_2023mar.onnx from the OpenCV model zoo.")
+        self.model = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold)
+        self.input_scale = input_scale
+        self.roi_margin = roi_margin
+        self.full_every = full_every
+        self.previous = []
+        self.calls_since_full = 0
+        self.stats = {"full": 0, "roi": 0}
+
+    def _run(self, image):
+        """Detect on an image, returning boxes in that image's coordinates"""
+        height, width = image.shape[:2]
+        if width < 10 or height < 10:
+            return []
+        self.model.setInputSize((width, height))
+        _, faces = self.model.detect(image)
+        if faces is None:
+            return []
+        return [tuple(int(v) for v in face[:4]) for face in faces]
+
+    def _search_windows(self, frame_w, frame_h):
+        """Padded windows around the previous faces"""
+        windows = []
+        for (x, y, w, h) in self.previous:
+            pad_x, pad_y = int(w * self.roi_margin), int(h * self.roi_margin)
+            windows.append((max(0, x - pad_x), max(0, y - pad_y),
+                            min(frame_w, x + w + pad_x), min(frame_h, y + h + pad_y)))
+        return windows
+
+    def detect(self, frame, gray, scale=1.0):
+        scale = self.input_scale * scale
+        frame_h, frame_w = frame.shape[:2]
+        faces = []
+        if self.previous and self.calls_since_full < self.full_every:
+            # Search only around where faces were last seen
+            self.stats["roi"] += 1
+            faces = self._detect_windows(frame, self._search_windows(frame_w, frame_h), scale)
+            self.calls_since_full += 1
+
+        if not faces:
+            self.stats["full"] += 1
+            small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            faces = [(int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+                     for (x, y, w, h) in self._run(small)]
+            self.calls_since_full = 0
+
+        # Overlapping windows can find the same face twice
+        faces = _dedupe(faces)
+        self.previous = faces
+        return faces
+
+    def _detect_windows(self, frame, windows, scale):
+        """Detect in (x0, y0, x1, y1) windows, returning boxes in frame coordinates"""
+        faces = []
+        for (x0, y0, x1, y1) in windows:
+            window = cv2.resize(frame[y0:y1, x0:x1], None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            faces.extend((x0 + int(x / scale), y0 + int(y / scale), int(w / scale), int(h / scale))
+                         for (x, y, w, h) in self._run(window))
+        return faces
+
+    def detect_regions(self, frame, gray, regions, scale=1.0):
+        # Keep the previous faces in frame coordinates for the next detect() call
+        faces = _dedupe(self._detect_windows(frame, regions, self.input_scale * scale))
+        self.previous = faces
+        return faces
+
+
+def _dedupe(faces, min_distance=0.5):
+    """Drop boxes whose centre lies within another kept box of similar size"""
+    kept = []
+    for (x, y, w, h) in faces:
+        cx, cy = x + w / 2, y + h / 2
+        if not any(abs(cx - (kx + kw / 2)) < kw * min_distance and abs(cy - (ky + kh / 2)) < kh * min_distance
+                   for (kx, ky, kw, kh) in kept):
+            kept.append((x, y, w, h))
+    return kept
+
+
+DETECTORS = {
+    "haar": HaarFaceDetector,
+    "yunet": YuNetFaceDetector,
+}
+
+def make_detector(name, **kwargs):
+    """
+    Create a face detector by name
+
+    Args:
+        name (str): One of DETECTORS
+        **kwargs: Passed to the detector's constructor
+
+    Returns:
+        FaceDetector: The new detector
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector '{name}'. Valid detectors are: {', '.join(DETECTORS)}")
+    return DETECTORS[name](**kwargs)
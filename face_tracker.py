@@ -0,0 +1,186 @@
+import cv2
+import numpy as np
+
+"""
+Lightweight face tracking between detection and classification. Faces keep
+a persistent track ID across frames; the full-frame detector only runs every
+few frames (or when a track is lost) and in between each track is followed
+by template matching in a small window around its last position. A track is
+re-classified only at a fixed cadence or when its crop changes noticeably.
+"""
+
+SIGNATURE_SIZE = (16, 16)
+
+
+def _iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _signature(gray, box):
+    """Tiny downscaled grayscale thumbnail used to measure crop changes"""
+    x, y, w, h = box
+    crop = gray[y:y+h, x:x+w]
+    return cv2.resize(crop, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class Track:
+    """A single face followed across frames"""
+
+    def __init__(self, track_id, box, gray):
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.template = gray[self.box[1]:self.box[1]+self.box[3], self.box[0]:self.box[0]+self.box[2]].copy()
+        self.signature = _signature(gray, self.box)
+        self.result = None               # Last classifier prediction
+        self.classified_signature = None
+        self.frames_since_classified = 0
+        self.missed = 0                  # Consecutive detection passes without a match
+
+    def reset_template(self, box, gray):
+        self.box = tuple(int(v) for v in box)
+        x, y, w, h = self.box
+        self.template = gray[y:y+h, x:x+w].copy()
+        self.signature = _signature(gray, self.box)
+
+
+class FaceTracker:
+    """
+    Assigns persistent IDs to faces and decides when detection and
+    classification actually need to run.
+    """
+
+    def __init__(self, detect_every=5, classify_every=10, change_threshold=12.0,
+                 iou_threshold=0.3, match_threshold=0.6, max_missed=2, search_margin=0.5):
+        """
+        Args:
+            detect_every (int): Run the full-frame detector every K frames
+            classify_every (int): Re-classify a track at least every N frames
+            change_threshold (float): Mean absolute pixel change of the crop
+                signature that forces an early re-classification
+            iou_threshold (float): Minimum overlap to match a detection to a track
+            match_threshold (float): Minimum template-matching score to keep
+                following a track between detections
+            max_missed (int): Detection passes a track may go unmatched before it is dropped
+            search_margin (float): Search window padding, relative to the face size
+        """
+        self.detect_every = detect_every
+        self.classify_every = classify_every
+        self.change_threshold = change_threshold
+        self.iou_threshold = iou_threshold
+        self.match_threshold = match_threshold
+        self.max_missed = max_missed
+        self.search_margin = search_margin
+
+        self.tracks = {}
+        self.next_id = 1
+        self.frames_until_detect = 0
+        self.stats = {"frames": 0, "detections": 0, "classifications": 0, "reused": 0}
+
+    def update(self, gray, detect):
+        """
+        Advance all tracks to a new frame
+
+        Args:
+            gray (ndarray): Grayscale frame
+            detect (callable): Full-frame face detector, takes the grayscale
+                frame and returns (x, y, w, h) boxes
+
+        Returns:
+            list: Tracks visible in this frame
+        """
+        self.stats["frames"] += 1
+        self.frames_until_detect -= 1
+
+        lost = False
+        if self.frames_until_detect > 0 and self.tracks:
+            for track in self.tracks.values():
+                if not self._follow(track, gray):
+                    lost = True
+                    break
+
+        if lost or self.frames_until_detect <= 0 or not self.tracks:
+            self._detect(gray, detect)
+            self.frames_until_detect = self.detect_every
+
+        for track in self.tracks.values():
+            track.frames_since_classified += 1
+        return [track for track in self.tracks.values() if track.missed == 0]
+
+    def _follow(self, track, gray):
+        """Move a track to the best template match near its last position"""
+        x, y, w, h = track.box
+        pad_x = int(w * self.search_margin)
+        pad_y = int(h * self.search_margin)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y)
+        window = gray[y0:y1, x0:x1]
+        if window.shape[0] < h or window.shape[1] < w:
+            return False
+
+        scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < self.match_threshold:
+            return False
+
+        track.box = (x0 + bx, y0 + by, w, h)
+        track.signature = _signature(gray, track.box)
+        return True
+
+    def _detect(self, gray, detect):
+        """Run the full detector and match its boxes to existing tracks"""
+        self.stats["detections"] += 1
+        boxes = [tuple(int(v) for v in box) for box in detect(gray)]
+
+        # Greedy matching, best overlaps first
+        pairs = sorted(((_iou(track.box, box), track_id, i)
+                        for track_id, track in self.tracks.items()
+                        for i, box in enumerate(boxes)), reverse=True)
+        matched_tracks = set()
+        matched_boxes = set()
+        for overlap, track_id, i in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if track_id in matched_tracks or i in matched_boxes:
+                continue
+            matched_tracks.add(track_id)
+            matched_boxes.add(i)
+            track = self.tracks[track_id]
+            track.reset_template(boxes[i], gray)
+            track.missed = 0
+
+        for track_id in list(self.tracks):
+            if track_id not in matched_tracks:
+                self.tracks[track_id].missed += 1
+                if self.tracks[track_id].missed > self.max_missed:
+                    del self.tracks[track_id]
+
+        for i, box in enumerate(boxes):
+            if i not in matched_boxes:
+                self.tracks[self.next_id] = Track(self.next_id, box, gray)
+                self.next_id += 1
+
+    def needs_classification(self, track):
+        """True if the track has no prediction yet, is due, or its crop changed a lot"""
+        if track.result is None or track.frames_since_classified >= self.classify_every:
+            return True
+        change = float(np.mean(np.abs(track.signature - track.classified_signature)))
+        return change > self.change_threshold
+
+    def set_result(self, track, result):
+        """Store a fresh classifier prediction for a track"""
+        track.result = result
+        track.classified_signature = track.signature
+        track.frames_since_classified = 0
+        self.stats["classifications"] += 1
+
+    def reuse_result(self, track):
+        """Count a frame where the track's previous prediction was reused"""
+        self.stats["reused"] += 1
+        return track.result
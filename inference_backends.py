@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+
+import cv2
+import numpy as np
+
+"""
+Inference backends for the face emotion model. Every backend takes a list
+of BGR face crops and returns, per face, a list of {'label', 'score'} dicts
+sorted by score, the same shape the Hugging Face pipeline produces.
+
+    pipeline     - the generic Hugging Face pipeline (PIL conversion + image processor)
+    onnx         - exported ONNX graph run with ONNX Runtime
+    torchscript  - exported TorchScript module
+
+The exported backends preprocess directly on NumPy arrays and can use
+dynamic int8 quantization. Export once with:
+
+    python inference_backends.py onnx --quantize
+"""
+
+MODEL_NAME = "dima806/facial_emotions_image_detection"
+DEFAULT_EXPORT_DIR = "model_export"
+BACKENDS = ("pipeline", "onnx", "torchscript")
+TOP_K = 5
+
+
+def load_hf_pipeline(model_dir=None):
+    """
+    Build the Hugging Face image classification pipeline
+
+    Args:
+        model_dir (str): Local copy of the model. If it exists the model is loaded
+            from it without contacting the Hugging Face hub; otherwise the model is
+            fetched by name and saved there for the next launch. None disables it.
+
+    Returns:
+        Pipeline: The loaded pipeline
+    """
+    from transformers import pipeline
+    import torch
+
+    cached = model_dir is not None and os.path.isdir(model_dir)
+    classifier = pipeline(
+        "image-classification",
+        model=model_dir if cached else MODEL_NAME,
+        device=0 if torch.cuda.is_available() else -1
+    )
+    if model_dir is not None and not cached:
+        classifier.save_pretrained(model_dir)
+    return classifier
+
+
+class PipelineBackend:
+    """The generic Hugging Face pipeline path"""
+
+    name = "pipeline"
+
+    def __init__(self, classifier):
+        from PIL import Image
+
+        self.classifier = classifier
+        self.image = Image
+
+    def classify(self, face_imgs, batch_size=8):
+        pil_images = [self.image.fromarray(cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)) for face_img in face_imgs]
+        return self.classifier(pil_images, batch_size=batch_size)
+
+
+class NumpyPreprocessor:
+    """Resize and normalize BGR crops into an NCHW float32 batch, as the model's image processor does"""
+
+    def __init__(self, size, mean, std, rescale):
+        self.size = tuple(size)
+        self.mean = np.asarray(mean, dtype=np.float32).reshape(1, 1, 3)
+        self.std = np.asarray(std, dtype=np.float32).reshape(1, 1, 3)
+        self.rescale = rescale
+
+    def __call__(self, face_imgs):
+        batch = np.empty((len(face_imgs), 3, self.size[1], self.size[0]), dtype=np.float32)
+        for i, face_img in enumerate(face_imgs):
+            rgb = cv2.cvtColor(cv2.resize(face_img, self.size, interpolation=cv2.INTER_LINEAR), cv2.COLOR_BGR2RGB)
+            batch[i] = ((rgb.astype(np.float32) * self.rescale - self.mean) / self.std).transpose(2, 0, 1)
+        return batch
+
+
+def _top_k(logits, labels):
+    """Softmax over logits and pipeline-style sorted predictions per row"""
+    logits = logits - logits.max(axis=1, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=1, keepdims=True)
+    outputs = []
+    for row in probs:
+        order = np.argsort(row)[::-1][:TOP_K]
+        outputs.append([{"label": labels[i], "score": float(row[i])} for i in order])
+    return outputs
+
+
+class ExportedBackend:
+    """Shared batching and post-processing of the exported backends"""
+
+    def __init__(self, export_dir):
+        with open(os.path.join(export_dir, "backend.json")) as f:
+            meta = json.load(f)
+        self.labels = meta["labels"]
+        self.preprocess = NumpyPreprocessor(meta["size"], meta["mean"], meta["std"], meta["rescale"])
+
+    def run(self, batch):
+        raise NotImplementedError
+
+    def classify(self, face_imgs, batch_size=8):
+        outputs = []
+        for start in range(0, len(face_imgs), batch_size):
+            batch = self.preprocess(face_imgs[start:start + batch_size])
+            outputs.extend(_top_k(self.run(batch), self.labels))
+        return outputs
+
+
+class OnnxBackend(ExportedBackend):
+    name = "onnx"
+
+    def __init__(self, export_dir, quantized=True):
+        import onnxruntime
+
+        super().__init__(export_dir)
+        path = os.path.join(export_dir, "model.int8.onnx")
+        if not quantized or not os.path.exists(path):
+            path = os.path.join(export_dir, "model.onnx")
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+
+    def run(self, batch):
+        return self.session.run(["logits"], {"pixel_values": batch})[0]
+
+
+class TorchScriptBackend(ExportedBackend):
+    name = "torchscript"
+
+    def __init__(self, export_dir, quantized=True):
+        import torch
+
+        super().__init__(export_dir)
+        path = os.path.join(export_dir, "model.int8.pt")
+        if not quantized or not os.path.exists(path):
+            path = os.path.join(export_dir, "model.pt")
+        self.torch = torch
+        self.module = torch.jit.load(path, map_location="cpu").eval()
+
+    def run(self, batch):
+        with self.torch.inference_mode():
+            return self.module(self.torch.from_numpy(batch)).numpy()
+
+
+def load_backend(name, model_dir=None, export_dir=DEFAULT_EXPORT_DIR, quantized=True):
+    """
+    Create an inference backend by name
+
+    Args:
+        name (str): One of BACKENDS
+        model_dir (str): Local model copy used by the pipeline backend
+        export_dir (str): Directory written by export()
+        quantized (bool): Prefer the int8 model if one was exported
+
+    Returns:
+        Backend with a classify(face_imgs, batch_size) method
+    """
+    if name == "pipeline":
+        return PipelineBackend(load_hf_pipeline(model_dir))
+    if name == "onnx":
+        return OnnxBackend(export_dir, quantized)
+    if name == "torchscript":
+        return TorchScriptBackend(export_dir, quantized)
+    raise ValueError(f"Unknown backend '{name}'. Valid backends are: {', '.join(BACKENDS)}")
+
+
+def _logits_module(model):
+    """Wrap the HF model so it returns plain logits and can be traced/exported"""
+    import torch
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values):
+            return self.model(pixel_values=pixel_values).logits
+
+    return LogitsOnly().eval()
+
+
+def export(kind, export_dir=DEFAULT_EXPORT_DIR, model_dir=None, quantize=False):
+    """
+    Export the model once for the onnx or torchscript backend
+
+    Args:
+        kind (str): "onnx" or "torchscript"
+        export_dir (str): Output directory
+        model_dir (str): Local model copy to export from
+        quantize (bool): Also write a dynamically int8-quantized model
+    """
+    import torch
+
+    classifier = load_hf_pipeline(model_dir)
+    processor = classifier.image_processor
+    model = classifier.model.to("cpu").eval()
+    size = processor.size
+    meta = {
+        "labels": [model.config.id2label[i] for i in range(len(model.config.id2label))],
+        "size": [size.get("width", size.get("shortest_edge")), size.get("height", size.get("shortest_edge"))],
+        "mean": list(processor.image_mean),
+        "std": list(processor.image_std),
+        "rescale": processor.rescale_factor if processor.do_rescale else 1.0,
+    }
+    os.makedirs(export_dir, exist_ok=True)
+    with open(os.path.join(export_dir, "backend.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    wrapped = _logits_module(model)
+    dummy = torch.zeros(1, 3, meta["size"][1], meta["size"][0])
+    if kind == "onnx":
+        path = os.path.join(export_dir, "model.onnx")
+        torch.onnx.export(wrapped, dummy, path, input_names=["pixel_values"], output_names=["logits"],
+                          dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}}, opset_version=17)
+        if quantize:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(path, os.path.join(export_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    elif kind == "torchscript":
+        with torch.inference_mode():
+            torch.jit.trace(wrapped, dummy).save(os.path.join(export_dir, "model.pt"))
+            if quantize:
+                quantized = torch.ao.quantization.quantize_dynamic(wrapped, {torch.nn.Linear}, dtype=torch.qint8)
+                torch.jit.trace(quantized, dummy).save(os.path.join(export_dir, "model.int8.pt"))
+    else:
+        raise ValueError(f"Cannot export backend '{kind}'. Valid kinds are: onnx, torchscript")
+    print(f"Exported {kind} model to {export_dir}{' (with int8 copy)' if quantize else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the emotion model for the faster inference backends")
+    parser.add_argument("kind", choices=["onnx", "torchscript"])
+    parser.add_argument("--export-dir", default=DEFAULT_EXPORT_DIR)
+    parser.add_argument("--model-dir", default="model_cache", help="local model copy to export from")
+    parser.add_argument("--quantize", action="store_true", help="also write a dynamic int8 quantized model")
+    args = parser.parse_args()
+    export(args.kind, args.export_dir, args.model_dir, args.quantize)
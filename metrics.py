@@ -0,0 +1,191 @@
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+Lightweight metrics: latency histograms and counters for the hot paths of
+the detector, the emotion state and the music player.
+
+Metrics are off by default. While disabled every call returns after a
+single attribute check, and metrics.time() hands back a shared no-op
+context manager, so instrumented code pays almost nothing. Once enabled,
+the current values can be written to a file (JSON or Prometheus text) or
+served as a Prometheus text endpoint.
+
+    from metrics import metrics
+    with metrics.time("detect_seconds"):
+        ...
+    metrics.inc("emotion_switches_total")
+"""
+
+PREFIX = "moodmuse_"
+# Upper bounds in seconds, from 0.5 ms to 5 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16)
+
+
+class Histogram:
+    """Fixed-bucket histogram with cumulative export, as Prometheus expects"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """Named counters and histograms, safe to update from any thread"""
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def inc(self, name, amount=1):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        """Record a value in a histogram, created with `buckets` on first use"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def time(self, name):
+        """Context manager that records its duration in seconds in a histogram"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: "counters" and "histograms" (cumulative buckets, sum, count)
+        """
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            }
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            lines.append(f"{PREFIX}{name} {value}")
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for bound, count in histogram["buckets"]:
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'{PREFIX}{name}_bucket{{le="{le}"}} {count}')
+            lines.append(f"{PREFIX}{name}_sum {histogram['sum']:.6f}")
+            lines.append(f"{PREFIX}{name}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to a file: JSON for .json paths, Prometheus text otherwise"""
+        if path.endswith(".json"):
+            snapshot = self.snapshot()
+            for histogram in snapshot["histograms"].values():
+                histogram["buckets"] = [["+Inf" if bound == float("inf") else bound, count]
+                                        for bound, count in histogram["buckets"]]
+            text = json.dumps(snapshot, indent=2)
+        else:
+            text = self.to_prometheus()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve the metrics at http://host:port/metrics on a background thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# Process-wide registry used by all modules
+metrics = MetricsRegistry()
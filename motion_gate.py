@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+"""
+Motion and occupancy gate in front of face detection. Each frame is reduced
+to a tiny grayscale probe and differenced against a running average of
+recent probes, so slow movement adds up instead of hiding below the
+threshold between consecutive frames. This costs far less than the
+grayscale conversion and full-frame detection it can save. Every frame gets
+one of three modes:
+
+    full    - detect on the whole frame (first frame, large motion, or
+              recent activity with no faces to anchor the search)
+    regions - detect only in the moving regions and around the last faces
+    idle    - no motion and no faces for a while: skip detection entirely
+              and only poll the camera every few hundred milliseconds
+
+Nothing is published while idle, so the music keeps playing on the last
+smoothed emotion. Stats may be read from another thread than the one
+checking frames.
+"""
+
+FULL = "full"
+REGIONS = "regions"
+IDLE = "idle"
+
+
+def _merge(regions):
+    """Merge overlapping (x0, y0, x1, y1) regions until none overlap"""
+    regions = list(regions)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+
+class MotionGate:
+    """Decides per frame whether face detection runs on the full frame, on regions, or not at all"""
+
+    def __init__(self, probe_width=80, threshold=15, min_motion=0.002, background_time=2.0, idle_after=3.0,
+                 poll_interval=0.5, margin=0.5, min_region=96, full_area=0.5, clock=time.monotonic,
+                 cpu_clock=time.process_time):
+        """
+        Args:
+            probe_width (int): Width of the grayscale probe frames are differenced at
+            threshold (int): Gray level change that counts as motion for a probe pixel
+            min_motion (float): Fraction of probe pixels that must change to count as motion
+            background_time (float): Time constant in seconds of the background average;
+                changes that persist much longer (lighting, moved furniture) stop counting
+            idle_after (float): Seconds without motion or faces before going idle
+            poll_interval (float): Seconds between camera polls while idle
+            margin (float): Padding of motion and face regions, relative to their size
+            min_region (int): Smallest region side in frame pixels, so a face fits
+            full_area (float): Regions covering more than this fraction of the
+                frame are replaced by a full-frame detection
+            clock (callable): Wall clock in seconds
+            cpu_clock (callable): Process CPU time in seconds
+        """
+        self.probe_width = probe_width
+        self.threshold = threshold
+        self.min_motion = min_motion
+        self.background_time = background_time
+        self.idle_after = idle_after
+        self.poll_interval = poll_interval
+        self.margin = margin
+        self.min_region = min_region
+        self.full_area = full_area
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.cpu_count = os.cpu_count() or 1
+
+        self.background = None
+        self.background_at = None
+        self.faces = []
+        self.last_activity = clock()
+        self.mode = FULL
+        # mode -> frames checked (wakeups), wall seconds and CPU seconds spent in that mode
+        self.stats = {mode: {"wakeups": 0, "seconds": 0.0, "cpu": 0.0} for mode in (FULL, REGIONS, IDLE)}
+        self.last_check = None
+        self.last_cpu = None
+        self.lock = threading.Lock()  # Guards mode, stats, last_check and last_cpu
+
+    @property
+    def idle(self):
+        return self.mode == IDLE
+
+    def _probe(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.probe_width, max(1, height * self.probe_width // width))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def _pad(self, x0, y0, x1, y1, frame_w, frame_h):
+        """Pad a region by the margin and to the minimum size, clipped to the frame"""
+        pad_x = max(int((x1 - x0) * self.margin), (self.min_region - (x1 - x0) + 1) // 2, 0)
+        pad_y = max(int((y1 - y0) * self.margin), (self.min_region - (y1 - y0) + 1) // 2, 0)
+        return (max(0, x0 - pad_x), max(0, y0 - pad_y), min(frame_w, x1 + pad_x), min(frame_h, y1 + pad_y))
+
+    def _motion_regions(self, mask, frame_w, frame_h):
+        """Bounding boxes of the moving blobs of the probe mask, in frame coordinates"""
+        scale_x = frame_w / mask.shape[1]
+        scale_y = frame_h / mask.shape[0]
+        # Join nearby blobs so one person gives one region
+        mask = cv2.dilate(mask.astype(np.uint8), np.ones((3, 3), np.uint8), iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        regions = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            regions.append(self._pad(int(x * scale_x), int(y * scale_y), int((x + w) * scale_x),
+                                     int((y + h) * scale_y), frame_w, frame_h))
+        return regions
+
+    def _account(self, now):
+        """Charge the time since the last check to the mode the gate was in"""
+        cpu = self.cpu_clock()
+        if self.last_check is not None:
+            stats = self.stats[self.mode]
+            stats["seconds"] += now - self.last_check
+            stats["cpu"] += cpu - self.last_cpu
+        self.last_check = now
+        self.last_cpu = cpu
+
+    def check(self, frame):
+        """
+        Decide how much detection a frame needs
+
+        Args:
+            frame (ndarray): BGR (or grayscale) frame, in the coordinates detection uses
+
+        Returns:
+            tuple: (mode, regions); regions are (x0, y0, x1, y1) boxes in REGIONS mode, else None
+        """
+        now = self.clock()
+        with self.lock:
+            self._account(now)
+        frame_h, frame_w = frame.shape[:2]
+        probe = self._probe(frame).astype(np.float32)
+
+        regions = None
+        if self.background is None or self.background.shape != probe.shape:
+            self.background = probe
+            mode = FULL
+            self.last_activity = now
+        else:
+            mask = cv2.absdiff(probe, self.background) > self.threshold
+            # Frames arrive at the camera rate or the idle poll rate, so blend by elapsed time
+            alpha = 1.0 - np.exp(-(now - self.background_at) / self.background_time)
+            cv2.accumulateWeighted(probe, self.background, float(alpha))
+            if mask.mean() >= self.min_motion:
+                self.last_activity = now
+                regions = self._motion_regions(mask, frame_w, frame_h)
+            if self.faces:
+                # Still faces are not motion, but they still need detecting
+                regions = (regions or []) + [self._pad(x, y, x + w, y + h, frame_w, frame_h)
+                                             for (x, y, w, h) in self.faces]
+            if regions:
+                regions = _merge(regions)
+                area = sum((x1 - x0) * (y1 - y0) for (x0, y0, x1, y1) in regions)
+                mode = FULL if area > self.full_area * frame_w * frame_h else REGIONS
+            elif now - self.last_activity >= self.idle_after:
+                mode = IDLE
+            else:
+                # Recent activity but nothing moving now: someone may have stopped in view
+                mode = FULL
+
+        self.background_at = now
+        with self.lock:
+            self.mode = mode
+            self.stats[mode]["wakeups"] += 1
+        return mode, regions if mode == REGIONS else None
+
+    def faces_seen(self, faces):
+        """Record the faces detected in the last checked frame; any face keeps the gate awake"""
+        self.faces = list(faces)
+        if self.faces:
+            self.last_activity = self.clock()
+
+    def _snapshot(self, now):
+        """Copy of the mode and per-mode stats, with the time since the last check charged to the mode"""
+        now = self.clock() if now is None else now
+        with self.lock:
+            stats = {mode: dict(values) for mode, values in self.stats.items()}
+            if self.last_check is not None and now > self.last_check:
+                stats[self.mode]["seconds"] += now - self.last_check
+                stats[self.mode]["cpu"] += self.cpu_clock() - self.last_cpu
+            return self.mode, stats
+
+    def scene_stats(self, now=None):
+        """
+        Args:
+            now (float): Time up to which the current mode is charged; defaults to the clock
+
+        Returns:
+            dict: "idle" and "active" scenes -> wakeups per minute, CPU use (fraction of
+            total machine CPU, as the scheduler reports it) and seconds observed
+        """
+        return self._scene_stats(self._snapshot(now)[1])
+
+    def _scene_stats(self, stats):
+        scenes = {"idle": [stats[IDLE]], "active": [stats[FULL], stats[REGIONS]]}
+        result = {}
+        for scene, parts in scenes.items():
+            seconds = sum(part["seconds"] for part in parts)
+            wakeups = sum(part["wakeups"] for part in parts)
+            cpu = sum(part["cpu"] for part in parts)
+            result[scene] = {
+                "seconds": seconds,
+                "wakeups_per_minute": 60.0 * wakeups / seconds if seconds > 0 else 0.0,
+                "cpu": cpu / (seconds * self.cpu_count) if seconds > 0 else 0.0,
+            }
+        return result
+
+    def format_stats(self, now=None):
+        mode, stats = self._snapshot(now)
+        scenes = self._scene_stats(stats)
+        active_frames = stats[FULL]["wakeups"] + stats[REGIONS]["wakeups"]
+        text = " ".join(f"{scene} {s['seconds']:.0f}s: {s['wakeups_per_minute']:.0f} wakeups/min "
+                        f"cpu={100 * s['cpu']:.1f}%" for scene, s in scenes.items())
+        if active_frames:
+            text += f" (regions only in {100 * stats[REGIONS]['wakeups'] / active_frames:.0f}% of active frames)"
+        return f"mode={mode} {text}"
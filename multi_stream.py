@@ -0,0 +1,380 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from queue import Empty, Queue
+
+import cv2
+
+from CurrentState import CurrentStateUpdate
+from face_detectors import DETECTORS, DEFAULT_YUNET_MODEL, make_detector
+from inference_backends import BACKENDS, DEFAULT_EXPORT_DIR
+from pipeline import LatestValue
+import face_emotion
+
+"""
+Multi-stream service mode: one MoodMuse per room, from one box.
+
+Every video source runs on its own thread (capture, face detection and
+smoothing), while face crops from all streams go to a shared pool of
+inference worker processes, so the model is not limited by the GIL. A
+batcher merges crops that arrive from different streams within a few
+milliseconds into one forward pass.
+
+Each stream has its own CurrentStateUpdate and, with --audio, its own
+MoodMuse on a separate pair of mixer channels. All outputs share the
+process's audio device.
+
+    python multi_stream.py room1.mp4 room2.mp4 0 --workers 4 --audio
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker(model_dir, backend, export_dir, threads):
+    # Keep each process to a few threads so workers don't oversubscribe the cores
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    if backend != "onnx":
+        import torch
+        torch.set_num_threads(threads)
+    face_emotion.load_classifier(model_dir, backend, export_dir)
+
+
+def _worker_ready():
+    time.sleep(0.1)  # Hold the worker so the next call starts another process
+    return os.getpid()
+
+
+def _classify_batch(crops, batch_size):
+    return face_emotion.process_faces(crops, batch_size=batch_size)
+
+
+class InferencePool:
+    """Shared inference worker processes with cross-stream batching"""
+
+    def __init__(self, workers=2, batch_size=16, max_wait=0.01, model_dir=face_emotion.DEFAULT_MODEL_CACHE,
+                 backend="pipeline", export_dir=DEFAULT_EXPORT_DIR, threads_per_worker=1):
+        """
+        Args:
+            workers (int): Inference processes
+            batch_size (int): Faces after which a batch is sent without waiting
+            max_wait (float): Seconds to wait for crops from other streams
+            model_dir (str): Local model copy, see face_emotion.load_classifier
+            backend (str): Inference backend, see inference_backends.BACKENDS
+            export_dir (str): Exported model directory for the onnx/torchscript backends
+            threads_per_worker (int): Math library threads in each process
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+            initargs=(model_dir, backend, export_dir, threads_per_worker))
+        self.requests = Queue()
+        # At most two batches per worker in flight; the rest keep batching
+        self.inflight = threading.Semaphore(2 * workers)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.stats = {"requests": 0, "faces": 0, "batches": 0, "cross_stream_batches": 0}
+        self.thread = threading.Thread(target=self._batch_loop, name="batcher")
+        self.thread.start()
+
+    def warm_up(self):
+        """Start every worker process and wait until each has loaded the model"""
+        pids = {future.result() for future in [self.executor.submit(_worker_ready) for _ in range(self.workers)]}
+        return len(pids)
+
+    def submit(self, stream_id, crops):
+        """
+        Queue the face crops of one frame
+
+        Returns:
+            Future: Resolves to one prediction (or None) per crop; fails with
+            RuntimeError once the pool is closed
+        """
+        future = Future()
+        if len(crops) == 0:
+            future.set_result([])
+            return future
+        with self.lock:
+            if not self.closed:
+                self.requests.put((stream_id, crops, future))
+                return future
+        future.set_exception(RuntimeError("Inference pool is closed"))
+        return future
+
+    def _batch_loop(self):
+        try:
+            self._batch_requests()
+        finally:
+            # Whether closed or crashed, nothing will serve the requests still queued
+            with self.lock:
+                self.closed = True
+            self._fail_queued(RuntimeError("Inference pool is closed"))
+
+    def _fail_queued(self, error):
+        while True:
+            try:
+                item = self.requests.get_nowait()
+            except Empty:
+                return
+            if item is not None:
+                item[2].set_exception(error)
+
+    def _batch_requests(self):
+        closing = False
+        while not closing:
+            item = self.requests.get()
+            if item is None:
+                break
+            pending = [item]
+            count = len(item[1])
+            deadline = time.perf_counter() + self.max_wait
+            while count < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=remaining)
+                except Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                pending.append(item)
+                count += len(item[1])
+            self._dispatch(pending)
+
+    def _dispatch(self, pending):
+        crops = [crop for _, stream_crops, _ in pending for crop in stream_crops]
+        with self.lock:
+            self.stats["requests"] += len(pending)
+            self.stats["faces"] += len(crops)
+            self.stats["batches"] += 1
+            if len({stream_id for stream_id, _, _ in pending}) > 1:
+                self.stats["cross_stream_batches"] += 1
+        self.inflight.acquire()
+        try:
+            batch = self.executor.submit(_classify_batch, crops, self.batch_size)
+        except RuntimeError as e:
+            self.inflight.release()
+            for _, _, future in pending:
+                future.set_exception(e)
+            return
+        batch.add_done_callback(lambda done: self._deliver(done, pending))
+
+    def _deliver(self, done, pending):
+        self.inflight.release()
+        try:
+            results = done.result()
+        except Exception as e:
+            for _, _, future in pending:
+                future.set_exception(e)
+            return
+        start = 0
+        for _, crops, future in pending:
+            future.set_result(results[start:start + len(crops)])
+            start += len(crops)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.requests.put(None)
+        self.thread.join()
+        self.executor.shutdown(wait=True)
+
+
+class StreamOutput:
+    """A MoodMuse player fed by a coalescing channel, on its own mixer channels"""
+
+    def __init__(self, index, cache_bytes=64 * 1024 * 1024, playback="memory", features=None,
+                 audio_analysis=False):
+        from MoodMuse import MoodMuse
+
+        self.mood_muse = MoodMuse(cache_bytes=cache_bytes, playback=playback,
+                                  music_channels=(2 * index, 2 * index + 1), shared_mixer=True,
+                                  features=features, audio_analysis=audio_analysis)
+        self.channel = LatestValue()
+        self.thread = threading.Thread(target=self._run, name=f"music-{index}")
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                emotion = self.channel.get()
+            except Empty:
+                break
+            try:
+                self.mood_muse.set_emotion(emotion)
+            except Exception as e:
+                logger.error("Error in music output: %s", e)
+
+    def publish(self, emotion):
+        self.channel.publish(emotion)
+
+    def close(self):
+        self.channel.close()
+        self.thread.join()
+        self.mood_muse.shutdown()
+
+
+class VideoStream(threading.Thread):
+    """Capture, detection and smoothing for one source; inference goes to the shared pool"""
+
+    def __init__(self, stream_id, source, pool, detector="haar", detector_options=None, loop=True,
+                 output=None, size=(640, 480)):
+        """
+        Args:
+            stream_id (int): Index of the stream
+            source (str or int): Video file, or camera index
+            pool (InferencePool): Shared inference workers
+            detector (str): Face detector name, see face_detectors.DETECTORS
+            detector_options (dict): Passed to the detector's constructor
+            loop (bool): Restart video files at the end, as a stand-in camera
+            output (StreamOutput): Receives the smoothed emotion, or None
+            size (tuple): Frames are resized to this (width, height)
+        """
+        super().__init__(name=f"stream-{stream_id}")
+        self.stream_id = stream_id
+        self.source = source
+        self.pool = pool
+        self.detector = make_detector(detector, **(detector_options or {}))
+        self.loop = loop and not isinstance(source, int)
+        self.output = output
+        self.size = size
+        self.state = CurrentStateUpdate()
+        self.emotion = self.state.state
+        self.stop_event = threading.Event()
+        self.frames = 0
+        self.faces = 0
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    if not self.loop or self.frames == 0:
+                        break
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                frame = cv2.resize(frame, self.size)
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                faces = self.detector.detect(frame, gray)
+                crops = [frame[y:y+h, x:x+w] for (x, y, w, h) in faces]
+                results = self._wait(self.pool.submit(self.stream_id, crops))
+                if results is None:
+                    break  # Stopped while waiting for inference
+                for result in results:
+                    if result:
+                        self.emotion = self.state.update_state(result['label'].lower())
+                if results and self.output is not None:
+                    self.output.publish(self.emotion)
+                self.frames += 1
+                self.faces += len(faces)
+        except Exception as e:
+            logger.error("Stream %s stopped: %s", self.stream_id, e)
+        finally:
+            cap.release()
+
+    def _wait(self, future, poll=0.5):
+        """Wait for inference results, giving up (None) once the stream is stopped"""
+        while not self.stop_event.is_set():
+            try:
+                return future.result(timeout=poll)
+            except TimeoutError:
+                continue
+        return None
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def parse_source(source):
+    """Camera indexes are given as plain numbers"""
+    return int(source) if source.isdigit() else source
+
+
+def run_service(args):
+    """Run all streams until interrupted or for args.duration seconds"""
+    pool = InferencePool(workers=args.workers, batch_size=args.batch_size, max_wait=args.max_wait,
+                         model_dir=args.model_cache or None, backend=args.backend, export_dir=args.export_dir,
+                         threads_per_worker=args.threads_per_worker)
+    outputs = []
+    streams = []
+    try:
+        print(f"Started {pool.warm_up()} inference workers")
+        if args.audio:
+            import pygame
+            pygame.init()
+            cache_bytes = args.cache_mb * 1024 * 1024 // max(1, len(args.sources))
+            outputs = []
+            for i in range(len(args.sources)):
+                # The first player analyzes the library, the others share its index
+                features = outputs[0].mood_muse.features if outputs else None
+                outputs.append(StreamOutput(i, cache_bytes=cache_bytes, features=features,
+                                            audio_analysis=args.audio_analysis))
+        detector_options = {"model_path": args.yunet_model} if args.detector == "yunet" else {}
+        streams = [VideoStream(i, parse_source(source), pool, args.detector, detector_options,
+                               output=outputs[i] if outputs else None)
+                   for i, source in enumerate(args.sources)]
+        start = time.perf_counter()
+        for stream in streams:
+            stream.start()
+        last_frames = 0
+        last_report = start
+        while any(stream.is_alive() for stream in streams):
+            time.sleep(min(args.stats_interval, 0.5))
+            now = time.perf_counter()
+            if args.duration and now - start >= args.duration:
+                break
+            if now - last_report >= args.stats_interval:
+                frames = sum(stream.frames for stream in streams)
+                states = ", ".join(f"{stream.stream_id}:{stream.emotion}" for stream in streams)
+                print(f"{(frames - last_frames) / (now - last_report):.1f} frames/sec total | {states} | {pool.stats}")
+                last_frames = frames
+                last_report = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for stream in streams:
+            stream.stop()
+        for stream in streams:
+            stream.join()
+        for output in outputs:
+            output.close()
+        pool.close()
+        if outputs:
+            import pygame
+            pygame.mixer.quit()
+
+
+def add_arguments(parser):
+    """Command line options shared with the benchmark harness"""
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="inference processes")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=16, help="faces per cross-stream batch")
+    parser.add_argument("--max-wait", type=float, default=0.01, help="seconds to wait for other streams' crops")
+    parser.add_argument("--detector", default="haar", choices=list(DETECTORS))
+    parser.add_argument("--yunet-model", default=DEFAULT_YUNET_MODEL)
+    parser.add_argument("--backend", default="pipeline", choices=BACKENDS)
+    parser.add_argument("--export-dir", default=DEFAULT_EXPORT_DIR)
+    parser.add_argument("--model-cache", default=face_emotion.DEFAULT_MODEL_CACHE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run MoodMuse for several video sources with shared inference")
+    parser.add_argument("sources", nargs="+", help="video files (looped) or camera indexes")
+    parser.add_argument("--audio", action="store_true", help="play music for every stream")
+    parser.add_argument("--audio-analysis", action="store_true",
+                        help="analyze new songs in a background process for cued, level-matched crossfades")
+    parser.add_argument("--cache-mb", type=int, default=256, help="decoded-song memory shared by all streams")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--stats-interval", type=float, default=5.0)
+    add_arguments(parser)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run_service(parser.parse_args())
@@ -0,0 +1,251 @@
+import json
+import os
+import struct
+import threading
+import wave
+
+"""
+Indexed music library. Scans music_files/<emotion>/ and keeps per-track
+metadata (duration, size, mtime, sample rate) in an on-disk index, so song
+selection is an in-memory lookup and start-up only re-reads what changed.
+"""
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg", ".flac")
+INDEX_VERSION = 2
+
+# MPEG audio header tables, indexed by [version][layer] and [version]
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+def _mp3_info(path, file_size):
+    """Read sample rate, channels and duration from the first MPEG frame (and Xing header if present)"""
+    with open(path, "rb") as f:
+        head = f.read(64 * 1024)
+
+    tag_size = 0
+    head_start = 0  # File position of head[0]
+    if head[:3] == b"ID3" and len(head) >= 10:
+        # ID3v2 tag size is a 28-bit syncsafe integer
+        tag_size = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+        if tag_size + 4 > len(head):
+            with open(path, "rb") as f:
+                f.seek(tag_size)
+                head = f.read(64 * 1024)
+            head_start = tag_size
+    offset = tag_size - head_start
+
+    while offset + 4 <= len(head):
+        if head[offset] == 0xFF and (head[offset + 1] & 0xE0) == 0xE0:
+            header = struct.unpack(">I", head[offset:offset + 4])[0]
+            version_bits = (header >> 19) & 3
+            layer_bits = (header >> 17) & 3
+            bitrate_index = (header >> 12) & 15
+            rate_index = (header >> 10) & 3
+            if version_bits != 1 and layer_bits != 0 and bitrate_index not in (0, 15) and rate_index != 3:
+                version = {3: 1, 2: 2, 0: 2.5}[version_bits]
+                layer = 4 - layer_bits
+                sample_rate = _SAMPLE_RATES[version][rate_index]
+                bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+                channels = 1 if ((header >> 6) & 3) == 3 else 2
+                samples_per_frame = 384 if layer == 1 else (1152 if version == 1 or layer == 2 else 576)
+
+                # VBR files carry the total frame count in a Xing/Info header
+                side_info = (17 if channels == 1 else 32) if version == 1 else (9 if channels == 1 else 17)
+                xing = offset + 4 + side_info
+                if head[xing:xing + 4] in (b"Xing", b"Info") and head[xing + 7] & 1:
+                    frames = struct.unpack(">I", head[xing + 8:xing + 12])[0]
+                    duration = frames * samples_per_frame / sample_rate
+                else:
+                    # Constant bitrate: everything from the first frame on is audio
+                    duration = (file_size - head_start - offset) * 8 / bitrate
+                return {"sample_rate": sample_rate, "channels": channels, "duration": round(duration, 2)}
+        offset += 1
+    return {"sample_rate": None, "channels": None, "duration": None}
+
+
+def read_audio_info(path, file_size):
+    """
+    Read basic audio metadata without decoding the file
+
+    Args:
+        path (str): Path to the audio file
+        file_size (int): File size in bytes
+
+    Returns:
+        dict: "sample_rate", "channels" and "duration" (seconds); None where unknown
+    """
+    try:
+        if path.lower().endswith(".mp3"):
+            return _mp3_info(path, file_size)
+        if path.lower().endswith(".wav"):
+            with wave.open(path, "rb") as w:
+                return {"sample_rate": w.getframerate(), "channels": w.getnchannels(),
+                        "duration": round(w.getnframes() / w.getframerate(), 2)}
+    except (OSError, EOFError, wave.Error, struct.error, IndexError):
+        pass
+    return {"sample_rate": None, "channels": None, "duration": None}
+
+
+class MusicLibrary:
+    """
+    In-memory index of the music library, persisted to a JSON index file.
+
+    A directory whose mtime is unchanged since the last scan is not listed
+    again (adding or removing files changes it), so start-up cost depends on
+    the number of directories, not tracks. refresh(full=True) also re-stats
+    every file to pick up edits in place; start_polling() runs that in the
+    background.
+    """
+
+    def __init__(self, root, emotions, index_path=None, debug=False):
+        """
+        Args:
+            root (str): Music directory containing one folder per emotion
+            emotions (list): Emotion folder names
+            index_path (str): Index file, defaults to <root>/.library_index.json
+            debug (bool): Enable debug output if True
+        """
+        self.root = str(root)
+        self.emotions = list(emotions)
+        self.index_path = index_path or os.path.join(self.root, ".library_index.json")
+        self.debug = debug
+        self.lock = threading.Lock()
+        self.poll_stop = threading.Event()
+        self.poll_thread = None
+
+        self.tracks = {}  # path -> metadata dict
+        self.dir_mtimes = {}
+        # emotion -> list of paths; lists are replaced, never mutated, so readers need no lock
+        self.songs = {emotion: [] for emotion in self.emotions}
+        self.stats = {"scanned_dirs": 0, "read_files": 0}
+
+        self._load_index()
+        self.refresh()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get("version") != INDEX_VERSION:
+                return
+            tracks = index["tracks"]
+            songs = {emotion: [] for emotion in self.emotions}
+            for path, track in tracks.items():
+                if track["emotion"] in songs:
+                    songs[track["emotion"]].append(path)
+            self.tracks = tracks
+            self.dir_mtimes = index["dirs"]
+            self.songs = {emotion: sorted(paths) for emotion, paths in songs.items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _save_index(self):
+        index = {"version": INDEX_VERSION, "dirs": self.dir_mtimes, "tracks": self.tracks}
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(index, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            if self.debug:
+                print(f"Could not write library index: {e}")
+
+    def _scan_dir(self, emotion, full):
+        """Bring one emotion folder up to date; returns True if anything changed"""
+        directory = os.path.join(self.root, emotion)
+        try:
+            dir_mtime = os.stat(directory).st_mtime
+        except OSError:
+            # Folder is gone, drop its tracks
+            changed = bool(self.songs[emotion])
+            for path in self.songs[emotion]:
+                self.tracks.pop(path, None)
+            self.songs[emotion] = []
+            self.dir_mtimes.pop(emotion, None)
+            return changed
+
+        known = self.songs[emotion]
+        dir_changed = self.dir_mtimes.get(emotion) != dir_mtime
+        if not full and not dir_changed:
+            return False
+
+        self.stats["scanned_dirs"] += 1
+        changed = False
+        found = set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                    continue
+                path = os.path.join(directory, entry.name).replace(os.sep, "/")
+                found.add(path)
+                stat = entry.stat()
+                track = self.tracks.get(path)
+                if track and track["mtime"] == stat.st_mtime and track["size"] == stat.st_size:
+                    continue
+                track = {"emotion": emotion, "size": stat.st_size, "mtime": stat.st_mtime}
+                track.update(read_audio_info(path, stat.st_size))
+                self.tracks[path] = track
+                self.stats["read_files"] += 1
+                changed = True
+
+        for path in known:
+            if path not in found:
+                del self.tracks[path]
+                changed = True
+
+        self.dir_mtimes[emotion] = dir_mtime
+        self.songs[emotion] = sorted(found)
+        return changed or dir_changed
+
+    def refresh(self, full=False):
+        """
+        Update the index from disk
+
+        Args:
+            full (bool): Re-stat every file, not only folders whose listing changed
+
+        Returns:
+            bool: True if any track was added, removed or changed
+        """
+        with self.lock:
+            changed = False
+            for emotion in self.emotions:
+                changed = self._scan_dir(emotion, full) or changed
+            if changed:
+                self._save_index()
+        if changed and self.debug:
+            print(f"Music library updated: {len(self.tracks)} tracks")
+        return changed
+
+    def start_polling(self, interval=30.0):
+        """Re-check the library in the background every `interval` seconds"""
+        if self.poll_thread is not None:
+            return
+
+        def poll():
+            while not self.poll_stop.wait(interval):
+                self.refresh(full=True)
+
+        self.poll_thread = threading.Thread(target=poll, daemon=True)
+        self.poll_thread.start()
+
+    def stop_polling(self):
+        self.poll_stop.set()
+        if self.poll_thread is not None:
+            self.poll_thread.join(timeout=1.0)
+            self.poll_thread = None
+
+    def get_track(self, path):
+        """
+        Returns:
+            dict or None: Metadata of a track in the library
+        """
+        return self.tracks.get(path)
@@ -0,0 +1,287 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from CurrentState import CurrentStateUpdate, EMOTIONS, EMOTION_ORDER
+from face_detectors import DETECTORS, DEFAULT_YUNET_MODEL, make_detector
+from inference_backends import BACKENDS, DEFAULT_EXPORT_DIR
+from smoothing import SMOOTHERS, make_smoother
+import face_emotion
+
+"""
+Headless analysis of a recorded session (a video file or a directory of
+frames). Runs the same detection, classification and smoothing as the live
+loop, as fast as possible:
+
+    decode   - frame ranges are decoded in parallel by worker threads
+    detect   - face detection runs on a thread pool (OpenCV releases the GIL)
+    classify - all faces of a chunk of frames go through batched inference
+    smooth   - the emotion state is updated in frame order
+
+Per-frame and per-face timelines are written to a compressed .npz file with
+one array per column, and frames/sec plus per-stage timings are reported.
+
+    python offline_analysis.py recorded_session.mp4 -o timeline.npz
+"""
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+STAGES = ("decode", "detect", "classify", "smooth")
+
+
+class FrameSource:
+    """Decodes a video file or an image directory in chunks, in parallel"""
+
+    def __init__(self, source, size=(640, 480), fps=None, limit=None):
+        """
+        Args:
+            source (str): Video file or directory of frames
+            size (tuple): Frames are resized to this (width, height)
+            fps (float): Frame rate used for timestamps; read from the video if None
+            limit (int): Maximum number of frames
+        """
+        self.source = source
+        self.size = size
+        if os.path.isdir(source):
+            self.images = [os.path.join(source, name) for name in sorted(os.listdir(source))
+                           if name.lower().endswith(IMAGE_EXTENSIONS)]
+            self.images = self.images[:limit]
+            count = len(self.images)
+            self.fps = fps or 30.0
+        else:
+            self.images = None
+            cap = cv2.VideoCapture(source)
+            if not cap.isOpened():
+                raise FileNotFoundError(f"Cannot open video {source}")
+            count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.fps = fps or cap.get(cv2.CAP_PROP_FPS) or 30.0
+            cap.release()
+        # Containers without a frame count can only be decoded sequentially
+        if self.images is None and count <= 0:
+            count = None
+        self.count = min(count, limit) if count is not None and limit else count
+        self.limit = limit
+
+    def _read_images(self, start, stop):
+        frames = []
+        for path in self.images[start:stop]:
+            frame = cv2.imread(path)
+            frames.append(cv2.resize(frame, self.size) if frame is not None else None)
+        return frames
+
+    def _read_video(self, start, stop):
+        cap = cv2.VideoCapture(self.source)
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frames = []
+        for _ in range(start, stop):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, self.size))
+        cap.release()
+        return frames
+
+    def _read_sequential(self, chunk_size):
+        cap = cv2.VideoCapture(self.source)
+        index = 0
+        while self.limit is None or index < self.limit:
+            frames = []
+            while len(frames) < chunk_size and (self.limit is None or index + len(frames) < self.limit):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frames.append(cv2.resize(frame, self.size))
+            if not frames:
+                break
+            yield index, frames
+            index += len(frames)
+        cap.release()
+
+    def chunks(self, chunk_size=64, workers=4):
+        """
+        Yield (first_frame_index, frames) in order; a few chunks are decoded ahead
+
+        Args:
+            chunk_size (int): Frames per chunk
+            workers (int): Decoding threads
+        """
+        if self.images is None and (self.count is None or workers <= 1):
+            yield from self._read_sequential(chunk_size)
+            return
+        read = self._read_images if self.images is not None else self._read_video
+        starts = list(range(0, self.count, chunk_size))
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            # Keep at most `workers` chunks in flight to bound memory
+            pending = [pool.submit(read, start, min(start + chunk_size, self.count))
+                       for start in starts[:workers]]
+            for i, start in enumerate(starts):
+                frames = pending[i].result()
+                pending[i] = None
+                if i + workers < len(starts):
+                    next_start = starts[i + workers]
+                    pending.append(pool.submit(read, next_start, min(next_start + chunk_size, self.count)))
+                yield start, frames
+
+
+class OfflineAnalyzer:
+    """Runs detection, batched classification and smoothing over recorded frames"""
+
+    def __init__(self, detector="haar", detector_options=None, smoothing="count", batch_size=32,
+                 detect_workers=4, decode_workers=4, chunk_size=64):
+        """
+        Args:
+            detector (str): Face detector name, see face_detectors.DETECTORS
+            detector_options (dict): Passed to the detector's constructor
+            smoothing (str): "count" for CurrentStateUpdate, or one of smoothing.SMOOTHERS
+            batch_size (int): Faces per forward pass
+            detect_workers (int): Face detection threads
+            decode_workers (int): Decoding threads
+            chunk_size (int): Frames decoded, detected and classified together
+        """
+        self.detector = detector
+        self.detector_options = detector_options or {}
+        self.smoothing = smoothing
+        self.batch_size = batch_size
+        self.detect_workers = detect_workers
+        self.decode_workers = decode_workers
+        self.chunk_size = chunk_size
+        self.local = threading.local()
+        self.timings = {stage: 0.0 for stage in STAGES}
+
+    def _detect(self, frames):
+        # Detectors keep state between calls (YuNet searches around its previous faces),
+        # so each thread has its own and works through a contiguous run of frames
+        if not hasattr(self.local, "detector"):
+            self.local.detector = make_detector(self.detector, **self.detector_options)
+        return [self.local.detector.detect(frame, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)) if frame is not None else []
+                for frame in frames]
+
+    def run(self, source):
+        """
+        Analyze every frame of a FrameSource
+
+        Returns:
+            dict: Column arrays of the frame and face timelines
+        """
+        state = CurrentStateUpdate() if self.smoothing == "count" else make_smoother(self.smoothing)
+        frame_cols = {"frame": [], "time": [], "faces": [], "state": []}
+        face_cols = {"frame": [], "x": [], "y": [], "w": [], "h": [], "emotion": [], "score": []}
+        current = EMOTION_ORDER["neutral"]
+        self.timings = {stage: 0.0 for stage in STAGES}
+
+        with ThreadPoolExecutor(max_workers=self.detect_workers) as pool:
+            chunks = source.chunks(self.chunk_size, self.decode_workers)
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                self.timings["decode"] += time.perf_counter() - start
+                if chunk is None:
+                    break
+                first, frames = chunk
+
+                start = time.perf_counter()
+                step = -(-len(frames) // self.detect_workers)
+                runs = pool.map(self._detect, (frames[i:i + step] for i in range(0, len(frames), step)))
+                detections = [faces for run in runs for faces in run]
+                self.timings["detect"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                crops = [frame[y:y+h, x:x+w] for frame, faces in zip(frames, detections) for (x, y, w, h) in faces]
+                results = face_emotion.process_faces(crops, batch_size=self.batch_size)
+                self.timings["classify"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                results = iter(results)
+                for offset, faces in enumerate(detections):
+                    index = first + offset
+                    now = index / source.fps
+                    for (x, y, w, h) in faces:
+                        result = next(results)
+                        if result:
+                            emotion = result['label'].lower()
+                            if self.smoothing == "count":
+                                current = EMOTION_ORDER[state.update_state(emotion)]
+                            else:
+                                current = EMOTION_ORDER[state.update(emotion, result['score'], now)]
+                        for column, value in zip(("frame", "x", "y", "w", "h"), (index, x, y, w, h)):
+                            face_cols[column].append(value)
+                        face_cols["emotion"].append(EMOTION_ORDER.get(result['label'].lower(), -1) if result else -1)
+                        face_cols["score"].append(result['score'] if result else 0.0)
+                    frame_cols["frame"].append(index)
+                    frame_cols["time"].append(now)
+                    frame_cols["faces"].append(len(faces))
+                    frame_cols["state"].append(current)
+                self.timings["smooth"] += time.perf_counter() - start
+
+        dtypes = {"frame": np.int32, "time": np.float32, "faces": np.int16, "state": np.int8,
+                  "x": np.int16, "y": np.int16, "w": np.int16, "h": np.int16, "emotion": np.int8,
+                  "score": np.float32}
+        timeline = {f"frame_{name}": np.asarray(values, dtype=dtypes[name]) for name, values in frame_cols.items()}
+        timeline.update({f"face_{name}": np.asarray(values, dtype=dtypes[name]) for name, values in face_cols.items()})
+        timeline["emotions"] = np.asarray(EMOTIONS)
+        return timeline
+
+
+def save_timeline(path, timeline):
+    """Write the timeline columns to a compressed .npz file"""
+    np.savez_compressed(path, **timeline)
+
+
+def format_report(timeline, timings, elapsed):
+    frames = len(timeline["frame_frame"])
+    faces = len(timeline["face_frame"])
+    stages = ", ".join(f"{stage} {1000 * timings[stage] / max(frames, 1):.2f}ms/frame" for stage in STAGES)
+    return (f"{frames} frames, {faces} faces in {elapsed:.2f}s: {frames / elapsed:.1f} frames/sec\n"
+            f"Stages: {stages}")
+
+
+def analyze(args):
+    """Run an analysis from parsed command line arguments and print the report"""
+    face_emotion.load_classifier(args.model_cache or None, args.backend, args.export_dir)
+    source = FrameSource(args.source, fps=args.fps, limit=args.limit)
+    analyzer = OfflineAnalyzer(
+        detector=args.detector,
+        detector_options={"model_path": args.yunet_model} if args.detector == "yunet" else {},
+        smoothing=args.smoothing,
+        batch_size=args.batch_size,
+        detect_workers=args.detect_workers,
+        decode_workers=args.decode_workers,
+        chunk_size=args.chunk_size,
+    )
+    start = time.perf_counter()
+    timeline = analyzer.run(source)
+    elapsed = time.perf_counter() - start
+    if args.output:
+        save_timeline(args.output, timeline)
+        print(f"Timeline written to {args.output}")
+    print(format_report(timeline, analyzer.timings, elapsed))
+    return timeline
+
+
+def add_arguments(parser):
+    """Command line options shared with the benchmark harness"""
+    parser.add_argument("source", help="video file or directory of frames")
+    parser.add_argument("-o", "--output", help="timeline .npz file to write")
+    parser.add_argument("--limit", type=int, help="maximum frames to analyze")
+    parser.add_argument("--fps", type=float, help="frame rate for timestamps (default: from the video, or 30)")
+    parser.add_argument("--detector", default="haar", choices=list(DETECTORS))
+    parser.add_argument("--yunet-model", default=DEFAULT_YUNET_MODEL)
+    parser.add_argument("--smoothing", default="count", choices=["count"] + list(SMOOTHERS))
+    parser.add_argument("--batch-size", type=int, default=32, help="faces per forward pass")
+    parser.add_argument("--chunk-size", type=int, default=64, help="frames processed together")
+    parser.add_argument("--decode-workers", type=int, default=4)
+    parser.add_argument("--detect-workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--backend", default="pipeline", choices=BACKENDS)
+    parser.add_argument("--export-dir", default=DEFAULT_EXPORT_DIR)
+    parser.add_argument("--model-cache", default=face_emotion.DEFAULT_MODEL_CACHE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze a recorded session without a webcam or display")
+    add_arguments(parser)
+    analyze(parser.parse_args())
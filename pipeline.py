@@ -0,0 +1,328 @@
+import logging
+import threading
+import time
+from collections import deque
+from queue import Empty
+
+"""
+Staged producer/consumer engine. Capture, face detection and emotion
+inference each run on their own worker thread, connected by small bounded
+queues. Queues drop their oldest item when full, so a slow stage always
+works on the freshest frame instead of a growing backlog.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class DropOldestQueue:
+    """Bounded FIFO queue that discards the oldest item instead of blocking"""
+
+    def __init__(self, maxsize=2):
+        self.maxsize = maxsize
+        self.items = deque()
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        """Add an item, dropping the oldest one if the queue is full"""
+        with self.cond:
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Remove and return the oldest item
+
+        Raises:
+            Empty: If no item arrived within the timeout or the queue was closed
+        """
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if not self.items:
+                raise Empty
+            return self.items.popleft()
+
+    def qsize(self):
+        return len(self.items)
+
+    def close(self):
+        """Wake up any waiting consumer so it can exit"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class LatestValue:
+    """
+    Single-slot channel that only keeps the newest value. Publishing the value
+    that was last published is a no-op, and values overwritten before the
+    consumer took them are coalesced, so the consumer wakes once per change.
+    """
+
+    def __init__(self, initial=None):
+        self.value = initial
+        self.pending = False
+        self.closed = False
+        self.woken = False
+        self.cond = threading.Condition()
+        self.published = 0
+        self.unchanged = 0   # publishes skipped because the value did not change
+        self.coalesced = 0   # values replaced before the consumer saw them
+        self.wakeups = 0     # values delivered to the consumer
+
+    def publish(self, value):
+        """
+        Offer a new value
+
+        Returns:
+            bool: True if the value changed and the consumer will be woken
+        """
+        with self.cond:
+            self.published += 1
+            if self.closed or value == self.value:
+                self.unchanged += 1
+                return False
+            if self.pending:
+                self.coalesced += 1
+            self.value = value
+            self.pending = True
+            self.cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Wait for a changed value and return it
+
+        Raises:
+            Empty: If nothing changed within the timeout or before wake(), or the channel was closed
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.pending or self.closed or self.woken, timeout)
+            self.woken = False
+            if self.closed or not self.pending:
+                raise Empty
+            self.pending = False
+            self.wakeups += 1
+            return self.value
+
+    def qsize(self):
+        """Values waiting for the consumer, 0 or 1"""
+        return 1 if self.pending else 0
+
+    def wake(self):
+        """Make a waiting get() return early, as if it timed out, so the consumer can reconsider its timeout"""
+        with self.cond:
+            self.woken = True
+            self.cond.notify_all()
+
+    def close(self):
+        """Wake the consumer so it can exit; pending values are discarded"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Publish, skip, coalesce and wakeup counts and the current depth
+        """
+        with self.cond:
+            return {
+                "published": self.published,
+                "unchanged": self.unchanged,
+                "coalesced": self.coalesced,
+                "wakeups": self.wakeups,
+                "depth": self.qsize(),
+            }
+
+    def format_stats(self):
+        stats = self.stats()
+        avoided = stats["unchanged"] + stats["coalesced"]
+        return (f"published {stats['published']}, wakeups {stats['wakeups']}, "
+                f"avoided {avoided} (unchanged {stats['unchanged']}, coalesced {stats['coalesced']}), "
+                f"depth {stats['depth']}")
+
+
+class StageStats:
+    """Throughput and busy-time counters for one pipeline stage"""
+
+    def __init__(self):
+        self.processed = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.started_at = time.perf_counter()
+
+    def record(self, elapsed):
+        self.processed += 1
+        self.busy_time += elapsed
+
+    def snapshot(self):
+        wall = max(time.perf_counter() - self.started_at, 1e-9)
+        return {
+            "processed": self.processed,
+            "errors": self.errors,
+            "fps": self.processed / wall,
+            "avg_ms": 1000.0 * self.busy_time / self.processed if self.processed else 0.0,
+        }
+
+
+class Stage(threading.Thread):
+    """
+    Worker thread that applies a function to items from one queue and puts
+    the results on the next. A stage without an input queue is a source and
+    calls its function with no arguments; returning None ends the source.
+    An item whose function raises is logged and dropped; a source that raises
+    ends. Either way the output queue is closed when the stage exits, so
+    downstream stages and the consumer never wait on a dead stage.
+    """
+
+    def __init__(self, name, func, in_queue=None, out_queue=None):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.stats = StageStats()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.in_queue is None:
+                    start = time.perf_counter()
+                    try:
+                        item = self.func()
+                    except Exception:
+                        logger.exception("Source stage %s failed, ending the pipeline", self.name)
+                        break
+                    if item is None:
+                        break
+                else:
+                    try:
+                        item = self.in_queue.get(timeout=0.1)
+                    except Empty:
+                        if self.in_queue.closed:
+                            break  # Upstream finished and everything is drained
+                        continue
+                    start = time.perf_counter()
+                    try:
+                        item = self.func(item)
+                    except Exception:
+                        logger.exception("Stage %s failed on an item, dropping it", self.name)
+                        self.stats.errors += 1
+                        continue
+                self.stats.record(time.perf_counter() - start)
+                if item is not None and self.out_queue is not None:
+                    self.out_queue.put(item)
+        finally:
+            if self.out_queue is not None:
+                self.out_queue.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class PipelineEngine:
+    """
+    Runs capture -> detect -> classify on worker threads. Rendering stays with
+    the caller (OpenCV windows must be driven from the main thread), which
+    pulls finished frames with get_output().
+
+    Items passed between stages are dicts with at least "frame_id", "frame"
+    and "captured_at" keys; each stage adds its own keys.
+    """
+
+    def __init__(self, capture, detect, classify, queue_size=2):
+        """
+        Args:
+            capture (callable): Returns a new frame, or None when the source ends
+            detect (callable): Takes an item and adds detected faces to it
+            classify (callable): Takes an item and adds emotion results to it
+            queue_size (int): Capacity of each inter-stage queue
+        """
+        self.frame_id = 0
+        self.capture_func = capture
+        self.queues = {
+            "detect": DropOldestQueue(queue_size),
+            "classify": DropOldestQueue(queue_size),
+            "render": DropOldestQueue(queue_size),
+        }
+        self.stages = [
+            Stage("capture", self._capture, out_queue=self.queues["detect"]),
+            Stage("detect", detect, self.queues["detect"], self.queues["classify"]),
+            Stage("classify", classify, self.queues["classify"], self.queues["render"]),
+        ]
+        self.render_stats = StageStats()
+        self.latency_total = 0.0
+        self.latency_count = 0
+
+    def _capture(self):
+        frame = self.capture_func()
+        if frame is None:
+            return None
+        self.frame_id += 1
+        return {"frame_id": self.frame_id, "frame": frame, "captured_at": time.perf_counter()}
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def get_output(self, timeout=0.1):
+        """
+        Return the next fully processed item, or None if nothing is ready
+
+        Raises:
+            Empty: Once the source has ended and all queued items are drained
+        """
+        queue = self.queues["render"]
+        try:
+            item = queue.get(timeout)
+        except Empty:
+            if queue.closed:
+                raise
+            return None
+        self.latency_total += time.perf_counter() - item["captured_at"]
+        self.latency_count += 1
+        self.render_stats.record(0.0)
+        return item
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+        for queue in self.queues.values():
+            queue.close()
+        for stage in self.stages:
+            stage.join(timeout=1.0)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Per-stage throughput, queue depth and drop counts, plus the
+            average end-to-end latency in milliseconds
+        """
+        stats = {}
+        for stage in self.stages:
+            stats[stage.name] = stage.stats.snapshot()
+            if stage.out_queue is not None:
+                stats[stage.name]["out_queue_depth"] = stage.out_queue.qsize()
+                stats[stage.name]["dropped"] = stage.out_queue.dropped
+        stats["render"] = self.render_stats.snapshot()
+        stats["latency_ms"] = (1000.0 * self.latency_total / self.latency_count
+                               if self.latency_count else 0.0)
+        return stats
+
+    def format_stats(self):
+        stats = self.stats()
+        parts = []
+        for name in ("capture", "detect", "classify", "render"):
+            stage = stats[name]
+            text = f"{name} {stage['fps']:.1f}fps/{stage['avg_ms']:.1f}ms"
+            if "out_queue_depth" in stage:
+                text += f" q={stage['out_queue_depth']} drop={stage['dropped']}"
+            parts.append(text)
+        parts.append(f"latency {stats['latency_ms']:.1f}ms")
+        return " | ".join(parts)
@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+
+import cv2
+
+"""
+Prediction cache keyed on a perceptual hash of the face crop. When someone
+sits still, consecutive crops are nearly identical; a crop whose dHash is
+within a small Hamming distance of a recent one reuses that prediction
+instead of running the model again.
+"""
+
+
+def dhash(face_img, size=8):
+    """
+    Difference hash of a BGR or grayscale crop
+
+    The crop is reduced to (size + 1) x size gray pixels and each bit records
+    whether a pixel is brighter than its right neighbour, so the hash ignores
+    scale and overall brightness.
+
+    Returns:
+        int: size * size bit hash
+    """
+    gray = face_img if face_img.ndim == 2 else cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class PredictionCache:
+    """Bounded LRU of recent predictions, matched by hash with a Hamming tolerance and a TTL"""
+
+    def __init__(self, max_entries=256, max_distance=4, ttl=2.0, hash_size=8, clock=time.monotonic):
+        """
+        Args:
+            max_entries (int): Predictions kept
+            max_distance (int): Largest Hamming distance counted as the same crop
+            ttl (float): Seconds a prediction may be reused
+            hash_size (int): dHash grid size, the hash has hash_size**2 bits
+            clock (callable): Time source
+        """
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.hash_size = hash_size
+        self.clock = clock
+        # hash -> (result, stored_at), least recently used first; the TTL counts
+        # from when the model produced the prediction, not from its last reuse
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0}
+
+    def key(self, face_img):
+        return dhash(face_img, self.hash_size)
+
+    def lookup(self, key):
+        """
+        Returns:
+            dict or None: A cached prediction for a crop with this hash
+        """
+        now = self.clock()
+        best_key, best = None, self.max_distance + 1
+        expired = []
+        for other, (_, stored_at) in self.entries.items():
+            if now - stored_at > self.ttl:
+                expired.append(other)
+                continue
+            distance = hamming(key, other)
+            if distance < best:
+                best_key, best = other, distance
+                if distance == 0:
+                    break
+        for other in expired:
+            del self.entries[other]
+        self.stats["expired"] += len(expired)
+
+        if best_key is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self.entries.move_to_end(best_key)
+        return dict(self.entries[best_key][0])
+
+    def store(self, key, result):
+        """Remember the model's prediction for a crop hash"""
+        if result is None:
+            return
+        self.entries.pop(key, None)
+        self.entries[key] = (dict(result), self.clock())
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import deque
+
+"""
+Adaptive frame-rate and inference scheduler. Given a target processing rate
+and a CPU budget, it watches measured stage latencies and process CPU time
+and turns three knobs, cheapest quality loss first:
+
+    classify_every - frames between re-classifications of a tracked face
+    detect_scale   - downscale factor of the frame used for face detection
+    frame_skip     - process one of every N captured frames
+
+Frames beyond what the target rate needs are skipped, and when there is
+CPU headroom again the other knobs are restored.
+
+With the pipelined detector, capture, detection, classification and
+reporting call in from different threads, so counters and adjustments are
+serialized by a lock.
+"""
+
+
+class AdaptiveScheduler:
+    """Chooses how much work to do per captured frame to stay within a CPU budget"""
+
+    def __init__(self, target_fps=10.0, cpu_budget=0.5, adjust_every=2.0, tracking=False,
+                 classify_every=10, min_scale=0.5, max_skip=6, max_classify_every=30):
+        """
+        Args:
+            target_fps (float): Desired processed frames per second
+            cpu_budget (float): Fraction of total machine CPU the process may use (0-1)
+            adjust_every (float): Seconds between adjustments
+            tracking (bool): Whether classify_every has any effect (face tracker in use)
+            classify_every (int): Baseline re-classification interval of the tracker
+            min_scale (float): Smallest detection scale
+            max_skip (int): Largest frame skip
+            max_classify_every (int): Largest re-classification interval
+        """
+        self.target_fps = target_fps
+        self.cpu_budget = cpu_budget
+        self.adjust_every = adjust_every
+        self.tracking = tracking
+        self.min_scale = min_scale
+        self.max_skip = max_skip
+        self.max_classify_every = max_classify_every
+        self.cpu_count = os.cpu_count() or 1
+
+        # Current settings
+        self.frame_skip = 1
+        self.detect_scale = 1.0
+        self.base_classify_every = classify_every
+        self.classify_every = classify_every
+
+        self.frame_counter = 0
+        self.latencies = {}  # stage -> recent latencies in seconds
+        self.processed = 0
+        self.captured = 0
+        self.window_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.last_metrics = {"processed_fps": 0.0, "captured_fps": 0.0, "cpu": 0.0, "frame_ms": 0.0}
+        self.lock = threading.Lock()
+
+    def should_process(self):
+        """Call once per captured frame; False means skip it"""
+        with self.lock:
+            self.captured += 1
+            self.frame_counter += 1
+            if self.frame_counter >= self.frame_skip:
+                self.frame_counter = 0
+                return True
+            return False
+
+    def record(self, stage, seconds):
+        """Record how long a stage took for one processed frame"""
+        with self.lock:
+            if stage not in self.latencies:
+                self.latencies[stage] = deque(maxlen=50)
+            self.latencies[stage].append(seconds)
+
+    def frame_done(self):
+        """Call after a frame has been fully processed; adjusts settings periodically"""
+        with self.lock:
+            self.processed += 1
+            now = time.perf_counter()
+            elapsed = now - self.window_start
+            if elapsed >= self.adjust_every:
+                self._adjust(now, elapsed)
+
+    def _adjust(self, now, elapsed):
+        """Re-tune the knobs from the window that just ended; called with the lock held"""
+        cpu = (time.process_time() - self.cpu_start) / (elapsed * self.cpu_count)
+        processed_fps = self.processed / elapsed
+        frame_ms = 1000.0 * sum(sum(values) / len(values) for values in self.latencies.values() if values)
+        self.last_metrics = {
+            "processed_fps": processed_fps,
+            "captured_fps": self.captured / elapsed,
+            "cpu": cpu,
+            "frame_ms": frame_ms,
+        }
+
+        too_slow = processed_fps < 0.9 * self.target_fps
+        if cpu > self.cpu_budget:
+            # Over budget: shed work, including skipping frames
+            self._degrade(allow_skip=True)
+        elif too_slow and self.frame_skip > 1:
+            self.frame_skip -= 1
+        elif too_slow and frame_ms > 1000.0 / self.target_fps:
+            # A single frame takes longer than the target interval: make frames cheaper
+            self._degrade(allow_skip=False)
+        elif self.frame_skip < self.max_skip and self.captured / elapsed / (self.frame_skip + 1) >= self.target_fps:
+            # The camera delivers more frames than the target rate needs
+            self.frame_skip += 1
+        elif cpu < 0.7 * self.cpu_budget and not too_slow:
+            self._upgrade()
+
+        self.processed = 0
+        self.captured = 0
+        self.window_start = now
+        self.cpu_start = time.process_time()
+
+    def _degrade(self, allow_skip):
+        if self.tracking and self.classify_every < self.max_classify_every:
+            self.classify_every = min(self.max_classify_every, self.classify_every * 2)
+        elif self.detect_scale > self.min_scale:
+            self.detect_scale = max(self.min_scale, round(self.detect_scale - 0.25, 2))
+        elif allow_skip and self.frame_skip < self.max_skip:
+            self.frame_skip += 1
+
+    def _upgrade(self):
+        if self.detect_scale < 1.0:
+            self.detect_scale = min(1.0, round(self.detect_scale + 0.25, 2))
+        elif self.tracking and self.classify_every > self.base_classify_every:
+            self.classify_every = max(self.base_classify_every, self.classify_every // 2)
+
+    def metrics(self):
+        """
+        Returns:
+            dict: Current settings, achieved rates, CPU use and mean stage latencies in ms
+        """
+        with self.lock:
+            metrics = {
+                "frame_skip": self.frame_skip,
+                "detect_scale": self.detect_scale,
+                "classify_every": self.classify_every if self.tracking else None,
+            }
+            metrics.update(self.last_metrics)
+            for stage, values in self.latencies.items():
+                if values:
+                    metrics[f"{stage}_ms"] = 1000.0 * sum(values) / len(values)
+            return metrics
+
+    def format_metrics(self):
+        m = self.metrics()
+        text = (f"skip={m['frame_skip']} scale={m['detect_scale']:.2f} "
+                f"fps={m['processed_fps']:.1f}/{m['captured_fps']:.1f} cpu={100 * m['cpu']:.0f}% "
+                f"frame={m['frame_ms']:.1f}ms")
+        if m["classify_every"] is not None:
+            text += f" classify_every={m['classify_every']}"
+        return text
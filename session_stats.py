@@ -0,0 +1,236 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from CurrentState import EMOTIONS, EMOTION_ORDER
+
+"""
+Session mood statistics. Every raw and smoothed emotion sample goes into a
+fixed-size ring of packed records, and is rolled up as it arrives into
+per-minute buckets (raw counts, seconds spent in each smoothed mood, mood
+switches) and a histogram of how long each mood lasted. Queries only read
+the buckets, so their cost does not grow with the number of samples, and
+memory stays fixed however long the session runs.
+
+With a directory path the arrays are memory-mapped .npy files, so the
+statistics survive restarts and can be inspected with numpy.load.
+"""
+
+SAMPLE_DTYPE = np.dtype([("time", "<f8"), ("score", "<f4"), ("raw", "i1"), ("smoothed", "i1")])
+# Upper bounds, in seconds, of the mood dwell histogram bins
+DWELL_BINS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, float("inf"))
+
+
+class SessionStats:
+    """Bounded session timeline with incremental per-minute roll-ups"""
+
+    def __init__(self, capacity=1000000, minutes=24 * 60, max_gap=5.0, path=None):
+        """
+        Args:
+            capacity (int): Samples kept in the timeline ring (about 14 bytes each)
+            minutes (int): Per-minute buckets kept, 24 hours by default
+            max_gap (float): Longest gap between samples, in seconds, counted as
+                time spent in the current mood (longer gaps mean nobody was watched)
+            path (str): Directory for memory-mapped persistence, or None to keep
+                everything in memory
+        """
+        self.capacity = capacity
+        self.minutes = minutes
+        self.max_gap = max_gap
+        self.path = path
+        n = len(EMOTIONS)
+        shapes = {
+            "samples": ((capacity,), SAMPLE_DTYPE),
+            "minute_ids": ((minutes,), np.int64),
+            "raw_counts": ((minutes, n), np.int32),
+            "mood_seconds": ((minutes, n), np.float32),
+            "switches": ((minutes,), np.int32),
+            "dwell_counts": ((n, len(DWELL_BINS)), np.int64),
+            "dwell_seconds": ((n,), np.float64),
+        }
+        self.meta = {"capacity": capacity, "minutes": minutes, "position": 0, "count": 0,
+                     "last_time": None, "last_smoothed": None, "dwell_start": None}
+        self.arrays = self._open(shapes) if path else self._allocate(shapes)
+        for name, array in self.arrays.items():
+            setattr(self, name, array)
+
+    def _allocate(self, shapes):
+        arrays = {name: np.zeros(shape, dtype=dtype) for name, (shape, dtype) in shapes.items()}
+        arrays["minute_ids"].fill(-1)
+        return arrays
+
+    def _open(self, shapes):
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, "meta.json")
+        meta = None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        resume = (meta is not None and meta.get("capacity") == self.capacity
+                  and meta.get("minutes") == self.minutes
+                  and all(os.path.exists(os.path.join(self.path, name + ".npy")) for name in shapes))
+
+        arrays = {}
+        for name, (shape, dtype) in shapes.items():
+            file_path = os.path.join(self.path, name + ".npy")
+            if resume:
+                arrays[name] = np.lib.format.open_memmap(file_path, mode="r+")
+            else:
+                arrays[name] = np.lib.format.open_memmap(file_path, mode="w+", dtype=dtype, shape=shape)
+        if resume:
+            self.meta.update(meta)
+        else:
+            arrays["minute_ids"].fill(-1)
+        return arrays
+
+    def _slot(self, now):
+        """Bucket row of the minute containing `now`, cleared if it held an older minute"""
+        minute = int(now // 60)
+        slot = minute % self.minutes
+        if self.minute_ids[slot] != minute:
+            self.minute_ids[slot] = minute
+            self.raw_counts[slot] = 0
+            self.mood_seconds[slot] = 0
+            self.switches[slot] = 0
+        return slot
+
+    def _end_dwell(self, now):
+        mood = self.meta["last_smoothed"]
+        dwell = now - self.meta["dwell_start"]
+        self.dwell_counts[mood, np.searchsorted(DWELL_BINS, dwell)] += 1
+        self.dwell_seconds[mood] += dwell
+
+    def add(self, raw, score, smoothed, now=None):
+        """
+        Record one sample
+
+        Args:
+            raw (str): Emotion predicted for the face, or None if nothing was predicted
+            score (float): Confidence of the raw prediction
+            smoothed (str): Smoothed emotion state after this sample
+            now (float): Unix timestamp, defaults to the current time
+        """
+        now = time.time() if now is None else now
+        raw_index = EMOTION_ORDER.get(raw, -1)
+        smoothed_index = EMOTION_ORDER[smoothed]
+        meta = self.meta
+        slot = self._slot(now)
+
+        if raw_index >= 0:
+            self.raw_counts[slot, raw_index] += 1
+        if meta["last_time"] is not None:
+            # Time since the previous sample counts towards the mood that was active
+            self.mood_seconds[slot, meta["last_smoothed"]] += min(max(now - meta["last_time"], 0.0), self.max_gap)
+        if meta["last_smoothed"] is None:
+            meta["dwell_start"] = now
+        elif smoothed_index != meta["last_smoothed"]:
+            self.switches[slot] += 1
+            self._end_dwell(now)
+            meta["dwell_start"] = now
+
+        self.samples[meta["position"]] = (now, score, raw_index, smoothed_index)
+        meta["position"] = (meta["position"] + 1) % self.capacity
+        meta["count"] = min(meta["count"] + 1, self.capacity)
+        meta["last_time"] = now
+        meta["last_smoothed"] = smoothed_index
+
+    def _rows(self, start, end):
+        """Mask of the bucket rows inside [start, end] (Unix timestamps, None for open ends)"""
+        mask = self.minute_ids >= 0
+        if start is not None:
+            mask &= self.minute_ids >= int(start // 60)
+        if end is not None:
+            mask &= self.minute_ids <= int(end // 60)
+        return mask
+
+    def time_in_mood(self, start=None, end=None):
+        """
+        Returns:
+            dict: Seconds spent in each smoothed mood, at minute resolution
+        """
+        totals = self.mood_seconds[self._rows(start, end)].sum(axis=0, dtype=np.float64)
+        return {emotion: float(seconds) for emotion, seconds in zip(EMOTIONS, totals)}
+
+    def raw_counts_between(self, start=None, end=None):
+        """
+        Returns:
+            dict: Number of raw predictions of each emotion
+        """
+        totals = self.raw_counts[self._rows(start, end)].sum(axis=0, dtype=np.int64)
+        return {emotion: int(count) for emotion, count in zip(EMOTIONS, totals)}
+
+    def switch_count(self, start=None, end=None):
+        """
+        Returns:
+            int: Changes of the smoothed mood
+        """
+        return int(self.switches[self._rows(start, end)].sum(dtype=np.int64))
+
+    def per_minute(self, start=None, end=None):
+        """
+        Returns:
+            list: (minute start timestamp, seconds per mood, switches) per bucket, oldest first
+        """
+        rows = np.flatnonzero(self._rows(start, end))
+        rows = rows[np.argsort(self.minute_ids[rows])]
+        return [(int(self.minute_ids[row]) * 60,
+                 dict(zip(EMOTIONS, self.mood_seconds[row].tolist())),
+                 int(self.switches[row])) for row in rows]
+
+    def dwell_distribution(self):
+        """
+        How long each mood lasted before switching, over the whole session
+
+        Returns:
+            dict: "bins" (upper bounds in seconds) and, per emotion, "counts" per
+            bin and "mean" dwell in seconds
+        """
+        distribution = {"bins": list(DWELL_BINS)}
+        for i, emotion in enumerate(EMOTIONS):
+            count = int(self.dwell_counts[i].sum())
+            distribution[emotion] = {
+                "counts": self.dwell_counts[i].tolist(),
+                "mean": float(self.dwell_seconds[i]) / count if count else 0.0,
+            }
+        return distribution
+
+    def recent(self, seconds=None):
+        """
+        Returns:
+            ndarray: Timeline samples (SAMPLE_DTYPE) in time order, optionally only the last `seconds`
+        """
+        count, position = self.meta["count"], self.meta["position"]
+        if count < self.capacity:
+            samples = self.samples[:count]
+        else:
+            samples = np.concatenate((self.samples[position:], self.samples[:position]))
+        if seconds is not None and len(samples):
+            samples = samples[samples["time"] >= samples["time"][-1] - seconds]
+        return np.array(samples)
+
+    def format_summary(self):
+        mood_times = self.time_in_mood()
+        total = sum(mood_times.values())
+        moods = ", ".join(f"{emotion} {100 * seconds / total:.0f}%"
+                          for emotion, seconds in sorted(mood_times.items(), key=lambda item: -item[1])
+                          if seconds > 0) if total else "no samples"
+        return (f"{self.meta['count']} samples, {total / 60:.1f} min observed: {moods}; "
+                f"{self.switch_count()} mood switches")
+
+    def flush(self):
+        """Write memory-mapped arrays and the ring position to disk"""
+        if not self.path:
+            return
+        for array in self.arrays.values():
+            array.flush()
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def close(self):
+        self.flush()
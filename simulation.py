@@ -0,0 +1,656 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from CurrentState import EMOTIONS, EMOTION_ORDER
+from audio_analysis import FeatureIndex
+from music_library import MusicLibrary
+from smoothing import SMOOTHERS, make_smoother
+
+"""
+Replays an emotion stream through smoothing and MoodMuse in virtual time,
+with a silent stand-in for the pygame mixer, to measure the emotion -> music
+path without a webcam, sound card or wall-clock waits:
+
+    latency  - from a (synthetic) true mood change until the music for it starts
+    switches - song changes per hour, and how many follow the previous one closely
+    overlap  - how long both songs of a crossfade are audible
+    stalls   - time transitions wait for a song to be decoded (cache misses, or
+               preloads that have not finished yet)
+
+The stream is synthetic (true moods with a configurable classifier accuracy)
+or recorded: an offline_analysis.py timeline or a --session-dir of
+emotion_detector.py, looped to fill the simulated time. Fades run on the
+virtual clock through CrossfadeEngine.tick(), and with count smoothing only
+the samples where the smoothed state changes reach the player, so hundreds
+of simulated hours take seconds. With a fixed seed the results are
+deterministic, and --baseline turns a run into a regression check:
+
+    python simulation.py --hours 100 --json baseline.json
+    python simulation.py --hours 100 --smoothing hysteresis --baseline baseline.json
+"""
+
+AUDIBLE = 0.01  # Channel volume above which a song counts as audible
+DECODE_RATE = 0.008  # Seconds of decoding per second of audio, about pygame's MP3 speed
+SHORT_DWELL = 30.0  # A song change this soon after the previous one counts as a short switch
+# Typical (tempo, energy, loudness dBFS, LUFS) per folder for synthetic tracks
+SYNTHETIC_PROFILES = {
+    "neutral": (100, 0.08, -16, -17),
+    "sad": (75, 0.05, -19, -20),
+    "happy": (120, 0.12, -12, -11),
+    "angry": (140, 0.16, -9, -8),
+    "disgust": (110, 0.11, -13, -13),
+    "fear": (90, 0.07, -17, -18),
+    "surprise": (125, 0.13, -12, -12),
+}
+
+
+class VirtualClock:
+    """Time source that only moves when the simulation moves it"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, now):
+        self.now = max(self.now, now)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class DummySound:
+    def __init__(self, length, ready_at=0.0):
+        self.length = length
+        self.ready_at = ready_at  # Virtual time its decode finishes
+
+    def get_length(self):
+        return self.length
+
+
+class DummyChannel:
+    def __init__(self, mixer):
+        self.mixer = mixer
+        self.sound = None
+        self.queued = None
+        self.volume = 1.0
+
+    def play(self, sound, loops=0):
+        self.mixer.wait_ready(sound)
+        self.sound = sound
+        self.queued = None
+
+    def queue(self, sound):
+        self.queued = sound
+
+    def get_queue(self):
+        return self.queued
+
+    def stop(self):
+        self.sound = None
+        self.queued = None
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def get_volume(self):
+        return self.volume
+
+    def get_busy(self):
+        return self.sound is not None
+
+
+class DummyMixer:
+    """
+    Silent stand-in for pygame.mixer. Decoding a song costs virtual time in
+    proportion to its length. A decode the simulation waits for advances the
+    clock (a stall). Preloads run in finish_background() and are modelled as
+    one background worker: each finishes at a virtual time after the ones
+    queued before it, and a transition that plays the song earlier stalls
+    until then, as it would waiting on a preload in flight.
+    """
+
+    def __init__(self, clock, durations, decode_rate=DECODE_RATE):
+        """
+        Args:
+            clock (VirtualClock): Simulation time
+            durations (callable): Returns a song's length in seconds
+            decode_rate (float): Seconds of decoding per second of audio
+        """
+        self.clock = clock
+        self.durations = durations
+        self.decode_rate = decode_rate
+        self.channels = {}
+        self.num_channels = 8
+        self.format = None
+        self.background = False  # Decoding preloads
+        self.background_free_at = 0.0  # Virtual time the background worker finishes its queue
+        self.stats = {"decodes": 0, "stalls": 0, "stall_seconds": 0.0, "max_stall": 0.0,
+                      "preload_stalls": 0, "background_decode_seconds": 0.0}
+
+    def pre_init(self, frequency=44100, size=-16, channels=2, buffer=2048):
+        self.format = (frequency, size, channels)
+
+    def init(self):
+        self.format = self.format or (44100, -16, 2)
+
+    def get_init(self):
+        return self.format
+
+    def quit(self):
+        self.format = None
+
+    def set_num_channels(self, count):
+        self.num_channels = count
+
+    def get_num_channels(self):
+        return self.num_channels
+
+    def Channel(self, number):
+        channel = self.channels.get(number)
+        if channel is None:
+            channel = self.channels[number] = DummyChannel(self)
+        return channel
+
+    def Sound(self, path):
+        length = self.durations(path)
+        cost = length * self.decode_rate
+        self.stats["decodes"] += 1
+        if self.background:
+            ready_at = max(self.clock(), self.background_free_at) + cost
+            self.background_free_at = ready_at
+            self.stats["background_decode_seconds"] += cost
+            return DummySound(length, ready_at)
+        self._stall(cost)
+        return DummySound(length, self.clock())
+
+    def _stall(self, seconds):
+        self.clock.advance(seconds)
+        self.stats["stalls"] += 1
+        self.stats["stall_seconds"] += seconds
+        self.stats["max_stall"] = max(self.stats["max_stall"], seconds)
+
+    def wait_ready(self, sound):
+        """A sound played before its preload finished stalls the transition until it has"""
+        wait = sound.ready_at - self.clock()
+        if wait > 0:
+            self.stats["preload_stalls"] += 1
+            self._stall(wait)
+
+    def finish_background(self, sound_cache):
+        """Decode the preloads the cache was asked for (it is built with threaded=False)"""
+        self.background = True
+        try:
+            sound_cache.run_preloads()
+        finally:
+            self.background = False
+
+    def audible(self, channels):
+        """Number of the given channels playing above the audible threshold"""
+        return sum(1 for number in channels
+                   if (channel := self.channels.get(number)) is not None
+                   and channel.sound is not None and channel.volume > AUDIBLE)
+
+
+def synthetic_stream(hours, fps, moods, mean_dwell=120.0, accuracy=0.7, presence=0.9, seed=0,
+                     chunk_seconds=3600.0):
+    """
+    True moods held for exponentially distributed times, observed by a
+    classifier that is right with probability `accuracy`
+
+    Returns:
+        tuple: (segments, chunks) - segments is (start times, mood indexes) of the
+        true moods; chunks yields (times, emotion indexes, scores) arrays
+    """
+    rng = np.random.default_rng(seed)
+    total = hours * 3600.0
+    count = int(total / mean_dwell * 2) + 2
+    starts = np.concatenate(([0.0], np.cumsum(np.maximum(rng.exponential(mean_dwell, count), 5.0))))
+    starts = starts[starts < total]
+    # Each segment switches to a different mood
+    steps = rng.integers(1, len(moods), len(starts)) if len(moods) > 1 else np.zeros(len(starts), dtype=int)
+    mood_indexes = np.asarray([EMOTION_ORDER[mood] for mood in moods])[np.cumsum(steps) % len(moods)]
+
+    def chunks():
+        for chunk_start in np.arange(0.0, total, chunk_seconds):
+            times = np.arange(chunk_start, min(chunk_start + chunk_seconds, total), 1.0 / fps)
+            times = times[rng.random(len(times)) < presence]
+            truth = mood_indexes[np.searchsorted(starts, times, side="right") - 1]
+            correct = rng.random(len(times)) < accuracy
+            wrong = (truth + rng.integers(1, len(EMOTIONS), len(times))) % len(EMOTIONS)
+            emotions = np.where(correct, truth, wrong)
+            scores = np.where(correct, rng.uniform(0.5, 1.0, len(times)), rng.uniform(0.3, 0.7, len(times)))
+            yield times, emotions, scores
+
+    return (starts, mood_indexes), chunks()
+
+
+def load_recording(path):
+    """
+    Raw predictions of a recorded session: an offline_analysis.py .npz
+    timeline or a SessionStats directory
+
+    Returns:
+        tuple: (times, emotion indexes, scores) arrays, times starting at 0
+    """
+    if os.path.isdir(path):
+        from session_stats import SessionStats
+
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        stats = SessionStats(capacity=meta["capacity"], minutes=meta["minutes"], path=path)
+        samples = stats.recent()
+        samples = samples[samples["raw"] >= 0]
+        times, emotions, scores = samples["time"], samples["raw"], samples["score"]
+    else:
+        timeline = np.load(path)
+        faces = timeline["face_emotion"] >= 0
+        times = np.interp(timeline["face_frame"][faces], timeline["frame_frame"], timeline["frame_time"])
+        emotions, scores = timeline["face_emotion"][faces], timeline["face_score"][faces]
+    if not len(times):
+        raise ValueError(f"No predictions in {path}")
+    return times - times[0], emotions.astype(int), scores.astype(float)
+
+
+def recorded_stream(path, hours):
+    """A recording looped to fill `hours`, one loop per chunk"""
+    times, emotions, scores = load_recording(path)
+    step = times[-1] / (len(times) - 1) if len(times) > 1 else 1.0
+    period = times[-1] + step
+    loops = max(1, int(np.ceil(hours * 3600.0 / period)))
+    return ((times + i * period, emotions, scores) for i in range(loops))
+
+
+class ChunkedCountState:
+    """
+    CurrentStateUpdate over whole chunks of emotion indexes at once: window
+    counts come from cumulative sums, and the state only changes where it
+    stops being a leader, so the work per chunk is a few array passes plus
+    one search per change
+    """
+
+    def __init__(self, window=180):
+        self.window = window
+        self.history = np.zeros(window, dtype=int)  # Last `window` emotion indexes, all neutral to start
+        self.state = 0
+
+    def update_states(self, emotions):
+        """
+        Returns:
+            ndarray: The state index after each of `emotions`
+        """
+        window = self.window
+        samples = np.concatenate((self.history, emotions))
+        one_hot = samples[None, :] == np.arange(len(EMOTIONS))[:, None]
+        totals = np.concatenate((np.zeros((len(EMOTIONS), 1), dtype=int), np.cumsum(one_hot, axis=1)), axis=1)
+        counts = totals[:, window + 1:] - totals[:, 1:-window]
+        leaders = counts == counts.max(axis=0)
+        first_leader = leaders.argmax(axis=0)  # First leader in EMOTIONS order
+        dethroned = [np.flatnonzero(~leaders[emotion]) for emotion in range(len(EMOTIONS))]
+
+        states = np.empty(len(emotions), dtype=int)
+        position = 0
+        while position < len(emotions):
+            lost = dethroned[self.state]
+            change = lost[np.searchsorted(lost, position)] if len(lost) and lost[-1] >= position else len(emotions)
+            states[position:change] = self.state
+            if change < len(emotions):
+                self.state = int(first_leader[change])
+                states[change] = self.state
+            position = change + 1
+        self.history = samples[-window:]
+        return states
+
+
+class Simulation:
+    """Feeds a stream through a smoother and MoodMuse, measuring the music's response"""
+
+    def __init__(self, mood_muse, mixer, clock, smoothing="count", tick=0.05):
+        """
+        Args:
+            mood_muse (MoodMuse): Player built with the DummyMixer and the virtual clock
+            mixer (DummyMixer): The player's mixer
+            clock (VirtualClock): The player's clock
+            smoothing (str): "count" or one of SMOOTHERS
+            tick (float): Seconds between fade steps, also the overlap resolution
+        """
+        self.mood_muse = mood_muse
+        self.mixer = mixer
+        self.clock = clock
+        self.smoothing = smoothing
+        self.state = ChunkedCountState() if smoothing == "count" else make_smoother(smoothing)
+        self.tick = tick
+        self.next_tick = 0.0
+        self.overlap = []  # Seconds both songs were audible, per fade
+        self.fade_overlap = 0.0
+        self.gaps = 0.0  # Seconds of silence inside fades
+        self.switch_times = []
+        self.music_changes = []  # (time, target emotion) whenever the music's mood changes
+        self.samples = 0
+
+    def _run_fades(self, until):
+        """Step fades on the virtual clock up to `until`"""
+        crossfader = self.mood_muse.crossfader
+        channels = self.mood_muse.music_channels
+        while crossfader.ramps and self.next_tick <= until:
+            self.clock.advance_to(self.next_tick)
+            crossfader.tick(self.next_tick)
+            audible = self.mixer.audible(channels)
+            if audible >= 2:
+                self.fade_overlap += self.tick
+            elif audible == 0:
+                self.gaps += self.tick
+            self.next_tick += self.tick
+            if not crossfader.ramps:
+                self.overlap.append(self.fade_overlap)
+                self.fade_overlap = 0.0
+        if not crossfader.ramps:
+            self.next_tick = max(self.next_tick, until)
+
+    def _music_target(self):
+        emotion = self.mood_muse.current_state["emotion"]
+        return self.mood_muse.selector.target_emotion(emotion) if emotion else None
+
+    def _publish(self, now, smoothed):
+        """Hand a new smoothed emotion to the player at `now`; returns when it is ready for the next"""
+        mood_muse = self.mood_muse
+        self._run_fades(now)
+        self.clock.advance_to(now)
+        self.next_tick = max(self.next_tick, now)
+        if mood_muse.set_emotion(smoothed):
+            self.switch_times.append(self.clock())
+        self.mixer.finish_background(mood_muse.sound_cache)
+        target = self._music_target()
+        if target != (self.music_changes[-1][1] if self.music_changes else None):
+            self.music_changes.append((self.clock(), target))
+        return self.clock()
+
+    def run(self, chunks):
+        # Like the music handler: only the latest state matters, and nothing
+        # is picked up while a transition is still being set up
+        published = None
+        busy_until = 0.0
+        for times, emotions, scores in chunks:
+            self.samples += len(times)
+            if self.smoothing != "count":
+                for now, emotion, score in zip(times.tolist(), emotions.tolist(), scores.tolist()):
+                    smoothed = self.state.update(EMOTIONS[emotion], score, now)
+                    if smoothed != published and now >= busy_until:
+                        busy_until = self._publish(now, smoothed)
+                        published = smoothed
+                continue
+            # Count smoothing changes state rarely, so jump straight to the
+            # samples where it differs from what was last published
+            states = self.state.update_states(emotions)
+            run_starts = np.flatnonzero(np.diff(states, prepend=-1))
+            position = 0
+            while position < len(times):
+                run = np.searchsorted(run_starts, position, side="right") - 1
+                if published is not None and states[position] == EMOTION_ORDER[published]:
+                    if run + 1 >= len(run_starts):
+                        break
+                    position = run_starts[run + 1]
+                if times[position] < busy_until:
+                    position = np.searchsorted(times, busy_until)
+                    continue
+                published = EMOTIONS[states[position]]
+                busy_until = self._publish(float(times[position]), published)
+        self._run_fades(float("inf"))
+
+    def latencies(self, segments):
+        """
+        Seconds from each true mood change until music for it started; NaN
+        if the mood ended first
+
+        Args:
+            segments (tuple): (start times, mood indexes) from synthetic_stream
+        """
+        starts, moods = segments
+        ends = np.append(starts[1:], np.inf)
+        selector = self.mood_muse.selector
+        changes = self.music_changes
+        latencies = np.full(len(starts), np.nan)
+        position = 0
+        current = None
+        for i, (start, end, mood) in enumerate(zip(starts.tolist(), ends.tolist(), moods.tolist())):
+            wanted = selector.target_emotion(EMOTIONS[mood])
+            while position < len(changes) and changes[position][0] <= start:
+                current = changes[position][1]
+                position += 1
+            if current == wanted:
+                latencies[i] = 0.0
+                continue
+            for change_time, change_target in changes[position:]:
+                if change_time >= end:
+                    break
+                if change_target == wanted:
+                    latencies[i] = change_time - start
+                    break
+        return latencies
+
+    def report(self, hours, wall_seconds, segments=None):
+        switches = np.asarray(self.switch_times)
+        dwell = np.diff(switches)
+        overlap = np.asarray(self.overlap) if self.overlap else np.zeros(1)
+        report = {
+            "simulated_hours": hours,
+            "wall_seconds": round(wall_seconds, 2),
+            "simulated_hours_per_second": round(hours / wall_seconds, 1) if wall_seconds else None,
+            "samples": self.samples,
+            "switches": len(switches),
+            "switches_per_hour": round(len(switches) / hours, 2),
+            "short_switches": int((dwell < SHORT_DWELL).sum()),
+            "overlap": {"mean_seconds": round(float(overlap.mean()), 3),
+                        "max_seconds": round(float(overlap.max()), 3),
+                        "silence_seconds": round(self.gaps, 3)},
+            "stalls": {"count": self.mixer.stats["stalls"],
+                       "total_seconds": round(self.mixer.stats["stall_seconds"], 2),
+                       "max_seconds": round(self.mixer.stats["max_stall"], 3),
+                       "preload_waits": self.mixer.stats["preload_stalls"],
+                       "background_decode_seconds": round(self.mixer.stats["background_decode_seconds"], 2)},
+        }
+        if segments is not None:
+            latencies = self.latencies(segments)
+            reached = latencies[~np.isnan(latencies)]
+            report["latency"] = {
+                "mood_changes": len(latencies),
+                "mean_seconds": round(float(reached.mean()), 2) if len(reached) else None,
+                "p50_seconds": round(float(np.percentile(reached, 50)), 2) if len(reached) else None,
+                "p95_seconds": round(float(np.percentile(reached, 95)), 2) if len(reached) else None,
+                "missed": round(1.0 - len(reached) / len(latencies), 4) if len(latencies) else 0.0,
+            }
+        return report
+
+
+def format_report(report):
+    lines = [f"{report['simulated_hours']:g} simulated hours, {report['samples']} samples in "
+             f"{report['wall_seconds']}s ({report['simulated_hours_per_second']} h/s)",
+             f"Switches: {report['switches']} ({report['switches_per_hour']}/h), "
+             f"{report['short_switches']} within {SHORT_DWELL:.0f}s of the previous one"]
+    if "latency" in report:
+        latency = report["latency"]
+        lines.append(f"Latency: mean {latency['mean_seconds']}s, p50 {latency['p50_seconds']}s, "
+                     f"p95 {latency['p95_seconds']}s, {100 * latency['missed']:.1f}% of "
+                     f"{latency['mood_changes']} mood changes never reached")
+    overlap, stalls = report["overlap"], report["stalls"]
+    lines.append(f"Crossfade overlap: mean {overlap['mean_seconds']}s, max {overlap['max_seconds']}s, "
+                 f"{overlap['silence_seconds']}s silent inside fades")
+    lines.append(f"Decode stalls: {stalls['count']} ({stalls['preload_waits']} on preloads), "
+                 f"{stalls['total_seconds']}s total, max {stalls['max_seconds']}s "
+                 f"({stalls['background_decode_seconds']}s decoded ahead)")
+    return "\n".join(lines)
+
+
+# Measurements where higher is worse, compared against a baseline report
+REGRESSION_KEYS = (
+    ("switches_per_hour",),
+    ("short_switches",),
+    ("latency", "mean_seconds"),
+    ("latency", "p95_seconds"),
+    ("latency", "missed"),
+    ("stalls", "total_seconds"),
+)
+
+
+def compare(report, baseline, tolerance=0.1):
+    """
+    Returns:
+        list: Descriptions of measurements more than `tolerance` (relative) worse than the baseline
+    """
+    regressions = []
+    for keys in REGRESSION_KEYS:
+        current, previous = report, baseline
+        for key in keys:
+            current = current.get(key) if isinstance(current, dict) else None
+            previous = previous.get(key) if isinstance(previous, dict) else None
+        if current is None or previous is None:
+            continue
+        if current > previous * (1 + tolerance) and current - previous > 1e-9:
+            regressions.append(f"{'.'.join(keys)}: {previous} -> {current}")
+    return regressions
+
+
+def make_synthetic_library(root, songs_per_emotion, seed=0):
+    """
+    Empty placeholder files in one folder per emotion, plus made-up analysis
+
+    Returns:
+        dict: path -> analysis entry
+    """
+    rng = np.random.default_rng(seed)
+    features = {}
+    for emotion in EMOTIONS:
+        os.makedirs(os.path.join(root, emotion), exist_ok=True)
+        tempo, energy, loudness, lufs = SYNTHETIC_PROFILES[emotion]
+        for i in range(songs_per_emotion):
+            path = os.path.join(root, emotion, f"{emotion}_{i:03d}.mp3").replace(os.sep, "/")
+            open(path, "wb").close()
+            song_tempo = float(tempo * rng.uniform(0.85, 1.15))
+            features[path] = {
+                "tempo": round(song_tempo, 1),
+                "energy": round(float(energy * rng.uniform(0.7, 1.3)), 5),
+                "loudness": round(float(loudness + rng.normal(0, 2)), 2),
+                "lufs": round(float(lufs + rng.normal(0, 2)), 2),
+                "entry": 0.0,
+                "beats": [0.0, round(60.0 / song_tempo, 3)],
+            }
+    return features
+
+
+def song_length(library):
+    """Song lengths from the library metadata, made up (but stable) where unknown"""
+    def length(path):
+        track = library.get_track(path) or {}
+        return track.get("duration") or 150.0 + zlib.crc32(os.path.basename(path).encode()) % 150
+    return length
+
+
+def simulate(args):
+    """Run a simulation from parsed command line arguments and print the report"""
+    from MoodMuse import MoodMuse
+
+    temp_dir = None
+    try:
+        if args.library == "synthetic":
+            temp_dir = tempfile.mkdtemp(prefix="moodmuse_sim_")
+            music_dir = temp_dir
+            synthetic = make_synthetic_library(music_dir, args.songs_per_emotion, args.seed)
+        else:
+            music_dir, synthetic = args.library, None
+
+        library = MusicLibrary(music_dir, EMOTIONS)
+        features = FeatureIndex(library)
+        if synthetic is not None:
+            features.features = synthetic
+        else:
+            # Songs are not decoded, so there is nothing to cue into
+            features.features = {path: dict(entry, entry=0.0) for path, entry in features.features.items()}
+        features.version += 1
+
+        clock = VirtualClock()
+        mixer = DummyMixer(clock, song_length(library), decode_rate=args.decode_rate)
+        mood_muse = MoodMuse(cache_bytes=args.cache_mb * 1024 * 1024, crossfade_curve=args.crossfade_curve,
+                             selection=args.selection, features=features, music_dir=music_dir,
+                             mixer=mixer, clock=clock, rng=random.Random(args.seed))
+        mixer.finish_background(mood_muse.sound_cache)
+
+        segments = None
+        if args.recorded:
+            chunks = recorded_stream(args.recorded, args.hours)
+        else:
+            moods = [emotion for emotion in EMOTIONS if library.songs.get(emotion)]
+            if not moods:
+                raise SystemExit(f"No songs in {music_dir}")
+            segments, chunks = synthetic_stream(args.hours, args.fps, moods, args.mean_dwell, args.accuracy,
+                                                args.presence, args.seed)
+
+        simulation = Simulation(mood_muse, mixer, clock, smoothing=args.smoothing)
+        start = time.perf_counter()
+        simulation.run(chunks)
+        elapsed = time.perf_counter() - start
+        hours = clock() / 3600.0 if args.recorded else args.hours
+        mood_muse.shutdown()
+
+        report = simulation.report(hours, elapsed, segments)
+        report["config"] = {key: getattr(args, key) for key in
+                            ("smoothing", "selection", "fps", "accuracy", "presence", "mean_dwell", "seed",
+                             "cache_mb", "decode_rate", "crossfade_curve", "library", "recorded")}
+        print(format_report(report))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written to {args.json}")
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(report, json.load(f), args.tolerance)
+            if regressions:
+                print("Regressions against the baseline:")
+                for regression in regressions:
+                    print(f"  {regression}")
+                sys.exit(1)
+            print("No regressions against the baseline")
+        return report
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def add_arguments(parser):
+    """Command line options shared with the benchmark harness"""
+    from MoodMuse import MoodMuse
+
+    parser.add_argument("--hours", type=float, default=100.0, help="simulated time")
+    parser.add_argument("--fps", type=float, default=10.0, help="predictions per second (synthetic stream)")
+    parser.add_argument("--recorded", help="offline_analysis.py .npz timeline or --session-dir to replay instead")
+    parser.add_argument("--smoothing", default="count", choices=["count"] + list(SMOOTHERS))
+    parser.add_argument("--selection", default="match", choices=MoodMuse.SELECTION_POLICIES)
+    parser.add_argument("--crossfade-curve", default="equal_power", choices=MoodMuse.CROSSFADE_CURVES)
+    parser.add_argument("--accuracy", type=float, default=0.7, help="chance a synthetic prediction is the true mood")
+    parser.add_argument("--presence", type=float, default=0.9, help="chance a face is seen in a frame")
+    parser.add_argument("--mean-dwell", type=float, default=120.0, help="mean seconds a synthetic true mood lasts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--library", default="synthetic",
+                        help="music directory, or 'synthetic' for generated placeholder songs")
+    parser.add_argument("--songs-per-emotion", type=int, default=20, help="synthetic library size")
+    parser.add_argument("--cache-mb", type=int, default=256, help="decoded song cache budget")
+    parser.add_argument("--decode-rate", type=float, default=DECODE_RATE,
+                        help="seconds of decoding per second of audio")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report to compare against; exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative slack before a change counts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the emotion -> music path in virtual time")
+    add_arguments(parser)
+    simulate(parser.parse_args())
@@ -0,0 +1,141 @@
+import time
+from collections import deque
+
+from CurrentState import EMOTIONS
+
+"""
+Emotion smoothing in wall-clock time. Unlike CurrentStateUpdate, which
+counts the last 180 samples (so its time span depends on the frame rate),
+these smoothers weight each prediction by the classifier score and forget
+old predictions after a fixed number of seconds. Every update is O(1):
+the work only depends on the fixed number of emotion labels.
+"""
+
+
+class Smoother:
+    """Common interface: feed (emotion, score) samples, read the smoothed state"""
+
+    def __init__(self):
+        self.state = "neutral"
+        self.weights = {emotion: 0.0 for emotion in EMOTIONS}
+
+    def update(self, emotion, score=1.0, now=None):
+        """
+        Add one prediction
+
+        Args:
+            emotion (str): Predicted emotion label
+            score (float): Classifier confidence used as the sample weight
+            now (float): Sample time in seconds, defaults to time.monotonic()
+
+        Returns:
+            str: The smoothed emotion
+        """
+        raise NotImplementedError
+
+    def _leader(self):
+        """Emotion with the highest weight; the current state wins ties"""
+        best = self.state
+        for emotion in EMOTIONS:
+            if self.weights[emotion] > self.weights[best]:
+                best = emotion
+        return best
+
+
+class SlidingWindowSmoother(Smoother):
+    """Sum of confidences over the last window_seconds"""
+
+    def __init__(self, window_seconds=6.0):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.samples = deque()  # (time, emotion, score)
+
+    def update(self, emotion, score=1.0, now=None):
+        now = time.monotonic() if now is None else now
+        self.samples.append((now, emotion, score))
+        self.weights[emotion] += score
+
+        # Each sample is evicted exactly once, so this is amortized O(1)
+        cutoff = now - self.window_seconds
+        while self.samples[0][0] < cutoff:
+            _, removed, removed_score = self.samples.popleft()
+            self.weights[removed] -= removed_score
+
+        self.state = self._leader()
+        return self.state
+
+
+class ExponentialDecaySmoother(Smoother):
+    """Confidence-weighted votes that lose half their weight every half_life seconds"""
+
+    def __init__(self, half_life=2.0):
+        super().__init__()
+        self.half_life = half_life
+        self.last_time = None
+
+    def update(self, emotion, score=1.0, now=None):
+        now = time.monotonic() if now is None else now
+        if self.last_time is not None:
+            decay = 0.5 ** (max(0.0, now - self.last_time) / self.half_life)
+            for label in EMOTIONS:
+                self.weights[label] *= decay
+        self.last_time = now
+        self.weights[emotion] += score
+
+        self.state = self._leader()
+        return self.state
+
+
+class HysteresisSmoother(Smoother):
+    """
+    Wraps another smoother and only switches state after the new leader has
+    stayed ahead for min_dwell seconds and leads by at least margin (as a
+    fraction of the current state's weight).
+    """
+
+    def __init__(self, inner=None, min_dwell=3.0, margin=0.1):
+        super().__init__()
+        self.inner = inner if inner is not None else SlidingWindowSmoother()
+        self.weights = self.inner.weights
+        self.min_dwell = min_dwell
+        self.margin = margin
+        self.candidate = None
+        self.candidate_since = None
+
+    def update(self, emotion, score=1.0, now=None):
+        now = time.monotonic() if now is None else now
+        leader = self.inner.update(emotion, score, now)
+
+        if leader == self.state or self.weights[leader] <= self.weights[self.state] * (1.0 + self.margin):
+            self.candidate = None
+            return self.state
+
+        if leader != self.candidate:
+            self.candidate = leader
+            self.candidate_since = now
+        elif now - self.candidate_since >= self.min_dwell:
+            self.state = leader
+            self.candidate = None
+        return self.state
+
+
+SMOOTHERS = {
+    "window": SlidingWindowSmoother,
+    "decay": ExponentialDecaySmoother,
+    "hysteresis": HysteresisSmoother,
+}
+
+def make_smoother(name, **kwargs):
+    """
+    Create a smoother by name
+
+    Args:
+        name (str): One of "window", "decay" or "hysteresis"
+        **kwargs: Passed to the smoother's constructor
+
+    Returns:
+        Smoother: The new smoother
+    """
+    if name not in SMOOTHERS:
+        raise ValueError(f"Unknown smoother '{name}'. Valid smoothers are: {', '.join(SMOOTHERS)}")
+    return SMOOTHERS[name](**kwargs)
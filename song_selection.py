@@ -0,0 +1,300 @@
+import random
+from collections import deque
+
+from audio_analysis import FEATURES
+
+"""
+Song selection policies. A policy decides which songs suit a detected
+emotion; SongSelector picks among them while avoiding recently played
+tracks. Picks only read the in-memory library and feature indexes.
+
+    match       - songs from the detected emotion's folder
+    counteract  - "therapy" mode: songs for a better mood, the calmest first
+                  when the detected mood is agitated
+    ramp        - a plan of songs whose features step gradually from the
+                  current song towards the target mood
+"""
+
+# Mood the counteract policy steers towards
+COUNTERACT_TARGETS = {
+    "angry": "neutral",
+    "fear": "neutral",
+    "disgust": "neutral",
+    "surprise": "neutral",
+    "sad": "happy",
+    "neutral": "neutral",
+    "happy": "happy",
+}
+# Agitated moods are answered with the calmest candidates
+AGITATED = ("angry", "fear", "disgust", "surprise")
+
+
+class RecentHistory:
+    """Last `size` played tracks, with O(1) membership tests"""
+
+    def __init__(self, size=5):
+        self.played = deque()
+        self.counts = {}  # path -> occurrences in `played`
+        self.size = size
+
+    def add(self, path):
+        if self.size <= 0:
+            return
+        self.played.append(path)
+        self.counts[path] = self.counts.get(path, 0) + 1
+        if len(self.played) > self.size:
+            oldest = self.played.popleft()
+            self.counts[oldest] -= 1
+            if not self.counts[oldest]:
+                del self.counts[oldest]
+
+    def __contains__(self, path):
+        return path in self.counts
+
+    def __len__(self):
+        return len(self.played)
+
+    def clear(self):
+        self.played.clear()
+        self.counts.clear()
+
+
+class FeatureSpace:
+    """
+    Library-wide z-scores of the track features, so tempo, energy and
+    loudness weigh the same in distances. Rebuilt only when the feature
+    index changes; unanalyzed tracks sit at the library mean.
+    """
+
+    def __init__(self, features):
+        self.features = features
+        self.version = None
+        self.vectors = {}
+
+    def _rebuild(self):
+        self.version = self.features.version
+        entries = dict(self.features.features)
+        columns = {}
+        for feature in FEATURES:
+            values = [entry[feature] for entry in entries.values() if entry.get(feature) is not None]
+            mean = sum(values) / len(values) if values else 0.0
+            spread = (sum((v - mean) ** 2 for v in values) / len(values)) ** 0.5 if values else 0.0
+            columns[feature] = (mean, spread or 1.0)
+        self.vectors = {
+            path: tuple((entry[feature] - columns[feature][0]) / columns[feature][1]
+                        if entry.get(feature) is not None else 0.0 for feature in FEATURES)
+            for path, entry in entries.items()
+        }
+
+    def vector(self, path):
+        if self.version != self.features.version:
+            self._rebuild()
+        return self.vectors.get(path, (0.0,) * len(FEATURES))
+
+    def centroid(self, paths):
+        vectors = [self.vector(path) for path in paths]
+        if not vectors:
+            return (0.0,) * len(FEATURES)
+        return tuple(sum(column) / len(vectors) for column in zip(*vectors))
+
+    def arousal(self, path):
+        """Tempo plus energy, in z units; low means calm"""
+        tempo, energy, _ = self.vector(path)
+        return tempo + energy
+
+    @staticmethod
+    def distance(a, b):
+        return sum((x - y) ** 2 for x, y in zip(a, b))
+
+
+class SelectionPolicy:
+    """Base policy: candidates are the songs of the target emotion"""
+
+    name = None
+    stateless = True  # Picks depend only on the emotion, so one can be preloaded ahead
+
+    def target(self, emotion):
+        return emotion
+
+    def candidates(self, selector, emotion, current_song):
+        """
+        Returns:
+            list: Suitable songs, best first (ties in any order)
+        """
+        return list(selector.songs.get(self.target(emotion), ()))
+
+    def choose(self, selector, emotion, songs):
+        """Pick one of the suitable songs that were not played recently"""
+        return selector.rng.choice(songs)
+
+
+class MatchPolicy(SelectionPolicy):
+    name = "match"
+
+
+class CounteractPolicy(SelectionPolicy):
+    name = "counteract"
+
+    def target(self, emotion):
+        return COUNTERACT_TARGETS.get(emotion, emotion)
+
+    def candidates(self, selector, emotion, current_song):
+        songs = list(selector.songs.get(self.target(emotion), ()))
+        if not songs:
+            # Nothing to steer towards; matching is better than silence
+            songs = list(selector.songs.get(emotion, ()))
+        if emotion in AGITATED and selector.space is not None:
+            songs.sort(key=selector.space.arousal)
+        return songs
+
+    def choose(self, selector, emotion, songs):
+        if emotion in AGITATED and selector.space is not None:
+            # Ranked calmest first: choose among the calmer half
+            songs = songs[:max(1, (len(songs) + 1) // 2)]
+        return selector.rng.choice(songs)
+
+
+class RampPolicy(SelectionPolicy):
+    """
+    Moves towards the counteract target over several songs. On a new target a
+    plan is computed once: waypoints interpolated in feature space from the
+    current song to the centroid of the target's songs, each taken by the
+    nearest unused track in the library. Later picks just read the plan.
+    """
+
+    name = "ramp"
+    stateless = False
+
+    def __init__(self, steps=3):
+        self.steps = steps
+        self.plan = []
+        self.plan_target = None
+
+    def target(self, emotion):
+        return COUNTERACT_TARGETS.get(emotion, emotion)
+
+    def make_plan(self, selector, emotion, current_song):
+        target_songs = list(selector.songs.get(self.target(emotion), ()))
+        pool = [path for songs in selector.songs.values() for path in songs]
+        if not target_songs or selector.space is None or current_song is None or current_song in target_songs:
+            # Nothing to plan with, or already playing the target mood
+            return []
+
+        space = selector.space
+        start = space.vector(current_song)
+        goal = space.centroid(target_songs)
+        plan = []
+        used = {current_song}
+        for step in range(1, self.steps + 1):
+            fraction = step / self.steps
+            waypoint = tuple(a + (b - a) * fraction for a, b in zip(start, goal))
+            # The last step must land on a song of the target mood; no song is planned twice
+            choices = [path for path in (target_songs if step == self.steps else pool) if path not in used]
+            if not choices:
+                continue
+            best = min(choices, key=lambda path: space.distance(space.vector(path), waypoint))
+            plan.append(best)
+            used.add(best)
+        return plan
+
+    def candidates(self, selector, emotion, current_song):
+        target = self.target(emotion)
+        if target != self.plan_target:
+            self.plan = self.make_plan(selector, emotion, current_song)
+            self.plan_target = target
+        self.advance(current_song)
+        if self.plan:
+            return self.plan[:1]
+        # No plan, or it is finished: stay on the target mood, or match when it has no songs
+        return list(selector.songs.get(target, ())) or list(selector.songs.get(emotion, ()))
+
+    def choose(self, selector, emotion, songs):
+        if self.plan and songs[0] == self.plan[0]:
+            return songs[0]
+        return selector.rng.choice(songs)
+
+    def advance(self, path):
+        """Drop the plan step that was just played"""
+        if self.plan and self.plan[0] == path:
+            self.plan.pop(0)
+
+    def reset(self):
+        self.plan = []
+        self.plan_target = None
+
+
+POLICIES = {
+    "match": MatchPolicy,
+    "counteract": CounteractPolicy,
+    "ramp": RampPolicy,
+}
+
+
+class SongSelector:
+    """Picks songs with a selection policy and a recently played history"""
+
+    def __init__(self, songs, features=None, policy="match", history_size=5, rng=None):
+        """
+        Args:
+            songs (dict): Emotion -> list of song paths (MusicLibrary.songs)
+            features (FeatureIndex): Track features, needed by counteract ranking and ramp
+            policy (str): One of POLICIES
+            history_size (int): Recently played songs not picked again while alternatives exist
+            rng (random.Random): Random source for choosing among equally good songs
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown selection policy '{policy}'. Valid policies are: {', '.join(POLICIES)}")
+        self.songs = songs
+        self.space = FeatureSpace(features) if features is not None else None
+        self.policy = POLICIES[policy]()
+        self.history = RecentHistory(history_size)
+        self.rng = rng or random.Random()
+
+    @property
+    def stateless(self):
+        return self.policy.stateless
+
+    def target_emotion(self, emotion):
+        """Emotion whose music the policy aims for"""
+        return self.policy.target(emotion)
+
+    def pick(self, emotion, current_song=None, exclude=None):
+        """
+        Choose a song for a detected emotion
+
+        Args:
+            emotion (str): Detected emotion
+            current_song (str): Song playing now, if any
+            exclude (str): A song not to pick while alternatives exist
+
+        Returns:
+            str or None: Song path, or None if there are no suitable songs
+        """
+        candidates = self.policy.candidates(self, emotion, current_song)
+        fresh = [path for path in candidates
+                 if path not in self.history and path != current_song and path != exclude]
+        if not fresh:
+            fresh = [path for path in candidates if path != current_song] or candidates
+        if not fresh:
+            return None
+        return self.policy.choose(self, emotion, fresh)
+
+    def played(self, path):
+        """Record that a song started playing"""
+        self.history.add(path)
+        if isinstance(self.policy, RampPolicy):
+            self.policy.advance(path)
+
+    def next_step(self, emotion, current_song):
+        """
+        Returns:
+            str or None: The next song of a ramp plan, None when the plan is finished
+            or the policy does not plan
+        """
+        if not isinstance(self.policy, RampPolicy):
+            return None
+        # A step that is already playing is done
+        self.policy.advance(current_song)
+        if not self.policy.plan:
+            return None
+        return self.pick(emotion, current_song)